@@ -1,13 +1,23 @@
 """
 This is the main module for the ranger project.
+
+Attributes are resolved lazily so that importing ranger stays cheap; the
+CLI (and with it smolagents, the router and the agent) loads on first use.
 """
 
 __version__ = "0.1.0"
 
-from ranger.cli import CLI
-
-
 __all__ = ['CLI']
 
-# Expose the CLI instance for direct usage
-cli = CLI()
+
+def __getattr__(name):
+    if name == "CLI":
+        from ranger.cli import CLI
+        return CLI
+    if name == "cli":
+        # Expose the CLI instance for direct usage
+        from ranger.cli import CLI
+        instance = CLI()
+        globals()["cli"] = instance
+        return instance
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
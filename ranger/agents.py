@@ -0,0 +1,108 @@
+"""
+This module provides a smolagents ToolCallingAgent that runs every tool call of a model turn, concurrently.
+"""
+
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Generator, List
+from rich.panel import Panel
+from rich.text import Text
+from smolagents import AgentGenerationError, AgentParsingError, LogLevel, ToolCall, ToolCallingAgent
+from smolagents.models import parse_json_if_needed
+
+logger = logging.getLogger(__name__)
+
+STOP_SEQUENCES = ["Observation:", "Calling tools:"]
+
+
+class ParallelToolCallingAgent(ToolCallingAgent):
+    """A ToolCallingAgent that acts on all the tool calls of a model turn, not just the first.
+
+    Models with native tool use (ClaudeChatModel, OpenAI) can ask for several
+    tools in one reply; here they all run in the same step, at the same time,
+    and their observations come back together, so a query that needs weather
+    and a travel time takes one tool round-trip instead of two. A final_answer
+    call ends the run only when it is the turn's sole call; next to other
+    calls it is dropped, as it was written before their results were known.
+    """
+
+    def _step_stream(self, memory_step) -> Generator[Any, None, None]:
+        memory_step.model_input_messages = self.write_memory_to_messages()
+        try:
+            chat_message = self.model(
+                memory_step.model_input_messages,
+                stop_sequences=STOP_SEQUENCES,
+                tools_to_call_from=list(self.tools.values()),
+            )
+        except Exception as e:
+            raise AgentGenerationError(f"Error while generating output:\n{e}", self.logger) from e
+        memory_step.model_output_message = chat_message
+        self.logger.log_markdown(
+            content=chat_message.content or str(chat_message.raw),
+            title="Output message of the LLM:",
+            level=LogLevel.DEBUG,
+        )
+        if not chat_message.tool_calls:
+            try:
+                chat_message = self.model.parse_tool_calls(chat_message)
+            except Exception as e:
+                raise AgentParsingError(f"Error while parsing tool call from model output: {e}", self.logger)
+
+        calls = [
+            ToolCall(name=call.function.name, arguments=parse_json_if_needed(call.function.arguments) or {}, id=call.id)
+            for call in chat_message.tool_calls
+        ]
+        memory_step.tool_calls = calls
+        # Keep the model's own text (its "Thought:" lines) ahead of the calls it made
+        summary = "\n".join(f"Called Tool: '{call.name}' with arguments: {call.arguments}" for call in calls)
+        memory_step.model_output = f"{chat_message.content.strip()}\n{summary}" if chat_message.content else summary
+
+        if len(calls) == 1 and calls[0].name == "final_answer":
+            arguments = calls[0].arguments
+            answer = arguments.get("answer", arguments) if isinstance(arguments, dict) else arguments
+            final_answer = self.execute_tool_call("final_answer", {"answer": answer})
+            self.logger.log(Text(f"Final answer: {final_answer}", style="bold"), level=LogLevel.INFO)
+            memory_step.action_output = final_answer
+            yield final_answer
+            return
+
+        calls = [call for call in calls if call.name != "final_answer"]
+        for call in calls:
+            self.logger.log(
+                Panel(Text(f"Calling tool: '{call.name}' with arguments: {call.arguments}")),
+                level=LogLevel.INFO,
+            )
+        observations, errors = self._execute_all(calls)
+        if observations:
+            memory_step.observations = "\n\n".join(observations)
+            self.logger.log(
+                f"Observations: {memory_step.observations.replace('[', '|')}",
+                level=LogLevel.INFO,
+            )
+        # The run records the first failure on the step; the other calls' results are kept
+        if errors:
+            raise errors[0]
+        yield None
+
+    def _execute_all(self, calls: List[ToolCall]):
+        """Run the calls, concurrently if there are several; returns observations and errors in call order."""
+        if len(calls) == 1:
+            outcomes = [self._execute(calls[0])]
+        else:
+            # A pool per step: tools such as get_weather_many fan out on the shared pool themselves
+            with ThreadPoolExecutor(max_workers=len(calls), thread_name_prefix="ranger-tool") as pool:
+                # Carry the caller's context (and so its current span) into the worker threads
+                futures = [pool.submit(contextvars.copy_context().run, self._execute, call) for call in calls]
+                outcomes = [future.result() for future in futures]
+        observations = [observation for observation, _ in outcomes if observation is not None]
+        errors = [error for _, error in outcomes if error is not None]
+        return observations, errors
+
+    def _execute(self, call: ToolCall):
+        try:
+            observation = self.execute_tool_call(call.name, call.arguments)
+        except Exception as e:
+            logger.debug("Tool call %s (%s) failed: %s", call.name, call.id, e)
+            return None, e
+        return f"Call id: {call.id} ({call.name})\n{str(observation).strip()}", None
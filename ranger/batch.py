@@ -0,0 +1,197 @@
+"""
+This module runs queries from a JSONL file over a pool of warm routers.
+"""
+
+import json
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, Tuple
+from ranger.tracing import stage_times
+
+logger = logging.getLogger(__name__)
+
+
+def read_queries(path: str) -> Iterator[Tuple[str, str]]:
+    """Yield (id, query) pairs from a JSONL file, one line at a time.
+
+    Each line is either a JSON object with a "query" and an optional "id", or a
+    bare JSON string. Lines without an id are numbered by their line number.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning("Skipping invalid JSON on line %d of %s: %s", line_number, path, str(e))
+                continue
+            if isinstance(item, str):
+                item = {"query": item}
+            if not isinstance(item, dict) or not item.get("query"):
+                logger.warning("Skipping line %d of %s: no query", line_number, path)
+                continue
+            yield str(item.get("id", line_number)), item["query"]
+
+
+def completed_ids(path: str) -> set:
+    """Return the ids that already have a successful result in an output file."""
+    done = set()
+    if not Path(path).exists():
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written last line from an interrupted run
+                continue
+            if isinstance(result, dict) and "id" in result and "error" not in result:
+                done.add(str(result["id"]))
+    return done
+
+
+def _end_partial_line(path: str):
+    """Terminate a last line cut off by an interrupted run so appended results start on a new line."""
+    if not Path(path).exists():
+        return
+    with open(path, "rb+") as f:
+        f.seek(0, 2)
+        if f.tell() == 0:
+            return
+        f.seek(-1, 2)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+class RouterPool:
+    """A fixed set of routers handed out to one worker at a time.
+
+    Routers keep their agent (and model client) between queries, so only the
+    first query on each router pays the start-up cost, or none with `warm`,
+    which builds every agent up front.
+    """
+
+    def __init__(self, size: int, router_factory: Callable, warm: bool = False):
+        self.size = size
+        self._routers = queue.Queue()
+        self._all = []
+        for _ in range(size):
+            router = router_factory()
+            if warm:
+                router.agent
+            self._all.append(router)
+            self._routers.put(router)
+
+    @property
+    def idle(self) -> int:
+        """Routers not currently answering a query."""
+        return self._routers.qsize()
+
+    @contextmanager
+    def lease(self, timeout: float = None):
+        """Check a router out for the duration of the block.
+
+        Raises queue.Empty if none frees up within `timeout` seconds.
+        """
+        router = self._routers.get(timeout=timeout)
+        try:
+            yield router
+        finally:
+            self._routers.put(router)
+
+    def route(self, query: str, timings: dict = None):
+        """Answer `query` on the next free router.
+
+        With `timings`, the seconds spent waiting for a router are stored under
+        "wait" and the time in each traced component (router, model, tool, ...)
+        under its name.
+        """
+        start = time.perf_counter()
+        with self.lease() as router:
+            if timings is not None:
+                timings["wait"] = time.perf_counter() - start
+            with stage_times() as stages:
+                try:
+                    return router.route(query)
+                finally:
+                    if timings is not None:
+                        timings.update(stages)
+
+    def close(self):
+        for router in self._all:
+            close = getattr(router, "close", None)
+            if callable(close):
+                close()
+
+
+def run_batch(input_path: str, out_path: str, router_factory: Callable, workers: int = 4,
+              resume: bool = True, on_result: Callable[[dict], None] = None) -> dict:
+    """Answer every query in `input_path`, appending one JSON result per line to `out_path`.
+
+    Results are written as they finish, so they may be out of input order. With
+    `resume`, queries that already have a successful result in `out_path` are
+    skipped and failed ones are retried.
+
+    Each result records its total "seconds" and per-stage "timings": the wait
+    for a free router and the time in each traced component.
+
+    Returns a summary with the number of queries completed, failed and skipped.
+    """
+    skip = completed_ids(out_path) if resume else set()
+    if resume:
+        _end_partial_line(out_path)
+    pool = RouterPool(workers, router_factory)
+    write_lock = threading.Lock()
+    summary = {"completed": 0, "failed": 0, "skipped": 0}
+
+    def answer(query_id: str, query: str) -> dict:
+        start = time.perf_counter()
+        result = {"id": query_id, "query": query}
+        timings = {}
+        try:
+            response, thoughts, tools_used = pool.route(query, timings)
+            result.update(response=response, thoughts=thoughts, tools_used=tools_used)
+        except Exception as e:
+            logger.error("Query %s failed: %s", query_id, str(e), exc_info=True)
+            result["error"] = str(e)
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        result["timings"] = {stage: round(seconds, 3) for stage, seconds in timings.items()}
+        return result
+
+    # Keep memory flat on large inputs by bounding the queries in flight
+    slots = threading.BoundedSemaphore(workers * 2)
+
+    def record(future, out):
+        result = future.result()
+        with write_lock:
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            summary["failed" if "error" in result else "completed"] += 1
+        slots.release()
+        if on_result is not None:
+            on_result(result)
+
+    started = time.perf_counter()
+    mode = "a" if resume else "w"
+    try:
+        with open(out_path, mode, encoding="utf-8") as out, \
+             ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ranger-batch") as executor:
+            for query_id, query in read_queries(input_path):
+                if query_id in skip:
+                    summary["skipped"] += 1
+                    continue
+                slots.acquire()
+                future = executor.submit(answer, query_id, query)
+                future.add_done_callback(lambda f: record(f, out))
+    finally:
+        pool.close()
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    logger.info("Batch finished: %s", summary)
+    return summary
@@ -0,0 +1,233 @@
+"""
+This module benchmarks Router and tool throughput, latency and memory against local stand-in servers.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import platform
+import threading
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List
+from ranger.places import reset_place_index
+from ranger.ratelimit import reset_limiters
+from ranger.tracing import PERCENTILES, percentile
+
+logger = logging.getLogger(__name__)
+
+SCENARIOS = ("route", "tool_route", "weather", "travel")
+
+
+def _throughput(count: int, elapsed: float) -> float:
+    return count / elapsed if elapsed > 0 else float("inf")
+
+
+def compare_route_throughput(router, queries: List[str]) -> dict:
+    """Run `queries` through `route` one at a time, then through `aroute` all at once.
+
+    The response cache is bypassed so both paths run every query. Returns the
+    wall time and queries/second of each path and the async speedup.
+    """
+    async def run_all():
+        await asyncio.gather(*(router.aroute(query) for query in queries))
+
+    response_cache, router.response_cache = router.response_cache, None
+    try:
+        start = time.perf_counter()
+        for query in queries:
+            router.route(query)
+        sync_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        asyncio.run(run_all())
+        async_elapsed = time.perf_counter() - start
+    finally:
+        router.response_cache = response_cache
+
+    result = {
+        "queries": len(queries),
+        "concurrency": router.max_concurrency,
+        "sync_seconds": sync_elapsed,
+        "async_seconds": async_elapsed,
+        "sync_qps": _throughput(len(queries), sync_elapsed),
+        "async_qps": _throughput(len(queries), async_elapsed),
+    }
+    result["speedup"] = result["async_qps"] / result["sync_qps"] if result["sync_qps"] else 0.0
+    logger.info("Route throughput: %s", result)
+    return result
+
+
+def _measure(call: Callable, inputs: list, concurrency: int) -> dict:
+    """Call `call(item)` for every input with `concurrency` threads, timing each call."""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def timed(item):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            call(item)
+            failed = False
+        except Exception as e:
+            logger.warning("Benchmark call failed: %s", str(e))
+            failed = True
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            errors += failed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ranger-bench") as executor:
+        list(executor.map(timed, inputs))
+    elapsed = time.perf_counter() - start
+    return {
+        "calls": len(inputs),
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "throughput": round(_throughput(len(inputs), elapsed), 2),
+        **{f"p{pct}": round(percentile(latencies, pct), 4) for pct in PERCENTILES},
+        "max_rss_mb": _max_rss_mb(),
+    }
+
+
+def _max_rss_mb() -> float:
+    """Peak resident memory of this process so far, where the platform reports it."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+@contextmanager
+def _standin_env(model_url: str, maps_url: str):
+    """Point every provider at the stand-in servers, with caches that would hide upstream calls and rate limits turned off."""
+    from ranger.tools.maps import reset_directions_cache
+
+    # Stand-in places and legs must not end up in the real place index or directions cache
+    places_dir = tempfile.TemporaryDirectory(prefix="ranger-bench-")
+    settings = {
+        "ANTHROPIC_BASE_URL": model_url,
+        "ANTHROPIC_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{model_url}/v1",
+        "OPENAI_API_KEY": "bench",
+        "GMAPS_BASE_URL": maps_url,
+        "GMAPS_API_KEY": "AIzaBench",
+        "RANGER_WEATHER_MODE": "direct",
+        "RANGER_RESPONSE_CACHE": "0",
+        # Measure the code, not the provider rate limits
+        "RANGER_RATE_ANTHROPIC_RPS": "0",
+        "RANGER_RATE_OPENAI_RPS": "0",
+        "RANGER_RATE_MAPS_RPS": "0",
+        "RANGER_PLACES_PATH": str(Path(places_dir.name) / "places.sqlite3"),
+        "RANGER_MAPS_CACHE_PATH": str(Path(places_dir.name) / "directions.sqlite3"),
+    }
+    saved = {name: os.environ.get(name) for name in settings}
+    os.environ.update(settings)
+    reset_limiters()
+    reset_place_index()
+    reset_directions_cache()
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        reset_limiters()
+        reset_place_index()
+        reset_directions_cache()
+        places_dir.cleanup()
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent, capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(concurrency=(1, 4, 16), requests: int = 32, latency: float = 0.05,
+                   scenarios=SCENARIOS) -> dict:
+    """Drive Router.route (with the code or the tool-calling agent), get_weather and get_travel_duration
+    against local stand-in servers.
+
+    Each scenario runs `requests` calls at every concurrency level, with
+    `latency` seconds added to every upstream request. Inputs are distinct so
+    tool caches miss. Returns run metadata and one result row per scenario and
+    concurrency level.
+    """
+    from ranger.standins import model_server, maps_server
+    from ranger.batch import RouterPool
+
+    levels = [int(level) for level in (concurrency if isinstance(concurrency, (list, tuple)) else [concurrency])]
+    scenarios = [scenarios] if isinstance(scenarios, str) else list(scenarios)
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"Unknown scenarios {sorted(unknown)}. Use {', '.join(SCENARIOS)}.")
+
+    results = []
+    with model_server(latency=latency) as models, maps_server(latency=latency) as maps, \
+         _standin_env(models.url, maps.url):
+        from ranger.router import Router
+        from ranger.tools import weather
+        from ranger.tools.maps import get_travel_duration
+        # Models built before the environment changed would still talk to the real APIs
+        weather._models.clear()
+        run_id = 0
+
+        for level in levels:
+            for scenario in scenarios:
+                run_id += 1
+                # Numeric tags, so the scripted agent replies can echo them back
+                inputs = [f"{run_id}{i:06d}" for i in range(requests)]
+                # Each routing run gets its own pool of routers, closed once it is measured
+                pool = None
+                try:
+                    if scenario in ("route", "tool_route"):
+                        if scenario == "route":
+                            pool = RouterPool(level, lambda: Router(model_type="openai"))
+                        else:
+                            pool = RouterPool(level, lambda: Router(model_type="claude", agent_type="tool_calling"))
+                        # Build every pooled agent before timing
+                        _measure(pool.route, [f"Warm-up #{i}" for i in range(level)], level)
+                        call = lambda tag: pool.route(f"Weather in Bench City #{tag} and the drive from Bench Town #{tag}?")
+                    elif scenario == "weather":
+                        call = lambda tag: weather.get_weather(f"Bench City #{tag}", model_type="claude")
+                    else:
+                        call = lambda tag: get_travel_duration(f"Bench Town #{tag}", f"Bench City #{tag}")
+                    model_requests, maps_requests = models.requests, maps.requests
+                    row = {"scenario": scenario, "concurrency": level, **_measure(call, inputs, level)}
+                    row["upstream_requests"] = (models.requests - model_requests) + (maps.requests - maps_requests)
+                finally:
+                    if pool is not None:
+                        pool.close()
+                results.append(row)
+                logger.info("Benchmark result: %s", row)
+        weather._models.clear()
+        weather.weather_cache.clear()
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "requests": requests,
+            "latency": latency,
+        },
+        "results": results,
+    }
@@ -9,24 +9,37 @@ from rich.prompt import Prompt
 from rich.panel import Panel
 from rich.text import Text
 from rich.spinner import Spinner
-from rich.live import Live
 from rich.table import Table
 from dotenv import load_dotenv
-import os
 import logging
 from datetime import datetime
 from pathlib import Path
-from .router import Router
-import requests
-import googlemaps
+import sys
+from typing import List, Tuple
+from .transport import get_transport
+from .health import get_health_checker
+from .response_cache import get_response_cache
+from .intents import get_fast_path_stats
+from . import logs, places, tracing
 
 class CLI(object):
     # List of available tools
     TOOLS = [
         ("get_weather", "Get a detailed weather report for a specific location."),
-        ("get_travel_duration", "Gets the travel time between two places.")
+        ("get_weather_many", "Get weather reports for several locations at once."),
+        ("get_travel_duration", "Gets the travel time between two places."),
+        ("get_travel_durations", "Gets the travel times of several legs at once."),
+        ("get_travel_matrix", "Gets travel times and distances between many places in one call."),
+        ("optimize_itinerary", "Plans the visiting order and timing of a multi-stop day trip.")
     ]
 
+    # Seconds the REPL waits for provider probes before showing the prompt
+    STATUS_STARTUP_WAIT = 0.5
+    # Lines of agent progress kept in the streaming panel
+    STREAM_PANEL_LINES = 15
+    # Where the log, spans and places index are kept
+    LOG_DIR = Path(__file__).parent.parent / "logs"
+
     def __init__(self, debug: bool = False, log_level: str = "INFO"):
         self.console = Console()
         self.debug = debug
@@ -34,110 +47,121 @@ class CLI(object):
         load_dotenv()
         self.console.print("[dim]Loaded environment variables from .env[/dim]")
         
-        # Initialize the router
-        self.router = Router(debug=debug)
+        # The router (and smolagents) is loaded on first use
+        self._router = None
+        # Conversation memory, kept across queries in the REPL
+        self._memory = None
         
         # Setup logging
         self._setup_logging(log_level)
 
+    @property
+    def router(self):
+        """The query router, built on first use so commands that don't route start fast"""
+        if self._router is None:
+            from .router import Router
+            self._router = Router(debug=self.debug, memory=self._memory)
+        return self._router
+
+    @router.setter
+    def router(self, router):
+        self._router = router
+
     def _setup_logging(self, log_level: str):
         """Setup logging configuration"""
         # Create logs directory if it doesn't exist
-        log_dir = Path(__file__).parent.parent / "logs"
-        log_dir.mkdir(exist_ok=True)
-        
-        # Use a single log file
-        log_file = log_dir / "ranger.log"
-        
-        # Configure logging to only output to the log file
-        logging.basicConfig(
-            level=getattr(logging, log_level),
-            format='%(asctime)s - %(levelname)s - %(message)s - %(pathname)s:%(lineno)d',
-            handlers=[
-                logging.FileHandler(log_file),
-                # Removed StreamHandler to prevent console output
-            ]
-        )
+        log_dir = Path(self.LOG_DIR)
+        log_dir.mkdir(parents=True, exist_ok=True)
         
-        # Configure smolagents logger to only output to our log file
-        smolagents_logger = logging.getLogger('smolagents')
-        smolagents_logger.setLevel(getattr(logging, log_level))
-        smolagents_logger.addHandler(logging.FileHandler(log_file))
-        smolagents_logger.propagate = False  # Prevent propagation to root logger
+        # A single sink, written from a background thread and rotated by size (or time)
+        logs.configure(str(log_dir / "ranger.log"), log_level)
         
-        # Configure httpcore logger to suppress DEBUG logs
-        httpcore_logger = logging.getLogger('httpcore')
-        httpcore_logger.setLevel(getattr(logging, log_level))
-        httpcore_logger.addHandler(logging.FileHandler(log_file))
-        httpcore_logger.propagate = False  # Prevent propagation to root logger
+        # Write timing spans next to the log unless RANGER_TRACE_PATH points elsewhere
+        tracing.configure(str(log_dir / "spans.jsonl"))
+        # Likewise keep resolved places, so each one is geocoded only once across runs
+        places.configure(str(log_dir / "places.sqlite3"))
         
         self.logger = logging.getLogger(__name__)
         self.logger.info("="*50)  # Add a separator for new sessions
         self.logger.info("Ranger CLI started")
 
+    def log_response(self, response: str, thoughts: str, tools_used: List[str]):
+        """Log a summary of a response; the full text only at DEBUG"""
+        self.logger.info("Router response: %d chars, tools_used: %s", len(response), tools_used)
+        self.logger.debug("Router response: %s, thoughts: %s", response, thoughts)
+
     def input(self, prompt: str) -> str:
         return Prompt.ask(prompt)
 
-    def _get_system_status(self) -> Text:
-        """Get the system status as a Rich Text object"""
+    def _get_system_status(self, timeout: float = None) -> Text:
+        """Get the system status as a Rich Text object
+
+        Args:
+            timeout: Seconds to wait for provider probes; providers still being
+                     probed afterwards are shown as pending.
+        """
         status_text = Text()
         
         # Add API Status section
         status_text.append("API Status\n", style="bold green")
         
-        # Check OpenAI status
-        openai_key = os.getenv("OPENAI_API_KEY")
-        if not openai_key:
-            openai_status = "❌ Not configured"
-        else:
-            try:
-                response = requests.get(
-                    "https://api.openai.com/v1/models",
-                    headers={"Authorization": f"Bearer {openai_key}"},
-                    timeout=5
-                )
-                openai_status = "✅ Connected" if response.status_code == 200 else "❌ Error connecting"
-            except Exception as e:
-                openai_status = f"❌ Error: {str(e)}"
-        
-        # Check Claude status
-        claude_key = os.getenv("ANTHROPIC_API_KEY")
-        if not claude_key:
-            claude_status = "❌ Not configured"
-        else:
-            try:
-                response = requests.get(
-                    "https://api.anthropic.com/v1/messages",
-                    headers={
-                        "x-api-key": claude_key,
-                        "anthropic-version": "2023-06-01"
-                    },
-                    timeout=5
-                )
-                claude_status = "✅ Connected" if response.status_code == 200 else "❌ Error connecting"
-            except Exception as e:
-                claude_status = f"❌ Error: {str(e)}"
-        
-        # Check Google Maps API status
-        gmaps_status = "❌ Not configured"
-        if os.getenv("GMAPS_API_KEY"):
-            try:
-                gmaps = googlemaps.Client(os.getenv("GMAPS_API_KEY"))
-                result = gmaps.geocode("New York")
-                gmaps_status = "✅ Connected" if result else "❌ Error connecting"
-            except Exception as e:
-                gmaps_status = f"❌ Error: {str(e)}"
+        # Probe all providers concurrently; results are cached and shared
+        statuses = get_health_checker().check(timeout=timeout)
         
         # Add service statuses
         status_text.append("OpenAI\t\t", style="cyan")
-        status_text.append(f"{openai_status}\n", style="green")
+        status_text.append(f"{statuses['OpenAI']}\n", style="green")
         
         status_text.append("Claude\t\t", style="cyan")
-        status_text.append(f"{claude_status}\n", style="green")
+        status_text.append(f"{statuses['Claude']}\n", style="green")
         
         status_text.append("Google Maps\t", style="cyan")
-        status_text.append(f"{gmaps_status}\n", style="green")
-        
+        status_text.append(f"{statuses['Google Maps']}\n", style="green")
+
+        # Add connection pool metrics
+        pool = get_transport().stats()
+        status_text.append("HTTP Pool\t", style="cyan")
+        status_text.append(
+            f"{pool['requests']} requests, {pool['pool_hits']} reused connections"
+            f"{' (HTTP/2)' if pool['http2'] else ''}\n",
+            style="dim"
+        )
+
+        # Add directions cache metrics, if the Maps tool has been loaded in this process
+        maps = sys.modules.get("ranger.tools.maps")
+        if maps is not None:
+            maps_cache = maps.get_directions_cache().stats()
+            status_text.append("Maps Cache\t", style="cyan")
+            status_text.append(f"{maps_cache['hits']} hits, {maps_cache['misses']} misses\n", style="dim")
+
+        # Add response cache metrics
+        response_cache = get_response_cache()
+        if response_cache is not None:
+            responses = response_cache.stats()
+            status_text.append("Response Cache\t", style="cyan")
+            status_text.append(
+                f"{responses['hits'] + responses['near_hits']} hits, {responses['misses']} misses "
+                f"({responses['hit_rate']:.0%} hit rate)\n",
+                style="dim"
+            )
+
+        # Add fast path metrics, once queries have been routed in this process
+        fast_path = get_fast_path_stats().report()
+        if fast_path["queries"]:
+            status_text.append("Fast Path\t", style="cyan")
+            saved = f", ~{fast_path['saved_seconds']:.1f}s saved" if fast_path["saved_seconds"] is not None else ""
+            status_text.append(
+                f"{fast_path['hits']} of {fast_path['queries']} queries ({fast_path['hit_rate']:.0%}){saved}\n",
+                style="dim"
+            )
+
+        # Add place index metrics
+        place_index = places.get_place_index()
+        if place_index is not None:
+            known = place_index.stats()
+            status_text.append("Places\t\t", style="cyan")
+            status_text.append(f"{known['places']} known, {known['aliases']} spellings\n", style="dim")
+
         # Add available tools section
         status_text.append("\nAvailable Tools\n", style="bold green")
         
@@ -159,44 +183,124 @@ class CLI(object):
             expand=True
         ))
 
-    def repl(self):
-        """Start the Ranger REPL"""
+    def _print_system_status(self, timeout: float = None):
+        """Print the system status panel"""
+        self.console.print(Panel(
+            self._get_system_status(timeout=timeout),
+            title="[bold blue]System Status[/bold blue]",
+            border_style="red",
+            expand=True
+        ))
+
+    def _route_streaming(self, query: str) -> Tuple[str, str, List[str]]:
+        """Route a query, rendering the agent's progress in a live panel as it arrives"""
+        from rich.live import Live
+
+        progress = ""
+        result = ("", "", [])
+        streamed_deltas = False
+
+        def render() -> Panel:
+            lines = progress.strip("\n").splitlines()[-self.STREAM_PANEL_LINES:]
+            return Panel(
+                Text("\n".join(lines), style="dim"),
+                title="[bold green]Thinking...[/bold green]",
+                border_style="dim",
+                expand=True
+            )
+
+        with Live(render(), console=self.console, refresh_per_second=10, transient=True) as live:
+            for kind, payload in self.router.route_stream(query):
+                if kind == "delta":
+                    streamed_deltas = True
+                    progress += payload
+                elif kind == "thought" and not streamed_deltas:
+                    progress += f"\n{payload}"
+                elif kind == "step":
+                    progress += f"\n» {payload}\n"
+                elif kind == "answer":
+                    progress += f"\n{payload}"
+                elif kind == "done":
+                    result = payload
+                live.update(render())
+        return result
+
+    def _start_replay(self, record: str = None, replay: str = None, replay_speed: str = "original"):
+        """Record model and tool exchanges to `record`, or answer from the recordings in `replay`"""
+        from . import replay as replays
+
+        if not record and not replay:
+            return
+        replays.configure(record=record, replay=replay, speed=replay_speed)
+        if record:
+            self.console.print(f"[dim]Recording model and tool calls to {record}[/dim]")
+        else:
+            self.console.print(f"[dim]Replaying model and tool calls from {replay} ({replay_speed})[/dim]")
+
+    def repl(self, stream: bool = False, memory: bool = True, record: str = None, replay: str = None,
+             replay_speed: str = "original"):
+        """Start the Ranger REPL
+
+        Args:
+            stream: Show the agent's progress as it works instead of a spinner.
+            memory: Remember earlier turns so follow-up questions have context.
+                    Older turns are summarized to stay within RANGER_MEMORY_TOKENS.
+            record: Append every model and tool exchange, with its timing, to this file.
+            replay: Answer model and tool calls from a file written with `record`, without contacting any API.
+            replay_speed: "original" to take as long as the recorded calls did, "fast" to reply at once.
+        """
+        from rich.live import Live
+
+        self._start_replay(record, replay, replay_speed)
+
+        if memory:
+            from .memory import ConversationMemory
+            self._memory = ConversationMemory()
+            if self._router is not None:
+                self._router.memory = self._memory
+
         # Display welcome and status panels
         self.console.print(Panel(
             "[bold green]Welcome to Ranger![/bold green]\n"
-            "[dim]Type 'exit' or 'quit' to leave.[/dim]",
+            "[dim]Type 'exit' or 'quit' to leave"
+            f"{', or reset to forget the conversation' if memory else ''}.[/dim]",
             title="[bold blue]Ranger REPL[/bold blue]",
             border_style="blue",
             expand=True
         ))
         
-        self.console.print(Panel(
-            self._get_system_status(),
-            title="[bold blue]System Status[/bold blue]",
-            border_style="red",
-            expand=True
-        ))
+        # Don't block startup on slow providers; pending probes finish in the background
+        health = get_health_checker()
+        self._print_system_status(timeout=self.STATUS_STARTUP_WAIT)
+        status_pending = health.pending()
         
         while True:
             try:
+                if status_pending and not health.pending():
+                    self._print_system_status()
+                    status_pending = False
                 user_input = self.input("[bold green]ranger[/bold green] [dim]»[/dim] ")
                 if user_input.strip().lower() in ("exit", "quit"):
                     self.logger.info("User exited the REPL")
                     self.console.print("[yellow]Goodbye! 👋[/yellow]")
                     break
+                if user_input.strip().lower() == "reset" and self._memory is not None:
+                    self._memory.clear()
+                    self.console.print("[dim]Conversation forgotten.[/dim]")
+                    continue
                 
                 # Log the user input
-                self.logger.info(f"User query: {user_input}")
-                
-                # Show spinner while processing
-                spinner = Spinner("dots", text="Thinking...", style="bold green")
-                with Live(spinner, refresh_per_second=10) as live:
-                    # Route the query and get the response
-                    response, thoughts, tools_used = self.router.route(user_input)
-                    self.logger.info(f"Router response: {response}, thoughts: {thoughts}, tools_used: {tools_used}")
+                self.logger.info("User query: %s", user_input)
                 
-                # Log the response
-                self.logger.info(f"Response: {response}")
+                if stream:
+                    response, thoughts, tools_used = self._route_streaming(user_input)
+                else:
+                    # Show spinner while processing
+                    spinner = Spinner("dots", text="Thinking...", style="bold green")
+                    with Live(spinner, refresh_per_second=10) as live:
+                        # Route the query and get the response
+                        response, thoughts, tools_used = self.router.route(user_input)
+                self.log_response(response, thoughts, tools_used)
                 
                 # If debug mode is enabled, show the thoughts
                 if self.debug and thoughts:
@@ -228,7 +332,7 @@ class CLI(object):
                 self.console.print("\n[yellow]Goodbye! 👋[/yellow]")
                 break
             except Exception as e:
-                self.logger.error(f"Error occurred: {str(e)}", exc_info=True)
+                self.logger.error("Error occurred: %s", e, exc_info=True)
                 self.console.print(
                     Panel(
                         Text(f"An error occurred: {str(e)}", style="red"),
@@ -238,11 +342,24 @@ class CLI(object):
                     )
                 )
 
-    def run(self, query: str):
-        """Process a query directly without using the REPL."""
-        self.logger.info(f"Processing query: {query}")
-        response, thoughts, tools_used = self.router.route(query)
-        self.logger.info(f"Router response: {response}, thoughts: {thoughts}, tools_used: {tools_used}")
+    def run(self, query: str, stream: bool = False, record: str = None, replay: str = None,
+            replay_speed: str = "original"):
+        """Process a query directly without using the REPL.
+
+        Args:
+            query: The query to answer.
+            stream: Show the agent's progress as it works.
+            record: Append every model and tool exchange, with its timing, to this file.
+            replay: Answer model and tool calls from a file written with `record`, without contacting any API.
+            replay_speed: "original" to take as long as the recorded calls did, "fast" to reply at once.
+        """
+        self._start_replay(record, replay, replay_speed)
+        self.logger.info("Processing query: %s", query)
+        if stream:
+            response, thoughts, tools_used = self._route_streaming(query)
+        else:
+            response, thoughts, tools_used = self.router.route(query)
+        self.log_response(response, thoughts, tools_used)
         tools_text = f"\n\n[gray]Tools used: {', '.join(tools_used)}[/gray]" if tools_used else ""
         self.console.print(
             Panel(
@@ -253,6 +370,176 @@ class CLI(object):
             )
         )
 
+    def batch(self, input: str, workers: int = 4, out: str = None, resume: bool = True, record: str = None,
+              replay: str = None, replay_speed: str = "original"):
+        """Answer every query in a JSONL file over a pool of warm routers.
+
+        Args:
+            input: JSONL file with one {"id": ..., "query": ...} object (or query string) per line.
+            workers: Number of queries answered at once, each on its own router.
+            out: JSONL file results are appended to as they finish. Defaults to <input>.results.jsonl.
+            resume: Skip queries that already have a successful result in `out`.
+            record: Append every model and tool exchange, with its timing, to this file.
+            replay: Answer model and tool calls from a file written with `record`, without contacting any API.
+                    Together with `resume=False`, this load-tests Ranger offline with recorded traffic.
+            replay_speed: "original" to take as long as the recorded calls did, "fast" to reply at once.
+        """
+        self._start_replay(record, replay, replay_speed)
+        from .batch import run_batch
+        from .router import Router
+
+        out = out or str(Path(input).with_suffix(".results.jsonl"))
+        self.logger.info("Batch: %s -> %s with %s workers", input, out, workers)
+
+        def report(result: dict):
+            if "error" in result:
+                self.console.print(f"[red]✗ {result['id']}[/red] [dim]{result['error']}[/dim]")
+            else:
+                self.console.print(f"[green]✓ {result['id']}[/green] [dim]{result['seconds']:.1f}s[/dim]")
+
+        summary = run_batch(
+            input, out,
+            router_factory=lambda: Router(debug=self.debug),
+            workers=workers,
+            resume=resume,
+            on_result=report,
+        )
+        self.console.print(Panel(
+            f"[green]{summary['completed']} completed[/green], "
+            f"[red]{summary['failed']} failed[/red], "
+            f"[dim]{summary['skipped']} skipped[/dim] in {summary['seconds']:.1f}s\n"
+            f"[dim]Results: {out}[/dim]",
+            title="[bold blue]Batch[/bold blue]",
+            border_style="blue",
+            expand=True
+        ))
+
+    def serve(self, host: str = "127.0.0.1", port: int = 8080, workers: int = None, queue: int = None,
+              grace: float = None):
+        """Serve queries over HTTP from a pool of warm routers.
+
+        Endpoints: POST /route and /route/stream with {"query": ...}, GET /healthz and /metrics.
+
+        Args:
+            host: Interface to listen on.
+            port: Port to listen on.
+            workers: Queries answered at once, each on its own pre-built router. Defaults to RANGER_SERVE_WORKERS or 4.
+            queue: Queries allowed to wait for a router before new ones get 503. Defaults to RANGER_SERVE_QUEUE or 2 per worker.
+            grace: Seconds to let running queries finish on SIGINT/SIGTERM. Defaults to RANGER_SERVE_SHUTDOWN_GRACE or 30.
+        """
+        from .router import Router
+        from .server import RangerServer
+
+        with self.console.status("Building routers..."):
+            server = RangerServer(
+                router_factory=lambda: Router(debug=self.debug),
+                host=host, port=port, workers=workers, queue_size=queue,
+            )
+        limits = server.limits()
+        self.console.print(Panel(
+            f"Listening on [bold]{server.url}[/bold]\n"
+            f"[dim]{limits['workers']} workers, up to {limits['queue_size']} queued "
+            f"({limits['queue_timeout']:.0f}s timeout). Ctrl+C to stop.[/dim]",
+            title="[bold blue]Ranger Server[/bold blue]",
+            border_style="blue",
+            expand=True
+        ))
+        server.serve_forever(grace=grace)
+        self.console.print("[dim]Server stopped.[/dim]")
+
+    def stats(self, path: str = None, hours: float = None):
+        """Summarize recorded timing spans per component and tool.
+
+        Args:
+            path: Span file to read. Defaults to the file this CLI writes spans to.
+            hours: Only include spans from the last N hours.
+        """
+        path = Path(path) if path else tracing.trace_path()
+        if path is None or not path.exists():
+            self.console.print("[yellow]No spans recorded yet.[/yellow]")
+            return
+        since = datetime.now().timestamp() - hours * 3600 if hours else None
+        rows = tracing.aggregate(tracing.read_spans(path, since=since))
+
+        table = Table(title=f"Spans in {path}", expand=True)
+        table.add_column("Component", style="cyan")
+        table.add_column("Name", style="cyan")
+        table.add_column("Count", justify="right")
+        for pct in tracing.PERCENTILES:
+            table.add_column(f"p{pct}", justify="right")
+        table.add_column("Errors", justify="right", style="red")
+        table.add_column("Cache hits", justify="right")
+        table.add_column("Tokens in/out", justify="right", style="dim")
+        table.add_column("Cache read/write", justify="right", style="dim")
+        for row in rows:
+            table.add_row(
+                str(row["component"]),
+                str(row["name"]),
+                str(row["count"]),
+                *(f"{row[f'p{pct}']:.2f}s" for pct in tracing.PERCENTILES),
+                str(row["errors"]),
+                str(row["cache_hits"]),
+                f"{row['input_tokens']}/{row['output_tokens']}",
+                f"{row['cache_read_tokens']}/{row['cache_write_tokens']}",
+            )
+        self.console.print(table)
+
+    def bench(self, concurrency=(1, 4, 16), requests: int = 32, latency: float = 0.05,
+              scenarios="route,weather,travel", out: str = None):
+        """Benchmark routing and tools against local stand-in API servers.
+
+        Args:
+            concurrency: Concurrency levels to run, e.g. 1,4,16.
+            requests: Calls per scenario and concurrency level.
+            latency: Seconds of latency added to every stand-in API request.
+            scenarios: Any of route, tool_route, weather and travel, comma-separated.
+            out: JSONL file each run is appended to; the table then shows the
+                 throughput change since the previous run recorded there.
+        """
+        import json
+        from .bench import run_benchmarks
+
+        if isinstance(scenarios, str):
+            scenarios = [name.strip() for name in scenarios.split(",") if name.strip()]
+        with self.console.status("Benchmarking against stand-in servers..."):
+            run = run_benchmarks(concurrency=concurrency, requests=requests, latency=latency, scenarios=scenarios)
+
+        previous = {}
+        if out and Path(out).exists():
+            lines = Path(out).read_text(encoding="utf-8").splitlines()
+            if lines:
+                previous = {(row["scenario"], row["concurrency"]): row for row in json.loads(lines[-1])["results"]}
+
+        meta = run["meta"]
+        table = Table(title=f"Benchmark @ {meta['commit'] or 'unknown commit'} ({latency * 1000:.0f}ms upstream latency)", expand=True)
+        table.add_column("Scenario", style="cyan")
+        table.add_column("Concurrency", justify="right")
+        table.add_column("Calls/s", justify="right", style="green")
+        table.add_column("p50", justify="right")
+        table.add_column("p95", justify="right")
+        table.add_column("p99", justify="right")
+        table.add_column("Errors", justify="right", style="red")
+        table.add_column("Max RSS", justify="right", style="dim")
+        for row in run["results"]:
+            throughput = f"{row['throughput']:.1f}"
+            before = previous.get((row["scenario"], row["concurrency"]))
+            if before and before["throughput"]:
+                throughput += f" ({(row['throughput'] / before['throughput'] - 1):+.0%})"
+            table.add_row(
+                row["scenario"],
+                str(row["concurrency"]),
+                throughput,
+                *(f"{row[f'p{pct}'] * 1000:.0f}ms" for pct in (50, 95, 99)),
+                str(row["errors"]),
+                f"{row['max_rss_mb']} MB" if row["max_rss_mb"] is not None else "-",
+            )
+        self.console.print(table)
+
+        if out:
+            with open(out, "a", encoding="utf-8") as f:
+                f.write(json.dumps(run) + "\n")
+            self.console.print(f"[dim]Results appended to {out}[/dim]")
+
     def _check_status(self):
         """Check the status of all required APIs."""
         print("\nChecking API status...")
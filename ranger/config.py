@@ -0,0 +1,45 @@
+"""
+This module reads Ranger settings from the environment.
+"""
+
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def env_str(name: str, default: str = None) -> str:
+    """Read a string setting from the environment, treating empty values as unset."""
+    return os.environ.get(name) or default
+
+
+def env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment, falling back to the default."""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        logger.warning("Ignoring invalid %s=%r, using %s", name, value, default)
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment, falling back to the default."""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        logger.warning("Ignoring invalid %s=%r, using %s", name, value, default)
+        return default
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """Read a boolean flag from the environment."""
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
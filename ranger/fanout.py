@@ -0,0 +1,55 @@
+"""
+This module runs independent tool lookups concurrently on a bounded, process-wide thread pool.
+"""
+
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+from ranger.config import env_int
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FANOUT_WORKERS = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the shared fan-out pool, sized by RANGER_FANOUT_WORKERS."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = max(env_int("RANGER_FANOUT_WORKERS", DEFAULT_FANOUT_WORKERS), 1)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ranger-fanout")
+        return _executor
+
+
+def reset_executor():
+    """Shut the shared pool down so the next fan-out builds a new one."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = None
+
+
+def fan_out(func: Callable, items: Iterable[Tuple]) -> List[Tuple[Any, Optional[Exception]]]:
+    """Call `func(*item)` for every item concurrently and return (result, error) pairs in input order.
+
+    A failing item gets its exception instead of a result; the others are
+    unaffected. Each call runs in a copy of the caller's context, so spans
+    opened by it nest under the caller's span. Must not be called from a
+    fan-out worker, which could wait on a pool it is itself occupying.
+    """
+    executor = get_executor()
+    futures = [executor.submit(contextvars.copy_context().run, func, *item) for item in items]
+    outcomes = []
+    for future in futures:
+        try:
+            outcomes.append((future.result(), None))
+        except Exception as e:
+            outcomes.append((None, e))
+    return outcomes
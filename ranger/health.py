@@ -0,0 +1,151 @@
+"""
+This module runs the provider health checks concurrently and caches their results.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional, Tuple
+from ranger.config import env_float
+
+logger = logging.getLogger(__name__)
+
+PENDING = "⏳ Checking..."
+DEFAULT_TTL = 60.0
+
+
+def _maps_status() -> str:
+    """Probe Google Maps, importing the Maps tool (and googlemaps) only when a key is set."""
+    if not os.getenv("GMAPS_API_KEY"):
+        return "❌ Not configured"
+    from ranger.tools import maps
+    return maps.check_status()
+
+
+def _default_probes() -> Dict[str, Tuple[str, Callable[[], str]]]:
+    """The built-in probes, keyed by display name: (API key variable, probe)."""
+    from ranger.models.openai import OpenAIServerModel
+    from ranger.models.claude import ClaudeServerModel
+    return {
+        "OpenAI": ("OPENAI_API_KEY", OpenAIServerModel.check_status),
+        "Claude": ("ANTHROPIC_API_KEY", ClaudeServerModel.check_status),
+        "Google Maps": ("GMAPS_API_KEY", _maps_status),
+    }
+
+
+class HealthChecker:
+    """Runs every provider probe in parallel and keeps each result for `ttl` seconds.
+
+    Results are keyed on a fingerprint of the provider's API key, so changing a key
+    invalidates its cached status. Concurrent callers share in-flight probes.
+    """
+
+    def __init__(self, probes: Dict[str, Tuple[str, Callable[[], str]]] = None, ttl: float = None):
+        self._probes = probes
+        self.ttl = ttl if ttl is not None else env_float("RANGER_HEALTH_TTL", DEFAULT_TTL)
+        self._results = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def probes(self) -> Dict[str, Tuple[str, Callable[[], str]]]:
+        if self._probes is None:
+            self._probes = _default_probes()
+        return self._probes
+
+    @staticmethod
+    def _fingerprint(env_var: str) -> str:
+        key = os.getenv(env_var) or ""
+        return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max(len(self.probes), 1),
+                thread_name_prefix="ranger-health"
+            )
+        return self._executor
+
+    def _run(self, name: str, fingerprint: str, probe: Callable[[], str]) -> str:
+        started = time.monotonic()
+        try:
+            status = probe()
+        except Exception as e:
+            status = f"❌ Error: {str(e)}"
+        logger.debug("Health probe %s finished in %.2fs: %s", name, time.monotonic() - started, status)
+        with self._lock:
+            self._results[name] = (fingerprint, status, time.monotonic())
+            inflight = self._inflight.get(name)
+            if inflight is not None and inflight[0] == fingerprint:
+                del self._inflight[name]
+        return status
+
+    def refresh(self, force: bool = False) -> list:
+        """Start probes for every provider whose cached status is missing or stale.
+
+        Returns the futures of the probes that are running. Does not block.
+        """
+        futures = []
+        now = time.monotonic()
+        with self._lock:
+            for name, (env_var, probe) in self.probes.items():
+                fingerprint = self._fingerprint(env_var)
+                cached = self._results.get(name)
+                if not force and cached and cached[0] == fingerprint and now - cached[2] < self.ttl:
+                    continue
+                inflight = self._inflight.get(name)
+                if inflight is not None and inflight[0] == fingerprint:
+                    futures.append(inflight[1])
+                    continue
+                future = self._get_executor().submit(self._run, name, fingerprint, probe)
+                self._inflight[name] = (fingerprint, future)
+                futures.append(future)
+        return futures
+
+    def snapshot(self) -> Dict[str, str]:
+        """Return the latest known status of each provider, or PENDING if none is known yet."""
+        statuses = {}
+        with self._lock:
+            for name, (env_var, _) in self.probes.items():
+                cached = self._results.get(name)
+                if cached and cached[0] == self._fingerprint(env_var):
+                    statuses[name] = cached[1]
+                else:
+                    statuses[name] = PENDING
+        return statuses
+
+    def check(self, timeout: Optional[float] = None, force: bool = False) -> Dict[str, str]:
+        """Refresh stale statuses, wait up to `timeout` seconds for them and return a snapshot."""
+        futures = self.refresh(force=force)
+        if futures:
+            wait(futures, timeout=timeout)
+        return self.snapshot()
+
+    def pending(self) -> bool:
+        """Whether any probe is still running."""
+        with self._lock:
+            return bool(self._inflight)
+
+    def reset(self):
+        """Forget all cached statuses."""
+        with self._lock:
+            self._results.clear()
+            self._inflight.clear()
+
+
+_health_checker = None
+_health_checker_lock = threading.Lock()
+
+
+def get_health_checker() -> HealthChecker:
+    """Return the process-wide health checker shared by the CLI and RangerCore."""
+    global _health_checker
+    if _health_checker is None:
+        with _health_checker_lock:
+            if _health_checker is None:
+                _health_checker = HealthChecker()
+    return _health_checker
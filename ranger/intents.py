@@ -0,0 +1,184 @@
+"""
+This module recognises simple single-tool queries so the Router can answer them without running the agent.
+"""
+
+import re
+import logging
+import threading
+from collections import deque
+from typing import Optional
+from ranger.tracing import percentile
+
+logger = logging.getLogger(__name__)
+
+# Latency samples kept for the fast path and agent percentiles
+LATENCY_WINDOW = 500
+# Longer places are more likely a clause the patterns misread
+MAX_PLACE_WORDS = 8
+
+_WEATHER = [
+    re.compile(r"^(?:what(?:'s| is) the |how(?:'s| is) the )?(?:current )?weather(?: like)? "
+               r"(?:in|for|at) (?P<location>.+?)(?: (?:today|now|right now))?$", re.I),
+    # "Traverse City weather" names a place; "Good hiking weather" and "what weather" do not
+    re.compile(r"^(?!(?i:what|whats|how|hows|is|will|tell|give|show|get|check|any|the)\b)"
+               r"(?P<location>[A-Z0-9][\w.'#-]*(?:,? [A-Z0-9][\w.'#-]*)*) (?i:weather)"
+               r"(?: (?i:today|now|right now))?$"),
+]
+_BY = r"(?: by (?P<by>car|foot|bike|bicycle|transit|public transit|train|bus))?$"
+_TRAVEL = [
+    re.compile(r"^how long(?: does it take| will it take| would it take| is the (?P<trip>drive|walk|bike ride|trip))?"
+               r"(?: to (?P<verb>drive|walk|bike|cycle|get|go|travel))? from (?P<origin>.+?) to (?P<destination>.+?)" + _BY, re.I),
+    re.compile(r"^(?P<kind>travel|driving|drive|walking|cycling|transit) time from (?P<origin>.+?) to (?P<destination>.+?)" + _BY, re.I),
+]
+_MODES = {
+    "drive": "driving", "driving": "driving", "car": "driving",
+    "walk": "walking", "walking": "walking", "foot": "walking",
+    "bike": "bicycling", "bike ride": "bicycling", "bicycle": "bicycling", "cycle": "bicycling", "cycling": "bicycling",
+    "transit": "transit", "public transit": "transit", "train": "transit", "bus": "transit",
+}
+# Words that make a captured place a second request, a time or a reference to earlier turns
+_AMBIGUOUS = re.compile(
+    r"\b(?:and|then|via|through|or|from|to|with|versus|vs|compared?|tomorrow|tonight|yesterday|next|later|"
+    r"this|weekend|week|there|here|it|that|home|work)\b",
+    re.I,
+)
+# Times and dates other than now: "on Saturday", "in 3 days", "at 5pm", "in July", "at rush hour"
+_WHEN = re.compile(
+    r"\b(?:on|at|in|during|around|before|after|until|"
+    r"mon|tue|tues|wed|thu|thur|thurs|fri|sat|sun|(?:mon|tues|wednes|thurs|fri|satur|sun)day|"
+    r"jan|feb|mar|apr|jun|jul|aug|sep|sept|oct|nov|dec|january|february|march|april|may|june|july|august|"
+    r"september|october|november|december|morning|afternoon|evening|noon|midnight|rush|"
+    r"\d+ ?(?:am|pm|min|mins|minutes?|hours?|hrs?|days?|weeks?|months?)|\d{1,2}:\d{2})\b",
+    re.I,
+)
+_DURATION = re.compile(r"^\d+ (?:day|hour|min)", re.I)
+
+
+def _place(text: str) -> Optional[str]:
+    """A captured place, or None if it does not look like exactly one."""
+    place = text.strip(" ,")
+    if not place or len(place.split()) > MAX_PLACE_WORDS or _AMBIGUOUS.search(place) or _WHEN.search(place):
+        return None
+    return place
+
+
+class Intent:
+    """A query answerable with one call: the tool, its arguments and how to phrase its output."""
+
+    def __init__(self, tool: str, arguments: dict):
+        self.tool = tool
+        self.arguments = arguments
+
+    def answer(self, output) -> Optional[str]:
+        """The response for the tool's output, or None if the output is not a clean answer (e.g. an error)."""
+        output = str(output).strip()
+        if self.tool == "get_weather":
+            return f"Weather in {self.arguments['location']}:\n{output}" if output else None
+        if not _DURATION.match(output):
+            return None
+        return (f"Travel time from {self.arguments['start_location']} to {self.arguments['destination_location']} "
+                f"by {self.arguments['transportation_mode']}: {output}")
+
+    def __repr__(self) -> str:
+        return f"Intent({self.tool}, {self.arguments})"
+
+
+def classify(query: str) -> Optional[Intent]:
+    """Map a query that clearly asks for one weather report or one travel time to its tool call.
+
+    Anything else, including several places, times other than now and
+    references to earlier turns, returns None and is left to the agent.
+    """
+    text = " ".join(str(query).split()).strip(" ?!.")
+    for pattern in _WEATHER:
+        match = pattern.match(text)
+        if match:
+            location = _place(match.group("location"))
+            return Intent("get_weather", {"location": location}) if location else None
+    for pattern in _TRAVEL:
+        match = pattern.match(text)
+        if match:
+            origin, destination = _place(match.group("origin")), _place(match.group("destination"))
+            if not origin or not destination:
+                return None
+            words = [match.groupdict().get(name) for name in ("by", "verb", "trip", "kind")]
+            modes = {_MODES[word.lower()] for word in words if word and word.lower() in _MODES}
+            # "How long to walk ... by car" asks two things
+            if len(modes) > 1:
+                return None
+            return Intent("get_travel_duration", {
+                "start_location": origin,
+                "destination_location": destination,
+                "transportation_mode": modes.pop() if modes else "driving",
+            })
+    return None
+
+
+class FastPathStats:
+    """How many queries the fast path answered, and its latency next to the agent's."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+        self._fast = deque(maxlen=window)
+        self._agent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def hit(self, seconds: float):
+        with self._lock:
+            self.hits += 1
+            self._fast.append(seconds)
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def fallback(self):
+        """A query was classified but its tool call failed, so the agent answered it."""
+        with self._lock:
+            self.fallbacks += 1
+
+    def agent(self, seconds: float):
+        """Record how long an agent run took, to estimate what the fast path saves."""
+        with self._lock:
+            self._agent.append(seconds)
+
+    def report(self) -> dict:
+        """Hit rate, median latencies and the estimated agent time saved by the hits."""
+        with self._lock:
+            queries = self.hits + self.misses + self.fallbacks
+            fast, agent = list(self._fast), list(self._agent)
+            hits, misses, fallbacks = self.hits, self.misses, self.fallbacks
+        fast_p50 = percentile(fast, 50) if fast else None
+        agent_p50 = percentile(agent, 50) if agent else None
+        saved = round(hits * max(agent_p50 - fast_p50, 0), 3) if fast and agent else None
+        return {
+            "queries": queries,
+            "hits": hits,
+            "misses": misses,
+            "fallbacks": fallbacks,
+            "hit_rate": round(hits / queries, 3) if queries else 0.0,
+            "fast_p50": round(fast_p50, 3) if fast_p50 is not None else None,
+            "agent_p50": round(agent_p50, 3) if agent_p50 is not None else None,
+            "saved_seconds": saved,
+        }
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def get_fast_path_stats() -> FastPathStats:
+    """Return the process-wide fast path counters, shared by every Router."""
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = FastPathStats()
+        return _stats
+
+
+def reset_fast_path_stats():
+    global _stats
+    with _stats_lock:
+        _stats = None
@@ -0,0 +1,184 @@
+"""
+This module sends log records through a queue to a single rotating file written by a background thread.
+"""
+
+import copy
+import json
+import queue
+import atexit
+import random
+import logging
+import threading
+import logging.handlers
+from pathlib import Path
+from typing import Iterable, Optional
+from ranger.config import env_float, env_int, env_str
+from ranger.tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s - %(pathname)s:%(lineno)d"
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+DEFAULT_QUEUE_SIZE = 10000
+# Loggers whose INFO and DEBUG records are verbose agent traces, subject to RANGER_LOG_SAMPLE
+TRACE_LOGGERS = ("smolagents", "ranger.router.trace")
+# Chatty third-party loggers kept at the configured level, as before
+QUIET_LOGGERS = ("smolagents", "httpcore")
+
+_lock = threading.Lock()
+_listener = None
+_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with the trace ID of the span it was logged in."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "where": f"{record.pathname}:{record.lineno}",
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TraceSampler(logging.Filter):
+    """Keep a fraction of verbose agent-trace records, always whole traces at a time.
+
+    Records below WARNING from `loggers` are kept for `rate` of traces, chosen
+    by the current span's trace ID, so a sampled query keeps all of its lines;
+    records logged outside any span are sampled one by one. Every record that
+    passes is tagged with its trace ID.
+    """
+
+    def __init__(self, rate: float = 1.0, loggers: Iterable[str] = TRACE_LOGGERS):
+        super().__init__()
+        self.rate = rate
+        self.loggers = tuple(loggers)
+        self.dropped = 0
+
+    def _is_trace(self, name: str) -> bool:
+        return any(name == prefix or name.startswith(prefix + ".") for prefix in self.loggers)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        active = current_span()
+        record.trace_id = active.trace_id if active is not None else None
+        if self.rate >= 1 or record.levelno >= logging.WARNING or not self._is_trace(record.name):
+            return True
+        if record.trace_id:
+            keep = int(record.trace_id, 16) % 10000 < self.rate * 10000
+        else:
+            keep = random.random() < self.rate
+        if not keep:
+            self.dropped += 1
+        return keep
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler that never blocks the caller: records are dropped when the queue is full.
+
+    Records stay records on the queue. The base class formats each one on the
+    caller's thread so it could cross a process boundary; this queue never
+    leaves the process, so only the message is merged with its arguments
+    (they may change once the call returns) and the sink formats the rest.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def file_handler(path: str, max_bytes: int = DEFAULT_MAX_BYTES, backups: int = DEFAULT_BACKUPS,
+                 when: str = None) -> logging.Handler:
+    """A rotating file handler: by time when `when` is given (e.g. "midnight"), by size otherwise."""
+    if when:
+        return logging.handlers.TimedRotatingFileHandler(path, when=when, backupCount=backups, encoding="utf-8")
+    return logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+
+
+def configure(path: str, level: str = "INFO"):
+    """Route all logging through one queue to a single rotating sink at `path`.
+
+    The calling thread only filters a record, merges its message with its
+    arguments and enqueues it; formatting (timestamps, JSON, tracebacks) and
+    file I/O happen on a background listener thread. Settings come from
+    RANGER_LOG_FORMAT ("text" or "json"), RANGER_LOG_MAX_BYTES,
+    RANGER_LOG_BACKUPS, RANGER_LOG_ROTATE_WHEN, RANGER_LOG_QUEUE_SIZE and
+    RANGER_LOG_SAMPLE (the fraction of agent traces kept). Calling it again
+    replaces the previous pipeline.
+    """
+    global _listener, _handler
+    shutdown()
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    sink = file_handler(
+        path,
+        max_bytes=env_int("RANGER_LOG_MAX_BYTES", DEFAULT_MAX_BYTES),
+        backups=env_int("RANGER_LOG_BACKUPS", DEFAULT_BACKUPS),
+        when=env_str("RANGER_LOG_ROTATE_WHEN"),
+    )
+    json_output = env_str("RANGER_LOG_FORMAT", "text").lower() == "json"
+    sink.setFormatter(JsonFormatter() if json_output else logging.Formatter(TEXT_FORMAT))
+
+    handler = DroppingQueueHandler(queue.Queue(env_int("RANGER_LOG_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)))
+    handler.addFilter(TraceSampler(env_float("RANGER_LOG_SAMPLE", 1.0)))
+    listener = logging.handlers.QueueListener(handler.queue, sink, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, level))
+    root.addHandler(handler)
+    for name in QUIET_LOGGERS:
+        quiet = logging.getLogger(name)
+        quiet.setLevel(getattr(logging, level))
+        quiet.propagate = True
+    with _lock:
+        _listener, _handler = listener, handler
+    listener.start()
+
+
+def shutdown():
+    """Flush queued records to the sink and detach the pipeline."""
+    global _listener, _handler
+    with _lock:
+        listener, handler = _listener, _handler
+        _listener = _handler = None
+    if handler is not None:
+        logging.getLogger().removeHandler(handler)
+    if listener is not None:
+        listener.stop()
+        for sink in listener.handlers:
+            sink.close()
+
+
+def stats() -> Optional[dict]:
+    """Queue depth and records dropped by sampling or a full queue; None before `configure`."""
+    with _lock:
+        handler = _handler
+    if handler is None:
+        return None
+    sampled_out = sum(getattr(f, "dropped", 0) for f in handler.filters)
+    return {"queued": handler.queue.qsize(), "dropped": handler.dropped, "sampled_out": sampled_out}
+
+
+atexit.register(shutdown)
@@ -0,0 +1,130 @@
+"""
+This module keeps a bounded, compacting memory of conversation turns for multi-turn sessions.
+"""
+
+import re
+import logging
+import threading
+from typing import Callable, List
+from ranger.config import env_int
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_TOKENS = 1000
+DEFAULT_RECENT_TURNS = 3
+# Rough size of a token; the budget only needs to hold steady, not be exact
+CHARS_PER_TOKEN = 4
+# Longest answer excerpt kept in a turn summary
+SUMMARY_CHARS = 160
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class Turn:
+    """One query and the answer Ranger gave to it."""
+
+    def __init__(self, query: str, response: str, tools_used: List[str] = None):
+        self.query = query
+        self.response = response
+        self.tools_used = list(tools_used or [])
+
+    def render(self) -> str:
+        return f"User: {self.query}\nRanger: {self.response}"
+
+
+def summarize_turn(turn: Turn) -> str:
+    """A one-line extractive summary: the query, the start of the answer and the tools behind it.
+
+    Tool output quoted in the answer (full weather reports, step-by-step
+    routes) is cut to its first line.
+    """
+    answer = " ".join(turn.response.strip().splitlines()[:1])
+    answer = re.split(r"(?<=[.!?])\s", answer, maxsplit=1)[0]
+    if len(answer) > SUMMARY_CHARS:
+        answer = answer[:SUMMARY_CHARS].rstrip() + "…"
+    summary = f"- Asked: {turn.query.strip()} Answered: {answer}"
+    if turn.tools_used:
+        summary += f" (via {', '.join(turn.tools_used)})"
+    return summary
+
+
+class ConversationMemory:
+    """The last `recent_turns` turns verbatim, earlier ones as one-line summaries.
+
+    Everything rendered stays within `max_tokens`: summaries of the oldest
+    turns are dropped first, and a single oversized turn is truncated, so the
+    context added to each query stops growing after the first few turns.
+    Settings default to RANGER_MEMORY_TOKENS and RANGER_MEMORY_TURNS.
+    """
+
+    def __init__(self, max_tokens: int = None, recent_turns: int = None,
+                 summarize: Callable[[Turn], str] = summarize_turn):
+        self.max_tokens = max_tokens or env_int("RANGER_MEMORY_TOKENS", DEFAULT_MAX_TOKENS)
+        self.recent_turns = max(recent_turns or env_int("RANGER_MEMORY_TURNS", DEFAULT_RECENT_TURNS), 1)
+        self.summarize = summarize
+        self.turns: List[Turn] = []
+        self.summaries: List[str] = []
+        self.omitted = 0
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        return bool(self.turns or self.summaries)
+
+    def add(self, query: str, response: str, tools_used: List[str] = None):
+        """Record a finished turn, compacting older ones to stay within the budget."""
+        with self._lock:
+            self.turns.append(Turn(query, response, tools_used))
+            self._compact()
+
+    def clear(self):
+        with self._lock:
+            self.turns.clear()
+            self.summaries.clear()
+            self.omitted = 0
+
+    def _compact(self):
+        while len(self.turns) > self.recent_turns or (len(self.turns) > 1 and self._over_budget()):
+            self.summaries.append(self.summarize(self.turns.pop(0)))
+        while self.summaries and self._over_budget():
+            self.summaries.pop(0)
+            self.omitted += 1
+        if self._over_budget():
+            # A single turn larger than the whole budget: keep its query and the start of its answer
+            turn = self.turns[-1]
+            room = max(self.max_tokens * CHARS_PER_TOKEN - len(self._render(include_last=False)) - len(turn.query) - 64, 0)
+            turn.response = turn.response[:room].rstrip() + "…"
+        logger.debug("Conversation memory: %d turns, %d summaries, ~%d tokens",
+                     len(self.turns), len(self.summaries), self._tokens())
+
+    def _render(self, include_last: bool = True) -> str:
+        if not (self.turns or self.summaries or self.omitted):
+            return ""
+        lines = ["Conversation so far (use it to resolve follow-up questions):"]
+        if self.omitted or self.summaries:
+            lines.append("Earlier turns, summarized:")
+            if self.omitted:
+                lines.append(f"- ({self.omitted} earlier turns omitted)")
+            lines.extend(self.summaries)
+        turns = self.turns if include_last else self.turns[:-1]
+        if turns:
+            lines.append("Recent turns:")
+            lines.extend(turn.render() for turn in turns)
+        return "\n".join(lines)
+
+    def _tokens(self) -> int:
+        return estimate_tokens(self._render())
+
+    def _over_budget(self) -> bool:
+        return self._tokens() > self.max_tokens
+
+    def render(self) -> str:
+        """The conversation context to put before the next query, or "" when there is none."""
+        with self._lock:
+            return self._render()
+
+    def tokens(self) -> int:
+        """Estimated tokens `render` adds to a prompt."""
+        with self._lock:
+            return self._tokens()
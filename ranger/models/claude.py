@@ -1,54 +1,279 @@
 import os
+import json
+import hashlib
 import logging
-import requests
+from typing import Iterator, List, Tuple, Union
+from ranger.config import env_flag
+from ranger.ratelimit import get_limiter
+from ranger.replay import exchange
+from ranger.singleflight import get_flight
+from ranger.tracing import annotate
+from ranger.transport import get_transport
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MODEL_ID = "claude-sonnet-4-20250514"
+DEFAULT_BASE_URL = "https://api.anthropic.com"
+CACHE_CONTROL = {"type": "ephemeral"}
+# smolagents roles that have no Messages API equivalent
+ROLE_MAP = {"tool-call": "assistant", "tool-response": "user"}
+# Rough size of a token, for reserving rate limit budget before the real usage is known
+CHARS_PER_TOKEN = 4
+
+
+def usage_counts(usage: dict) -> dict:
+    """One call's Messages API usage report as span attributes: input, output and prompt cache tokens."""
+    usage = usage if isinstance(usage, dict) else {}
+    return {
+        "input_tokens": usage.get("input_tokens"),
+        "output_tokens": usage.get("output_tokens"),
+        "cache_read_tokens": usage.get("cache_read_input_tokens"),
+        "cache_write_tokens": usage.get("cache_creation_input_tokens"),
+    }
+
+
+def billed_tokens(usage: dict) -> int:
+    """Tokens a call counts against the rate limit: uncached input, cache writes and output."""
+    counts = usage_counts(usage)
+    return sum(counts[name] or 0 for name in ("input_tokens", "cache_write_tokens", "output_tokens"))
+
+
+def api_base_url() -> str:
+    """The Anthropic API root, overridable with ANTHROPIC_BASE_URL (e.g. to point at a local stand-in)."""
+    return (os.environ.get("ANTHROPIC_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+
 class ClaudeServerModel:
-    def __init__(self, model_id: str = "claude-sonnet-4-20250514"):
+    def __init__(self, model_id: str = DEFAULT_MODEL_ID, temperature: float = None):
         self.model_id = model_id
+        # Sampling temperature; None leaves the API default. Only temperature 0 calls are coalesced
+        self.temperature = temperature
         self.api_key = os.getenv("ANTHROPIC_API_KEY")
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY environment variable is not set.")
-        self.api_url = "https://api.anthropic.com/v1/messages"
+        self.api_url = f"{api_base_url()}/v1/messages"
+        # Mark stable prefixes for prompt caching; RANGER_PROMPT_CACHE=0 turns it off
+        self.prompt_cache = env_flag("RANGER_PROMPT_CACHE", True)
+        # Token usage of the last call, named as on smolagents models
+        self.last_input_token_count = None
+        self.last_output_token_count = None
+        self.last_cache_read_token_count = None
+        self.last_cache_write_token_count = None
+        self.headers = {
+            "x-api-key": self.api_key,
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json"
+        }
         logger.debug("ClaudeServerModel initialized with model_id: %s", model_id)
 
-    def generate(self, prompt: str, stop_sequences: list = None) -> str:
+    def generate(self, prompt: Union[str, list], stop_sequences: list = None, system: Union[str, list] = None) -> str:
         """
         Generate a response using the Claude API.
         
         Args:
-            prompt: The input prompt for the model.
+            prompt: The input prompt for the model, or a list of chat messages.
             stop_sequences: Optional list of sequences where the model should stop generating.
+            system: Optional stable instructions, sent as cacheable system blocks.
             
         Returns:
             The generated response as a string.
         """
-        if not isinstance(prompt, str) or not prompt.strip():
-            logger.error("Prompt must be a non-empty string. Got: %r", prompt)
-            raise ValueError("Prompt must be a non-empty string.")
-        headers = {
-            "x-api-key": self.api_key,
-            "anthropic-version": "2023-06-01",
-            "content-type": "application/json"
-        }
+        return self._text(self._send(self._build_payload(prompt, stop_sequences, system)))
+
+    def _send(self, payload: dict) -> dict:
+        """Send a request, recorded or replayed as one exchange.
+
+        Deterministic requests (temperature 0) that are identical and in flight
+        at the same time share one API call. The returned message carries the
+        call's usage, which is also put on the current span: the last_*
+        attributes are shared by every thread using this instance, so they are
+        only reliable when one thread makes all the calls.
+        """
+        key = self._flight_key(payload)
+        if payload.get("temperature") != 0:
+            result = exchange("model", self.model_id, key, self._request, payload)
+        else:
+            result = get_flight("anthropic").do(key, exchange, "model", self.model_id, key, self._request, payload)
+        self._record_usage(result.get("usage"))
+        annotate(**usage_counts(result.get("usage")))
+        return result
+
+    def _request(self, payload: dict) -> dict:
+        estimate = self._estimate_tokens(payload)
+        get_limiter("anthropic").acquire(tokens=estimate, requests=0)
+        try:
+            response = get_transport().post(self.api_url, headers=self.headers, json=payload)
+            return self._parse_response(response, estimate)
+        except Exception as e:
+            logger.error("Error generating response from Claude API: %s", str(e))
+            raise
+
+    def _parse_response(self, response, estimate: int = 0) -> dict:
+        """Raise for API errors, settle the rate limit reservation with the real usage and return the decoded message."""
+        if response.status_code != 200:
+            logger.error("Anthropic API error %s: %s", response.status_code, response.text)
+            get_limiter("anthropic").record_tokens(0, estimate)
+        response.raise_for_status()
+        result = response.json()
+        get_limiter("anthropic").record_tokens(billed_tokens(result.get("usage")), estimate)
+        return result
+
+    @staticmethod
+    def _text(result: dict) -> str:
+        """The text of the first content block of a message."""
+        return (result.get("content") or [{}])[0].get("text", "")
+
+    def _flight_key(self, payload: dict) -> str:
+        """Requests with the same endpoint and payload are interchangeable and can be coalesced."""
+        body = json.dumps(payload, sort_keys=True)
+        return hashlib.sha256(f"{self.api_url}|{body}".encode()).hexdigest()
+
+    @staticmethod
+    def _estimate_tokens(payload: dict) -> int:
+        """Tokens a request may use: its prompt, estimated from its size, plus the most it can generate."""
+        prompt = json.dumps([payload.get("system"), payload.get("tools"), payload["messages"]])
+        return len(prompt) // CHARS_PER_TOKEN + payload.get("max_tokens", 0)
+
+    def _record_usage(self, usage: dict):
+        if not isinstance(usage, dict):
+            return
+        if "input_tokens" in usage:
+            self.last_input_token_count = usage["input_tokens"]
+            # Cache counters only appear on the first usage report of a call
+            self.last_cache_read_token_count = usage.get("cache_read_input_tokens") or 0
+            self.last_cache_write_token_count = usage.get("cache_creation_input_tokens") or 0
+            if self.last_cache_read_token_count or self.last_cache_write_token_count:
+                logger.debug(
+                    "Prompt cache: %s tokens read, %s written",
+                    self.last_cache_read_token_count, self.last_cache_write_token_count,
+                )
+        if "output_tokens" in usage:
+            self.last_output_token_count = usage["output_tokens"]
+
+    def _build_payload(self, prompt: Union[str, list], stop_sequences: list = None, system: Union[str, list] = None,
+                       tool_blocks: bool = False) -> dict:
+        """Validate the prompt and build the Messages API payload.
+
+        System text (from `system` and any system-role messages) is sent as
+        system blocks. With prompt caching on, the last system block and the
+        last message block are marked as cache breakpoints, so the static
+        preamble and, on multi-step runs, the conversation so far are read
+        from the cache by the next call.
+        """
+        if isinstance(prompt, str):
+            if not prompt.strip():
+                logger.error("Prompt must be a non-empty string. Got: %r", prompt)
+                raise ValueError("Prompt must be a non-empty string.")
+            system_texts, messages = [], [{"role": "user", "content": prompt}]
+        elif isinstance(prompt, list) and prompt:
+            system_texts, messages = self._convert_messages(prompt, tool_blocks)
+            if not messages:
+                raise ValueError("Messages must include at least one non-system message.")
+        else:
+            logger.error("Prompt must be a non-empty string or message list. Got: %r", prompt)
+            raise ValueError("Prompt must be a non-empty string or message list.")
+
+        if isinstance(system, str):
+            system = [system]
+        system_blocks = [{"type": "text", "text": text} for text in list(system or []) + system_texts if text]
+        if self.prompt_cache:
+            if system_blocks:
+                system_blocks[-1]["cache_control"] = CACHE_CONTROL
+            if len(messages) > 1:
+                messages[-1]["content"][-1]["cache_control"] = CACHE_CONTROL
+
         payload = {
             "model": self.model_id,
-            "messages": [{"role": "user", "content": prompt}],
+            "messages": messages,
             "max_tokens": 1000
         }
+        if system_blocks:
+            payload["system"] = system_blocks
         if stop_sequences:
             payload["stop_sequences"] = stop_sequences
+        if self.temperature is not None:
+            payload["temperature"] = self.temperature
+        return payload
+
+    @staticmethod
+    def _text_blocks(message) -> Tuple[str, List[dict]]:
+        """The role of a chat message (a dict or smolagents ChatMessage) and its non-empty text blocks."""
+        if isinstance(message, dict):
+            role, content = message.get("role"), message.get("content")
+        else:
+            role, content = getattr(message, "role", None), getattr(message, "content", None)
+        role = getattr(role, "value", role)
+        if isinstance(content, str):
+            blocks = [{"type": "text", "text": content}]
+        else:
+            blocks = [{"type": "text", "text": block.get("text", "")}
+                      for block in content or [] if isinstance(block, dict) and block.get("type") == "text"]
+        return role, [block for block in blocks if block["text"]]
+
+    @classmethod
+    def _convert_messages(cls, messages: list, tool_blocks: bool = False) -> Tuple[List[str], List[dict]]:
+        """Split chat messages (dicts or smolagents ChatMessages) into system texts and Messages API turns.
+
+        Earlier tool calls and their results are sent as text; `tool_blocks` is
+        for models that send tools with the request (see ClaudeChatModel).
+        """
+        system_texts = []
+        converted = []
+        for message in messages:
+            role, blocks = cls._text_blocks(message)
+            if not blocks:
+                continue
+            if role == "system":
+                system_texts.extend(block["text"] for block in blocks)
+            else:
+                converted.append({"role": ROLE_MAP.get(role, role), "content": blocks})
+        return system_texts, converted
+
+    def generate_stream(self, prompt: Union[str, list], stop_sequences: list = None, system: Union[str, list] = None) -> Iterator[str]:
+        """
+        Stream a response from the Claude API as it is generated.
+        
+        Args:
+            prompt: The input prompt for the model, or a list of chat messages.
+            stop_sequences: Optional list of sequences where the model should stop generating.
+            system: Optional stable instructions, sent as cacheable system blocks.
+            
+        Yields:
+            Chunks of generated text, in order.
+        """
+        payload = self._build_payload(prompt, stop_sequences, system)
+        payload["stream"] = True
+        estimate = self._estimate_tokens(payload)
+        limiter = get_limiter("anthropic")
+        limiter.acquire(tokens=estimate, requests=0)
+        # This call's usage, gathered from the message_start and message_delta events
+        usage = {}
+        completed = False
         try:
-            response = requests.post(self.api_url, headers=headers, json=payload)
-            if response.status_code != 200:
-                logger.error("Anthropic API error %s: %s", response.status_code, response.text)
-            response.raise_for_status()
-            result = response.json()
-            return result.get("content", [{}])[0].get("text", "")
+            for line in get_transport().stream_lines("POST", self.api_url, headers=self.headers, json=payload):
+                # Server-sent events: only the data lines carry content
+                if not line or not line.startswith("data:"):
+                    continue
+                event = json.loads(line[len("data:"):].strip())
+                if event.get("type") in ("message_start", "message_delta"):
+                    reported = event.get("message", {}).get("usage") if event["type"] == "message_start" else event.get("usage")
+                    self._record_usage(reported)
+                    usage.update(reported or {})
+                elif event.get("type") == "content_block_delta":
+                    delta = event.get("delta", {})
+                    if delta.get("type") == "text_delta":
+                        yield delta.get("text", "")
+                elif event.get("type") == "error":
+                    raise RuntimeError(f"Anthropic stream error: {event.get('error')}")
+                elif event.get("type") == "message_stop":
+                    completed = True
+                    annotate(**usage_counts(usage))
+                    return
         except Exception as e:
-            logger.error("Error generating response from Claude API: %s", str(e))
+            logger.error("Error streaming response from Claude API: %s", str(e))
             raise
+        finally:
+            # Failed, dropped or abandoned streams give back the reserved tokens, as _parse_response does
+            limiter.record_tokens(billed_tokens(usage) if completed else 0, estimate)
 
     @staticmethod
     def check_status() -> str:
@@ -57,8 +282,8 @@ class ClaudeServerModel:
         if not claude_key:
             return "❌ Not configured"
         try:
-            response = requests.get(
-                "https://api.anthropic.com/v1/messages",
+            response = get_transport().get(
+                f"{api_base_url()}/v1/models",
                 headers={
                     "x-api-key": claude_key,
                     "anthropic-version": "2023-06-01"
@@ -0,0 +1,216 @@
+"""
+This module adapts the Claude Messages API to the smolagents model interface, with native and parallel tool use.
+"""
+
+import re
+import ast
+import logging
+from typing import Iterator, List, Optional, Tuple
+from smolagents.models import (
+    ChatMessage,
+    ChatMessageStreamDelta,
+    ChatMessageToolCall,
+    ChatMessageToolCallDefinition,
+    get_tool_call_from_text,
+    get_tool_json_schema,
+    parse_json_if_needed,
+)
+from ranger.models.claude import ClaudeServerModel, DEFAULT_MODEL_ID, ROLE_MAP
+
+logger = logging.getLogger(__name__)
+
+# Make the model call at least one tool; agents end a run by calling final_answer
+TOOL_CHOICE = {"type": "any"}
+# How smolagents writes a step's tool calls and results into the conversation
+CALLING_TOOLS = "Calling tools:\n"
+OBSERVATION = "Observation:\n"
+# ParallelToolCallingAgent starts each call's observation with "Call id: <id> (<tool>)"
+_CALL_ID = re.compile(r"(?:^|\n\n)Call id: (\S+)(?: \([^)\n]*\))?\n")
+NO_RESULT = "No result was returned for this call."
+
+
+def tool_definition(tool) -> dict:
+    """A smolagents tool as a Messages API tool definition."""
+    function = get_tool_json_schema(tool)["function"]
+    schema = function["parameters"]
+    # Optional inputs are simply left out of "required"; "nullable" is not JSON Schema
+    for prop in schema["properties"].values():
+        prop.pop("nullable", None)
+    return {"name": function["name"], "description": function["description"], "input_schema": schema}
+
+
+class ClaudeChatModel(ClaudeServerModel):
+    """ClaudeServerModel with the smolagents model interface: chat messages in, ChatMessages out.
+
+    Given `tools_to_call_from`, the tools are sent as Messages API tool
+    definitions and every tool_use block of the reply becomes one of the
+    message's tool calls, so a single turn can ask for several tools at once.
+    Requests are coalesced (at temperature 0), recorded and replayed like
+    ClaudeServerModel's.
+    """
+
+    def __init__(self, model_id: str = DEFAULT_MODEL_ID, temperature: float = None, tool_name_key: str = "name",
+                 tool_arguments_key: str = "arguments"):
+        super().__init__(model_id=model_id, temperature=temperature)
+        # Keys of a tool call written out as JSON text, for parse_tool_calls
+        self.tool_name_key = tool_name_key
+        self.tool_arguments_key = tool_arguments_key
+
+    def _chat_payload(self, messages, stop_sequences: List[str] = None, tools_to_call_from: list = None) -> dict:
+        # Tool blocks are only valid in a request that defines tools; CodeAgent's
+        # python_interpreter calls stay text
+        payload = self._build_payload(messages, stop_sequences, tool_blocks=bool(tools_to_call_from))
+        if tools_to_call_from:
+            payload["tools"] = [tool_definition(tool) for tool in tools_to_call_from]
+            payload["tool_choice"] = TOOL_CHOICE
+        return payload
+
+    @classmethod
+    def _convert_messages(cls, messages: list, tool_blocks: bool = False) -> Tuple[List[str], List[dict]]:
+        """Like ClaudeServerModel's, but with `tool_blocks` earlier tool calls and their results go back as tool_use and tool_result blocks.
+
+        smolagents writes them as "Calling tools:" and "Observation:" text;
+        they are read back into blocks so the model sees its own tool use in
+        the shape it produced it. Every tool_use gets a tool_result, as the
+        API requires, and consecutive turns of one role are merged.
+        """
+        if not tool_blocks:
+            return super()._convert_messages(messages)
+        system_texts, turns = [], []
+        pending, results, notes = [], {}, []
+
+        def add(role: str, blocks: List[dict]):
+            if turns and turns[-1]["role"] == role:
+                turns[-1]["content"].extend(blocks)
+            else:
+                turns.append({"role": role, "content": blocks})
+
+        def close():
+            # tool_result blocks lead the user turn that follows the tool calls
+            blocks = []
+            for call_id in pending:
+                output, failed = results.get(call_id, (NO_RESULT, True))
+                block = {"type": "tool_result", "tool_use_id": call_id, "content": output}
+                if failed:
+                    block["is_error"] = True
+                blocks.append(block)
+            add("user", blocks + [{"type": "text", "text": note} for note in notes])
+            pending.clear()
+            results.clear()
+            notes.clear()
+
+        for message in messages:
+            role, blocks = cls._text_blocks(message)
+            if not blocks:
+                continue
+            text = "\n".join(block["text"] for block in blocks)
+            if role == "tool-response" and pending:
+                _read_results(text, pending, results, notes)
+                continue
+            if pending:
+                close()
+            calls = _tool_calls(text) if role == "tool-call" else None
+            if role == "system":
+                system_texts.append(text)
+            elif calls:
+                add("assistant", [{"type": "tool_use", "id": call["id"], "name": call["name"], "input": call["input"]}
+                                  for call in calls])
+                pending.extend(call["id"] for call in calls)
+            else:
+                add(ROLE_MAP.get(role, role), blocks)
+        if pending:
+            close()
+        return system_texts, turns
+
+    def generate(self, messages, stop_sequences: List[str] = None, response_format: dict = None,
+                 tools_to_call_from: list = None, **kwargs) -> ChatMessage:
+        """
+        Generate the next assistant message for a conversation.
+
+        Args:
+            messages: Chat messages (dicts or smolagents ChatMessages), or a prompt string.
+            stop_sequences: Optional list of sequences where the model should stop generating.
+            response_format: Not supported by the Messages API; ignored.
+            tools_to_call_from: Optional smolagents tools the model must choose from.
+
+        Returns:
+            The reply as a ChatMessage, with one tool call per tool_use block.
+        """
+        return self._chat_message(self._send(self._chat_payload(messages, stop_sequences, tools_to_call_from)))
+
+    def __call__(self, *args, **kwargs) -> ChatMessage:
+        return self.generate(*args, **kwargs)
+
+    def generate_stream(self, messages, stop_sequences: List[str] = None, **kwargs) -> Iterator[ChatMessageStreamDelta]:
+        """Stream a reply as smolagents stream deltas; tools are not offered while streaming."""
+        for text in super().generate_stream(messages, stop_sequences):
+            yield ChatMessageStreamDelta(content=text)
+
+    @staticmethod
+    def _chat_message(result: dict) -> ChatMessage:
+        blocks = result.get("content") or []
+        text = "".join(block.get("text", "") for block in blocks if block.get("type") == "text")
+        tool_calls = [
+            ChatMessageToolCall(
+                id=block["id"],
+                type="function",
+                function=ChatMessageToolCallDefinition(name=block["name"], arguments=block.get("input") or {}),
+            )
+            for block in blocks if block.get("type") == "tool_use"
+        ]
+        if tool_calls:
+            logger.debug("Claude asked for %d tool calls: %s", len(tool_calls),
+                         ", ".join(call.function.name for call in tool_calls))
+        return ChatMessage(role="assistant", content=text, tool_calls=tool_calls or None, raw=result)
+
+    def parse_tool_calls(self, message: ChatMessage) -> ChatMessage:
+        """Read a tool call written out as JSON text, for replies that came without tool_use blocks."""
+        message.role = "assistant"
+        if not message.tool_calls:
+            if not message.content:
+                raise ValueError("The model reply has neither tool calls nor text to parse one from.")
+            message.tool_calls = [get_tool_call_from_text(message.content, self.tool_name_key, self.tool_arguments_key)]
+        for tool_call in message.tool_calls:
+            tool_call.function.arguments = parse_json_if_needed(tool_call.function.arguments)
+        return message
+
+
+def _tool_calls(text: str) -> Optional[List[dict]]:
+    """The calls in a "Calling tools:" message, or None if it cannot be read back."""
+    if not text.startswith(CALLING_TOOLS):
+        return None
+    try:
+        written = ast.literal_eval(text[len(CALLING_TOOLS):])
+        calls = [{"id": str(call["id"]), "name": call["function"]["name"],
+                  "input": parse_json_if_needed(call["function"]["arguments"])} for call in written]
+    except (ValueError, SyntaxError, TypeError, KeyError):
+        logger.debug("Could not read tool calls back from: %s", text)
+        return None
+    for call in calls:
+        if not isinstance(call["input"], dict):
+            call["input"] = {"answer": call["input"]} if call["name"] == "final_answer" else {"input": call["input"]}
+    return calls
+
+
+def _read_results(text: str, pending: List[str], results: dict, notes: List[str]):
+    """Match a tool response to the pending calls: per "Call id" section, or whole to the first unanswered call."""
+    error = text.startswith("Call id: ") and "\nError:\n" in text
+    if text.startswith(OBSERVATION):
+        text = text[len(OBSERVATION):]
+    parts = _CALL_ID.split(text)
+    sections = dict(zip(parts[1::2], parts[2::2]))
+    if error:
+        # smolagents files a step's error under its first call; it belongs to the calls left without a result
+        message = _CALL_ID.split(text, maxsplit=1)[-1].strip()
+        unanswered = [call_id for call_id in pending if call_id not in results]
+        for call_id in unanswered:
+            results[call_id] = (message, True)
+        if not unanswered:
+            notes.append(message)
+        return
+    for call_id, output in sections.items():
+        if call_id in pending:
+            results[call_id] = (output.strip(), False)
+    unanswered = [call_id for call_id in pending if call_id not in results]
+    if not sections and unanswered:
+        results[unanswered[0]] = (text.strip(), False)
@@ -0,0 +1,224 @@
+"""
+This module hedges model calls across providers and fails over based on recent latency and errors.
+"""
+
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List
+from ranger.config import env_float, env_int
+from ranger.tracing import annotate, percentile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEDGE_PERCENTILE = 95
+# Hedge delay before a provider has enough history for a percentile
+DEFAULT_INITIAL_DELAY = 5.0
+# Never hedge sooner than this; fast calls are not worth doubling
+DEFAULT_MIN_DELAY = 0.5
+DEFAULT_WINDOW = 50
+# Latency samples needed before the percentile is trusted
+MIN_SAMPLES = 5
+# Each point of error rate counts as this many times the provider's median latency
+ERROR_PENALTY = 4.0
+
+
+class ProviderStats:
+    """A moving window of one provider's call latencies and failures."""
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self._calls = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool):
+        with self._lock:
+            self._calls.append((seconds, ok))
+
+    def latencies(self) -> List[float]:
+        with self._lock:
+            return [seconds for seconds, ok in self._calls if ok]
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self._calls:
+                return 0.0
+            return sum(1 for _, ok in self._calls if not ok) / len(self._calls)
+
+    def latency(self, pct: float, default: float) -> float:
+        """The pct-th percentile of successful call latency, or `default` with too little history."""
+        latencies = self.latencies()
+        return percentile(latencies, pct) if len(latencies) >= MIN_SAMPLES else default
+
+    def score(self, default: float) -> float:
+        """Lower is better: median latency, inflated by the error rate."""
+        return self.latency(50, default) * (1 + ERROR_PENALTY * self.error_rate())
+
+    def to_dict(self) -> dict:
+        latencies = self.latencies()
+        return {
+            "calls": len(self._calls),
+            "error_rate": round(self.error_rate(), 3),
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+        }
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def get_provider_stats(name: str) -> ProviderStats:
+    """Return the process-wide latency and error window for a provider, shared by all hedged models."""
+    with _stats_lock:
+        if name not in _stats:
+            _stats[name] = ProviderStats(env_int("RANGER_HEDGE_WINDOW", DEFAULT_WINDOW))
+        return _stats[name]
+
+
+def provider_report() -> dict:
+    """Latency and error windows of every provider seen by a hedged model in this process."""
+    with _stats_lock:
+        stats = dict(_stats)
+    return {name: window.to_dict() for name, window in stats.items()}
+
+
+def reset_provider_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _as_chat_message(result):
+    """Give plain-text completions (e.g. from ClaudeServerModel) the ChatMessage shape agents expect."""
+    if isinstance(result, str):
+        from smolagents.models import ChatMessage
+        return ChatMessage(role="assistant", content=result)
+    return result
+
+
+class HedgedModel:
+    """A model that sends each call to the best provider and hedges slow calls to the next one.
+
+    The primary is the provider with the best recent latency and error record
+    (ties go to the order `models` is given in). If it has not answered after
+    the `hedge_percentile` of its recent latency, the same call goes to the
+    next provider as well and the first good answer wins; if it fails, the
+    call fails over at once. The losing call cannot be interrupted mid-request,
+    so it is cancelled if it has not started and otherwise left to finish in
+    the background with its result discarded; its latency still counts.
+
+    Latency windows are shared per provider across the process unless `stats`
+    is given. Settings default to RANGER_HEDGE_PERCENTILE,
+    RANGER_HEDGE_MIN_DELAY, RANGER_HEDGE_INITIAL_DELAY and RANGER_HEDGE_WINDOW.
+    """
+
+    def __init__(self, models: Dict[str, object], hedge_percentile: float = None, min_delay: float = None,
+                 initial_delay: float = None, stats: Dict[str, ProviderStats] = None):
+        if not models:
+            raise ValueError("HedgedModel needs at least one model.")
+        self.models = dict(models)
+        self.hedge_percentile = hedge_percentile or env_float("RANGER_HEDGE_PERCENTILE", DEFAULT_HEDGE_PERCENTILE)
+        self.min_delay = min_delay if min_delay is not None else env_float("RANGER_HEDGE_MIN_DELAY", DEFAULT_MIN_DELAY)
+        self.initial_delay = initial_delay or env_float("RANGER_HEDGE_INITIAL_DELAY", DEFAULT_INITIAL_DELAY)
+        stats = stats or {}
+        self.stats = {name: stats.get(name) or get_provider_stats(name) for name in self.models}
+        self.hedges = 0
+        self.failovers = 0
+        self.last_provider = None
+        # Token usage of the winning call, named as on smolagents models
+        self.last_input_token_count = None
+        self.last_output_token_count = None
+        self._executor = ThreadPoolExecutor(max_workers=2 * len(self.models), thread_name_prefix="ranger-hedge")
+
+    @property
+    def model_id(self) -> str:
+        return "+".join(getattr(model, "model_id", name) for name, model in self.models.items())
+
+    def ranked(self) -> List[str]:
+        """Provider names, best first."""
+        order = list(self.models)
+        return sorted(order, key=lambda name: (self.stats[name].score(self.initial_delay), order.index(name)))
+
+    def hedge_delay(self, name: str) -> float:
+        return max(self.min_delay, self.stats[name].latency(self.hedge_percentile, self.initial_delay))
+
+    def _call(self, name: str, args, kwargs):
+        start = time.perf_counter()
+        try:
+            result = self.models[name].generate(*args, **kwargs)
+        except Exception:
+            self.stats[name].record(time.perf_counter() - start, ok=False)
+            raise
+        self.stats[name].record(time.perf_counter() - start, ok=True)
+        return result
+
+    def _submit(self, name: str, args, kwargs):
+        # Carry the caller's context (and so its current span) into the worker thread
+        return self._executor.submit(contextvars.copy_context().run, self._call, name, args, kwargs)
+
+    def generate(self, messages, stop_sequences: List[str] = None, **kwargs):
+        """Generate with hedging and failover; returns the winning provider's ChatMessage."""
+        args, kwargs = (messages,), dict(kwargs, stop_sequences=stop_sequences)
+        waiting = list(self.ranked())
+        running = {}
+        errors = []
+        name = waiting.pop(0)
+        running[self._submit(name, args, kwargs)] = name
+        deadline = time.monotonic() + self.hedge_delay(name)
+
+        while running:
+            timeout = max(deadline - time.monotonic(), 0) if waiting else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning("Model provider %s failed: %s", name, str(e))
+                    errors.append(e)
+                    continue
+                for loser in running:
+                    loser.cancel()
+                return self._won(name, result)
+            if waiting and (not running or not done):
+                # The primary failed (fail over) or is slower than usual (hedge)
+                backup = waiting.pop(0)
+                if running:
+                    self.hedges += 1
+                    logger.info("Hedging slow model call to %s", backup)
+                else:
+                    self.failovers += 1
+                    logger.info("Failing model call over to %s", backup)
+                running[self._submit(backup, args, kwargs)] = backup
+                deadline = time.monotonic() + self.hedge_delay(backup)
+        raise errors[-1]
+
+    def _won(self, name: str, result):
+        model = self.models[name]
+        self.last_provider = name
+        self.last_input_token_count = getattr(model, "last_input_token_count", None)
+        self.last_output_token_count = getattr(model, "last_output_token_count", None)
+        annotate(provider=name)
+        return _as_chat_message(result)
+
+    def __call__(self, *args, **kwargs):
+        return self.generate(*args, **kwargs)
+
+    def parse_tool_calls(self, message):
+        """Read a tool call out of a text reply, as the provider that wrote it would."""
+        model = self.models[self.last_provider or next(iter(self.models))]
+        return model.parse_tool_calls(message)
+
+    def report(self) -> dict:
+        """Per-provider latency and error windows, plus hedge and failover counts."""
+        return {
+            "primary": self.ranked()[0],
+            "hedges": self.hedges,
+            "failovers": self.failovers,
+            "providers": {name: stats.to_dict() for name, stats in self.stats.items()},
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
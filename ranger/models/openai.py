@@ -1,5 +1,5 @@
 import os
-import requests
+from ranger.transport import get_transport
 
 class OpenAIServerModel:
     @staticmethod
@@ -9,7 +9,7 @@ class OpenAIServerModel:
         if not openai_key:
             return "❌ Not configured"
         try:
-            response = requests.get(
+            response = get_transport().get(
                 "https://api.openai.com/v1/models",
                 headers={"Authorization": f"Bearer {openai_key}"},
                 timeout=5
@@ -0,0 +1,280 @@
+"""
+This module resolves free-text locations to canonical places through a local, on-disk index.
+"""
+
+import os
+import re
+import time
+import difflib
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+from ranger.config import env_flag, env_float, env_str
+from ranger.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Fuzzy matches must be at least this similar to a known alias
+DEFAULT_SIMILARITY = 0.9
+# Seconds a failed geocode is remembered before the geocoder is asked again
+DEFAULT_FAILURE_TTL = 300.0
+US_STATES = {
+    "al": "alabama", "ak": "alaska", "az": "arizona", "ar": "arkansas", "ca": "california",
+    "co": "colorado", "ct": "connecticut", "de": "delaware", "fl": "florida", "ga": "georgia",
+    "hi": "hawaii", "id": "idaho", "il": "illinois", "in": "indiana", "ia": "iowa",
+    "ks": "kansas", "ky": "kentucky", "la": "louisiana", "me": "maine", "md": "maryland",
+    "ma": "massachusetts", "mi": "michigan", "mn": "minnesota", "ms": "mississippi", "mo": "missouri",
+    "mt": "montana", "ne": "nebraska", "nv": "nevada", "nh": "new hampshire", "nj": "new jersey",
+    "nm": "new mexico", "ny": "new york", "nc": "north carolina", "nd": "north dakota", "oh": "ohio",
+    "ok": "oklahoma", "or": "oregon", "pa": "pennsylvania", "ri": "rhode island", "sc": "south carolina",
+    "sd": "south dakota", "tn": "tennessee", "tx": "texas", "ut": "utah", "vt": "vermont",
+    "va": "virginia", "wa": "washington", "wv": "west virginia", "wi": "wisconsin", "wy": "wyoming",
+    "dc": "district of columbia",
+}
+# Trailing country names that add nothing to a US place
+COUNTRY_SUFFIXES = ("usa", "us", "united states", "united states of america")
+
+_configured_path = None
+
+
+def place_key(text: str) -> str:
+    """Reduce a location string to a comparable form.
+
+    "Northport, MI", "northport michigan" and "Northport, MI 49670, USA" all
+    become "northport michigan": punctuation, ZIP codes and a trailing
+    country are dropped and US state abbreviations after a comma are spelled
+    out.
+    """
+    parts = [re.sub(r"[^\w\s'-]", " ", part) for part in str(text).lower().split(",")]
+    parts = [re.sub(r"\s\d{5}(-\d{4})?$", "", " ".join(part.split())) for part in parts]
+    parts = [part for part in parts if part]
+    while len(parts) > 1 and parts[-1] in COUNTRY_SUFFIXES:
+        parts.pop()
+    if not parts:
+        return ""
+    # Only a part after a comma is read as a state: "Port of LA" is not in Louisiana
+    words = " ".join([parts[0]] + [US_STATES.get(part, part) for part in parts[1:]]).split()
+    if len(parts) == 1 and len(words) > 1 and words[-1] == "usa":
+        words.pop()
+    return " ".join(words)
+
+
+def maps_location(place: Optional[dict], text: str) -> str:
+    """What to send the Maps APIs for a location: its place ID when resolved, otherwise the text."""
+    return f"place_id:{place['place_id']}" if place else text
+
+
+class PlaceIndex:
+    """Maps location strings to canonical places ({"place_id", "address", "lat", "lng"}).
+
+    Lookups try, in order: an exact match on the normalized string, a
+    near-identical known spelling (a typo), and finally `geocode`. A bare name
+    is never matched to a longer known one: "Paris" may not be the "Paris, TX"
+    seen earlier, so the geocoder decides. Spellings that resolve exactly or
+    through the geocoder are remembered as aliases, so each place is geocoded
+    once; near matches are not, so a wrong guess is never made permanent.
+    Spellings the geocoder cannot resolve are remembered in memory for
+    `failure_ttl` seconds, so repeated lookups of an unknown place cost one
+    geocode rather than one each. With `path`, places and aliases are kept in
+    SQLite across runs.
+    """
+
+    def __init__(self, path: str = None, geocode: Callable[[str], Optional[dict]] = None,
+                 similarity: float = DEFAULT_SIMILARITY, failure_ttl: float = DEFAULT_FAILURE_TTL):
+        self.geocode = geocode
+        self.similarity = similarity
+        self.failure_ttl = failure_ttl
+        self.hits = 0
+        self.misses = 0
+        self._places: Dict[str, dict] = {}
+        self._aliases: Dict[str, str] = {}
+        # Normalized spellings that failed to geocode, and when they may be retried
+        self._failures: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            path = Path(path).expanduser()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS places ("
+                "place_id TEXT PRIMARY KEY, address TEXT NOT NULL, lat REAL, lng REAL, resolved_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS aliases (alias TEXT PRIMARY KEY, place_id TEXT NOT NULL)")
+            self._conn.commit()
+            for place_id, address, lat, lng, _ in self._conn.execute("SELECT * FROM places"):
+                self._places[place_id] = {"place_id": place_id, "address": address, "lat": lat, "lng": lng}
+            self._aliases.update(self._conn.execute("SELECT alias, place_id FROM aliases"))
+
+    def __len__(self) -> int:
+        return len(self._places)
+
+    def lookup(self, text: str) -> Optional[dict]:
+        """Find a known place for `text` without calling the geocoder."""
+        return self._lookup(text)[0]
+
+    def _lookup(self, text: str) -> Tuple[Optional[dict], bool]:
+        """The known place for `text` and whether it matched a known spelling exactly."""
+        key = place_key(text)
+        if not key:
+            return None, False
+        with self._lock:
+            place_id = self._aliases.get(key)
+            exact = place_id is not None
+            place_id = place_id or self._fuzzy(key)
+            return (self._places.get(place_id) if place_id else None), exact
+
+    def _fuzzy(self, key: str) -> Optional[str]:
+        # Typos are forgiven, different numbers are not: "5th Ave" is not "6th Ave"
+        digits = re.findall(r"\d+", key)
+        candidates = [alias for alias in self._aliases if re.findall(r"\d+", alias) == digits]
+        matches = difflib.get_close_matches(key, candidates, n=1, cutoff=self.similarity)
+        return self._aliases[matches[0]] if matches else None
+
+    def resolve(self, text: str) -> Optional[dict]:
+        """Return the canonical place for `text`, geocoding it if it is not known yet.
+
+        Returns None when the location cannot be resolved; callers then fall
+        back to the original text.
+        """
+        place, exact = self._lookup(text)
+        if place is not None:
+            with self._lock:
+                self.hits += 1
+            if exact:
+                # Same normalized key, different spelling ("Northport, MI" for "northport michigan")
+                self.add_alias(text, place["place_id"])
+            return place
+        key = place_key(text)
+        with self._lock:
+            self.misses += 1
+            if self._failures.get(key, 0) > time.monotonic():
+                return None
+        if self.geocode is None or not key:
+            return None
+        try:
+            with span("places", "geocode"):
+                place = self.geocode(text)
+        except Exception as e:
+            logger.warning("Could not geocode %r: %s", text, str(e))
+            place = None
+        if not place:
+            self._remember_failure(key)
+            return None
+        self.add(place, aliases=[text, place["address"]])
+        return self._places[place["place_id"]]
+
+    def _remember_failure(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._failures) >= 1024:
+                self._failures = {k: until for k, until in self._failures.items() if until > now}
+            self._failures[key] = now + self.failure_ttl
+
+    def add(self, place: dict, aliases=()):
+        """Store a place and the spellings that refer to it."""
+        place = {key: place.get(key) for key in ("place_id", "address", "lat", "lng")}
+        with self._lock:
+            known = self._places.setdefault(place["place_id"], place)
+            if self._conn is not None and known is place:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO places (place_id, address, lat, lng, resolved_at) VALUES (?, ?, ?, ?, ?)",
+                    (place["place_id"], place["address"], place["lat"], place["lng"], time.time())
+                )
+                self._conn.commit()
+        for alias in aliases:
+            self.add_alias(alias, place["place_id"])
+
+    def add_alias(self, text: str, place_id: str):
+        key = place_key(text)
+        with self._lock:
+            if not key or self._aliases.get(key) == place_id:
+                return
+            self._aliases[key] = place_id
+            if self._conn is not None:
+                self._conn.execute("INSERT OR REPLACE INTO aliases (alias, place_id) VALUES (?, ?)", (key, place_id))
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"places": len(self._places), "aliases": len(self._aliases), "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+
+
+def google_geocode(text: str) -> Optional[dict]:
+    """Geocode with the Google Maps client; None when Maps is not configured or finds nothing."""
+    if not os.getenv("GMAPS_API_KEY"):
+        return None
+    from ranger.tools.maps import get_client
+    results = get_client().geocode(text)
+    if not isinstance(results, list) or not results:
+        return None
+    result = results[0]
+    if not isinstance(result, dict) or not result.get("place_id"):
+        return None
+    location = result.get("geometry", {}).get("location", {})
+    return {
+        "place_id": result["place_id"],
+        "address": result.get("formatted_address") or text,
+        "lat": location.get("lat"),
+        "lng": location.get("lng"),
+    }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def configure(path: Optional[str]):
+    """Keep the process-wide index at `path` unless RANGER_PLACES_PATH says otherwise."""
+    global _configured_path
+    _configured_path = path
+    reset_place_index()
+
+
+def get_place_index() -> Optional[PlaceIndex]:
+    """Return the process-wide place index, or None when RANGER_PLACES is off.
+
+    It is stored at RANGER_PLACES_PATH (or the configured path) and kept in
+    memory only when neither is set; RANGER_PLACES_SIMILARITY tunes fuzzy matching
+    and RANGER_PLACES_FAILURE_TTL how long a failed geocode is remembered.
+    """
+    global _index
+    if not env_flag("RANGER_PLACES", True):
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = PlaceIndex(
+                path=env_str("RANGER_PLACES_PATH") or _configured_path,
+                geocode=google_geocode,
+                similarity=env_float("RANGER_PLACES_SIMILARITY", DEFAULT_SIMILARITY),
+                failure_ttl=env_float("RANGER_PLACES_FAILURE_TTL", DEFAULT_FAILURE_TTL),
+            )
+        return _index
+
+
+def reset_place_index():
+    """Drop the process-wide index so the next call rebuilds it."""
+    global _index
+    with _index_lock:
+        if _index is not None:
+            _index.close()
+        _index = None
+
+
+def resolve_place(text: str) -> Optional[dict]:
+    """Resolve `text` with the process-wide index; None if the index is off or the place is unknown."""
+    index = get_place_index()
+    return index.resolve(text) if index is not None else None
+
+
+def canonical_place(text: str) -> str:
+    """A cache-key form of a location: its place ID when it resolves, otherwise its normalized text."""
+    place = resolve_place(text)
+    return place["place_id"] if place else place_key(text)
@@ -1,13 +1,11 @@
-from ranger.models.openai import OpenAIServerModel
-from ranger.models.claude import ClaudeServerModel
+from ranger.health import get_health_checker
 
 class RangerCore:
     @staticmethod
     def check_status() -> str:
         """Check the status of all APIs."""
-        openai_status = OpenAIServerModel.check_status()
-        claude_status = ClaudeServerModel.check_status()
-        return f"OpenAI: {openai_status}, Claude: {claude_status}"
+        statuses = get_health_checker().check()
+        return f"OpenAI: {statuses['OpenAI']}, Claude: {statuses['Claude']}"
 
     @staticmethod
     def get_weather_status() -> str:
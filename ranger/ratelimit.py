@@ -0,0 +1,207 @@
+"""
+This module provides process-wide, per-provider rate limiting for model and Maps API calls.
+"""
+
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from urllib.parse import urlparse
+from ranger.config import env_float, env_int, env_str
+
+logger = logging.getLogger(__name__)
+
+# Requests per second and tokens per minute per provider; 0 means unlimited
+DEFAULT_LIMITS = {
+    "anthropic": (10.0, 0),
+    "openai": (10.0, 0),
+    "maps": (50.0, 0),
+}
+PROVIDER_HOSTS = {
+    "api.anthropic.com": "anthropic",
+    "api.openai.com": "openai",
+    "maps.googleapis.com": "maps",
+}
+# Base URL overrides (e.g. stand-in servers) are limited as the provider they replace
+PROVIDER_BASE_URL_ENV = {
+    "anthropic": "ANTHROPIC_BASE_URL",
+    "openai": "OPENAI_BASE_URL",
+    "maps": "GMAPS_BASE_URL",
+}
+DEFAULT_MAX_RETRIES = 3
+# Waits without a retry-after header: 1s, 2s, 4s, ... capped here
+MAX_BACKOFF = 30.0
+# After a 429 the request rate is cut by this factor, then recovers gradually
+BACKOFF_FACTOR = 0.5
+RECOVERY_STEPS = 20
+
+
+class TokenBucket:
+    """Thread-safe token bucket that hands out reservations instead of blocking.
+
+    `reserve` takes tokens immediately, letting the balance go negative, and
+    returns how long the caller must wait for its share to be refilled.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float = 1.0) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= amount
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def adjust(self, amount: float):
+        """Take (or, if negative, return) tokens after the fact, e.g. to correct an estimate."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+
+class RateLimiter:
+    """Request and token budgets for one provider.
+
+    The request rate adapts: each 429 cuts it by BACKOFF_FACTOR and pauses all
+    callers for the server's retry-after, and each success restores part of
+    the configured rate.
+    """
+
+    def __init__(self, name: str, requests_per_second: float, tokens_per_minute: float = 0,
+                 max_retries: int = DEFAULT_MAX_RETRIES):
+        self.name = name
+        self.max_rate = requests_per_second
+        self.min_rate = max(requests_per_second * 0.05, 0.1) if requests_per_second else 0
+        self.max_retries = max_retries
+        self._requests = TokenBucket(requests_per_second, max(requests_per_second, 1.0)) if requests_per_second else None
+        self._tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+        self._blocked_until = 0.0
+        self.throttled = 0
+
+    @property
+    def rate(self) -> float:
+        """The current request rate, in requests per second (0 when unlimited)."""
+        return self._requests.rate if self._requests is not None else 0.0
+
+    def reserve(self, tokens: float = 0, requests: int = 1) -> float:
+        """Reserve `requests` requests and `tokens` tokens; return the seconds to wait before sending."""
+        wait = self._requests.reserve(requests) if requests and self._requests is not None else 0.0
+        if tokens and self._tokens is not None:
+            wait = max(wait, self._tokens.reserve(tokens))
+        with self._lock:
+            wait = max(wait, self._blocked_until - time.monotonic())
+        return max(wait, 0.0)
+
+    def acquire(self, tokens: float = 0, requests: int = 1):
+        """Block until a request may be sent."""
+        wait = self.reserve(tokens, requests)
+        if wait > 0:
+            logger.debug("Rate limiter %s: waiting %.2fs", self.name, wait)
+            time.sleep(wait)
+
+    def record_tokens(self, actual: float, estimated: float = 0):
+        """Correct the token budget once a call's real usage is known."""
+        if self._tokens is not None and actual is not None:
+            self._tokens.adjust(actual - estimated)
+
+    def record_response(self, status_code: int, retry_after: str = None, attempt: int = 0) -> float:
+        """Adapt to a response; for a 429 return the seconds to back off before retrying."""
+        if status_code != 429:
+            if self._requests is not None and self._requests.rate < self.max_rate:
+                self._requests.set_rate(min(self.max_rate, self._requests.rate + self.max_rate / RECOVERY_STEPS))
+            return 0.0
+        delay = parse_retry_after(retry_after)
+        if delay is None:
+            delay = min(MAX_BACKOFF, 2 ** attempt) * (0.5 + random.random() / 2)
+        with self._lock:
+            self.throttled += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        if self._requests is not None:
+            self._requests.set_rate(max(self.min_rate, self._requests.rate * BACKOFF_FACTOR))
+        logger.warning(
+            "%s returned 429; backing off %.1fs, request rate now %.2f/s", self.name, delay, self.rate
+        )
+        return delay
+
+    def stats(self) -> dict:
+        return {"rate": self.rate, "max_rate": self.max_rate, "throttled": self.throttled}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a retry-after header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider: str) -> RateLimiter:
+    """Return the process-wide limiter for a provider.
+
+    Limits come from RANGER_RATE_<PROVIDER>_RPS and RANGER_RATE_<PROVIDER>_TPM
+    (0 for unlimited), retries from RANGER_RATE_MAX_RETRIES.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            rps, tpm = DEFAULT_LIMITS.get(provider, (0, 0))
+            prefix = f"RANGER_RATE_{provider.upper()}"
+            limiter = RateLimiter(
+                provider,
+                requests_per_second=env_float(f"{prefix}_RPS", rps),
+                tokens_per_minute=env_float(f"{prefix}_TPM", tpm),
+                max_retries=env_int("RANGER_RATE_MAX_RETRIES", DEFAULT_MAX_RETRIES),
+            )
+            _limiters[provider] = limiter
+        return limiter
+
+
+def reset_limiters():
+    """Drop all limiters so the next lookups rebuild them from the environment."""
+    with _limiters_lock:
+        _limiters.clear()
+
+
+def provider_for_url(url: str) -> Optional[str]:
+    """Return the provider an API URL belongs to, or None for other hosts."""
+    host = urlparse(str(url)).netloc.lower()
+    provider = PROVIDER_HOSTS.get(host.split(":")[0])
+    if provider is not None:
+        return provider
+    for name, env_name in PROVIDER_BASE_URL_ENV.items():
+        base_url = env_str(env_name)
+        if base_url and urlparse(base_url).netloc.lower() == host:
+            return name
+    return None
+
+
+def limiter_for_url(url: str) -> Optional[RateLimiter]:
+    provider = provider_for_url(url)
+    return get_limiter(provider) if provider is not None else None
@@ -0,0 +1,236 @@
+"""
+This module records model and tool exchanges to an append-only file and serves them back for offline replays.
+"""
+
+import os
+import json
+import time
+import hashlib
+import inspect
+import logging
+import threading
+from collections import defaultdict, deque
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+SPEEDS = ("original", "fast")
+# Keys the model classes need at construction; nothing is sent upstream while replaying
+PLACEHOLDER_KEYS = ("OPENAI_API_KEY", "ANTHROPIC_API_KEY")
+
+
+class ReplayMiss(LookupError):
+    """Raised when a replayed run makes a call the recording does not have."""
+
+
+class ReplayedError(RuntimeError):
+    """A failure that was recorded, raised again on replay."""
+
+
+def exchange_key(*parts) -> str:
+    """A stable digest of a call's identifying parts (name, arguments, payload)."""
+    body = json.dumps(parts, sort_keys=True, default=_jsonable, separators=(",", ":"))
+    return hashlib.sha256(body.encode()).hexdigest()[:32]
+
+
+def _jsonable(value):
+    """JSON stand-in for objects such as smolagents ChatMessages in keys and results."""
+    if hasattr(value, "model_dump_json") and callable(value.model_dump_json):
+        return json.loads(value.model_dump_json())
+    # Tools passed to a model are identified by name; their default repr includes an address
+    if isinstance(getattr(value, "name", None), str):
+        return value.name
+    return str(value)
+
+
+def _as_record(result):
+    """Model replies as stored: text as is, ChatMessages as plain dicts."""
+    return result if isinstance(result, (str, dict, list)) or result is None else _jsonable(result)
+
+
+class Recorder:
+    """Appends one compact JSON line per exchange: kind, name, key, start time, seconds and result or error."""
+
+    def __init__(self, path: str):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.recorded = 0
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, name: str, key: str, started_at: float, seconds: float,
+               result=None, error: BaseException = None):
+        entry = {"kind": kind, "name": name, "key": key, "ts": round(started_at, 6), "seconds": round(seconds, 6)}
+        if error is not None:
+            entry["error"] = f"{type(error).__name__}: {error}"
+        else:
+            entry["result"] = result
+        line = json.dumps(entry, default=_jsonable, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.recorded += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class Replayer:
+    """Serves recorded exchanges back by kind and key.
+
+    Repeated identical calls get their recordings in the order they were
+    made; once those run out the last one is served again. With
+    speed="original" each reply takes as long as it originally did; with
+    "fast" it returns at once.
+    """
+
+    def __init__(self, path: str, speed: str = "original"):
+        if speed not in SPEEDS:
+            raise ValueError(f"Unsupported replay speed {speed!r}. Use one of {SPEEDS}.")
+        self.path = Path(path).expanduser()
+        self.speed = speed
+        self.served = 0
+        self.missed = 0
+        self._entries = defaultdict(deque)
+        self._lock = threading.Lock()
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._entries[(entry["kind"], entry["key"])].append(entry)
+        logger.info("Loaded %d recorded exchanges from %s", len(self), self.path)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def take(self, kind: str, name: str, key: str) -> dict:
+        """The next recording for a call; raises ReplayMiss if there is none."""
+        with self._lock:
+            entries = self._entries.get((kind, key))
+            if not entries:
+                self.missed += 1
+                raise ReplayMiss(f"No recorded {kind} call to {name} matches this request.")
+            self.served += 1
+            return entries.popleft() if len(entries) > 1 else entries[0]
+
+    def delay(self, entry: dict) -> float:
+        return entry["seconds"] if self.speed == "original" else 0.0
+
+    @staticmethod
+    def outcome(entry: dict):
+        if "error" in entry:
+            raise ReplayedError(entry["error"])
+        return entry["result"]
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def configure(record: str = None, replay: str = None, speed: str = "original"):
+    """Start recording to `record` or replaying from `replay` for the rest of the process.
+
+    Calling it with neither stops the current session.
+    """
+    global _session
+    if record and replay:
+        raise ValueError("Record and replay cannot be used together.")
+    session = Recorder(record) if record else Replayer(replay, speed) if replay else None
+    if replay:
+        for name in PLACEHOLDER_KEYS:
+            os.environ.setdefault(name, "replay")
+    with _session_lock:
+        previous, _session = _session, session
+    if isinstance(previous, Recorder):
+        previous.close()
+
+
+def active():
+    """The current Recorder or Replayer, or None."""
+    return _session
+
+
+def stats() -> Optional[dict]:
+    session = _session
+    if isinstance(session, Recorder):
+        return {"mode": "record", "path": str(session.path), "recorded": session.recorded}
+    if isinstance(session, Replayer):
+        return {"mode": "replay", "path": str(session.path), "speed": session.speed,
+                "served": session.served, "missed": session.missed}
+    return None
+
+
+def exchange(kind: str, name: str, key: str, func: Callable, *args, **kwargs):
+    """Call `func`, recording the exchange, or serve it from the replay."""
+    session = _session
+    if isinstance(session, Replayer):
+        entry = session.take(kind, name, key)
+        time.sleep(session.delay(entry))
+        return session.outcome(entry)
+    if not isinstance(session, Recorder):
+        return func(*args, **kwargs)
+    started_at, start = time.time(), time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:
+        session.record(kind, name, key, started_at, time.perf_counter() - start, error=e)
+        raise
+    session.record(kind, name, key, started_at, time.perf_counter() - start, result=result)
+    return result
+
+
+def recorded(kind: str = "tool", name: str = None) -> Callable:
+    """Decorator that records calls to the function, keyed by its bound arguments, or replays them."""
+    def decorator(func):
+        signature = inspect.signature(func)
+        call_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _session is None:
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = exchange_key(call_name, bound.arguments)
+            return exchange(kind, call_name, key, func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_model(model, provider: str):
+    """Record or replay a smolagents model's generate calls, keyed by messages and options.
+
+    Replies are stored as ChatMessage dicts and rebuilt on replay.
+    """
+    generate = model.generate
+    model_id = getattr(model, "model_id", provider)
+
+    @wraps(generate)
+    def recorded_generate(messages, *args, **kwargs):
+        if _session is None:
+            return generate(messages, *args, **kwargs)
+        key = exchange_key(provider, model_id, messages, args, kwargs)
+        if isinstance(_session, Replayer):
+            result = exchange("model", model_id, key, generate)
+            if isinstance(result, dict):
+                from smolagents.models import ChatMessage
+                return ChatMessage.from_dict(result)
+            return result
+        # Record the reply but hand the caller the original object
+        reply = None
+
+        def call():
+            nonlocal reply
+            reply = generate(messages, *args, **kwargs)
+            return _as_record(reply)
+
+        exchange("model", model_id, key, call)
+        return reply
+
+    model.generate = recorded_generate
+    return model
@@ -0,0 +1,204 @@
+"""
+This module caches complete Router responses so repeated queries skip the agent loop.
+"""
+
+import re
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from ranger.cache import TTLCache, SQLiteBackend
+from ranger.config import env_flag, env_float, env_int, env_str
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL = 6 * 60 * 60
+# A response lives as long as the most volatile tool it used
+TOOL_TTLS = {
+    "get_weather": 60 * 60,
+    "get_weather_many": 60 * 60,
+    "get_travel_duration": 6 * 60 * 60,
+    "get_travel_durations": 6 * 60 * 60,
+    "get_travel_matrix": 6 * 60 * 60,
+    "optimize_itinerary": 6 * 60 * 60,
+}
+
+# Words a near-duplicate may add or drop; any other difference (a place, a
+# number, a date, a travel mode) means a different question
+FILLER_WORDS = frozenset({
+    "a", "an", "the", "is", "are", "it", "what", "what's", "whats", "how", "how's", "hows",
+    "please", "pls", "thanks", "thank", "you", "can", "could", "would", "will", "tell", "me",
+    "show", "give", "i", "want", "to", "know", "like", "hey", "hi", "hello", "just", "quick", "quickly",
+})
+
+
+def normalize_query(query: str) -> str:
+    """Normalize query text for use in cache keys."""
+    return " ".join(str(query).lower().split()).strip(" ?!.")
+
+
+def _tokens(normalized: str) -> frozenset:
+    """Words of a normalized query, without punctuation."""
+    return frozenset(re.findall(r"[\w']+", normalized))
+
+
+def _similarity(a: frozenset, b: frozenset) -> float:
+    """Jaccard similarity of two token sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ResponseCache:
+    """LRU+TTL cache of (response, thoughts, tools_used) results keyed by query.
+
+    Keys combine the normalized query with a namespace naming the model,
+    prompt template and tool versions, so changing any of them misses. When
+    `similarity` is set (0-1), a miss falls back to the most similar query
+    seen in this process whose token overlap reaches that threshold and
+    which differs from it only in FILLER_WORDS.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE, ttl: float = DEFAULT_CACHE_TTL,
+                 tool_ttls: dict = None, backend: SQLiteBackend = None, similarity: float = 0.0):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, backend=backend)
+        self.ttl = ttl
+        self.tool_ttls = TOOL_TTLS if tool_ttls is None else tool_ttls
+        self.backend = backend
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        # Normalized queries by namespace, for the near-duplicate matcher
+        self._queries = {}
+        self._maxsize = maxsize
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query: str, namespace: str) -> str:
+        digest = hashlib.sha256(f"{namespace}|{normalize_query(query)}".encode("utf-8")).hexdigest()
+        return f"response:{digest}"
+
+    def ttl_for(self, tools_used: List[str]) -> float:
+        """Return the TTL for a response built with `tools_used`.
+
+        When no known tool is named, the response may still rest on any of
+        them, so it gets the shortest tool TTL.
+        """
+        ttls = [self.tool_ttls[name] for name in tools_used if name in self.tool_ttls]
+        if not ttls:
+            return min(self.tool_ttls.values(), default=self.ttl)
+        return min(ttls)
+
+    def get(self, query: str, namespace: str) -> Optional[Tuple[str, str, List[str]]]:
+        """Return the cached result for a query, or None."""
+        value = self._cache.get(self.key(query, namespace))
+        counter = "hits"
+        if value is None and self.similarity > 0:
+            match = self._nearest(query, namespace)
+            if match is not None:
+                value = self._cache.get(self.key(match, namespace))
+                if value is not None:
+                    logger.debug("Near-duplicate cache hit: %r ~ %r", query, match)
+                    counter = "near_hits"
+        if value is None:
+            counter = "misses"
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        if self.backend is not None:
+            try:
+                self.backend.increment(counter)
+            except Exception as e:
+                logger.warning("Response cache counter write failed: %s", str(e))
+        if value is None:
+            return None
+        response, thoughts, tools_used = value
+        return response, thoughts, list(tools_used)
+
+    def set(self, query: str, namespace: str, result: Tuple[str, str, List[str]]):
+        """Cache a result, unless it has an empty response."""
+        response, thoughts, tools_used = result
+        if not str(response).strip():
+            return
+        self._cache.set(self.key(query, namespace), [response, thoughts, list(tools_used)], ttl=self.ttl_for(tools_used))
+        if self.similarity > 0:
+            normalized = normalize_query(query)
+            with self._lock:
+                queries = self._queries.setdefault(namespace, OrderedDict())
+                queries[normalized] = _tokens(normalized)
+                queries.move_to_end(normalized)
+                while len(queries) > self._maxsize:
+                    queries.popitem(last=False)
+
+    def _nearest(self, query: str, namespace: str) -> Optional[str]:
+        tokens = _tokens(normalize_query(query))
+        best, best_score = None, self.similarity
+        with self._lock:
+            candidates = list(self._queries.get(namespace, {}).items())
+        for candidate, candidate_tokens in candidates:
+            # "weather in northport, mi" and "weather in leland, mi" overlap well but ask about different places
+            if (tokens ^ candidate_tokens) - FILLER_WORDS:
+                continue
+            score = _similarity(tokens, candidate_tokens)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def clear(self):
+        self._cache.clear()
+        with self._lock:
+            self._queries.clear()
+            self.hits = self.near_hits = self.misses = 0
+
+    def stats(self) -> dict:
+        """Return hit/miss counters; with a SQLite backend they cover every run that shared it."""
+        with self._lock:
+            counts = {"hits": self.hits, "near_hits": self.near_hits, "misses": self.misses}
+        if self.backend is not None:
+            try:
+                stored = self.backend.counters()
+                counts = {name: stored.get(name, 0) for name in counts}
+            except Exception as e:
+                logger.warning("Response cache counter read failed: %s", str(e))
+        total = sum(counts.values())
+        counts["hit_rate"] = (counts["hits"] + counts["near_hits"]) / total if total else 0.0
+        counts["size"] = len(self._cache)
+        return counts
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide response cache, or None when RANGER_RESPONSE_CACHE is off.
+
+    RANGER_RESPONSE_CACHE_PATH keeps entries in SQLite across runs;
+    RANGER_RESPONSE_CACHE_SIZE, RANGER_RESPONSE_CACHE_TTL and
+    RANGER_RESPONSE_CACHE_SIMILARITY tune it.
+    """
+    global _response_cache
+    if not env_flag("RANGER_RESPONSE_CACHE", True):
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            size = env_int("RANGER_RESPONSE_CACHE_SIZE", DEFAULT_CACHE_SIZE)
+            path = env_str("RANGER_RESPONSE_CACHE_PATH")
+            _response_cache = ResponseCache(
+                maxsize=size,
+                ttl=env_float("RANGER_RESPONSE_CACHE_TTL", DEFAULT_CACHE_TTL),
+                backend=SQLiteBackend(path, maxsize=size * 10) if path else None,
+                similarity=env_float("RANGER_RESPONSE_CACHE_SIMILARITY", 0.0),
+            )
+        return _response_cache
+
+
+def reset_response_cache():
+    """Drop the process-wide response cache so the next call builds a fresh one."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is not None and _response_cache.backend is not None:
+            _response_cache.backend.close()
+        _response_cache = None
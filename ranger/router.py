@@ -1,71 +1,302 @@
 from smolagents import CodeAgent
 from smolagents.models import OpenAIServerModel
-from typing import List, Callable, Tuple
+from typing import Any, Iterator, List, Callable, Optional, Tuple
 import os
 import logging
 import sys
 import io
+import time
+import asyncio
+import threading
+import contextvars
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from .tools.weather import get_weather
-from .tools.maps import get_travel_duration
-from .models.claude import ClaudeServerModel
+from rich.console import Console
+from .config import env_flag, env_int, env_str
+from .tools.weather import get_weather, get_weather_many
+from .tools.maps import get_travel_duration, get_travel_durations, get_travel_matrix
+from .tools.itinerary import optimize_itinerary
+from .models.claude import DEFAULT_MODEL_ID as CLAUDE_MODEL_ID
+from .models.claude_chat import ClaudeChatModel
+from .agents import ParallelToolCallingAgent
+from .models.hedged import HedgedModel
+from .response_cache import get_response_cache
+from .memory import ConversationMemory
+from .intents import classify, get_fast_path_stats
+from . import replay
+from .tracing import annotate, span, open_span, record, instrument_model
+from .transport import get_transport
+
+DEFAULT_MAX_CONCURRENCY = 8
+# Static routing instructions. They are appended to the agent's system prompt rather than
+# repeated in every task, so they form part of the stable, cacheable prompt prefix.
+ROUTING_INSTRUCTIONS = """
+Analyze each query and use the appropriate tool to answer it:
+
+If the query is about weather, use the get_weather tool.
+If the query is about travel time or directions, use the get_travel_duration tool.
+If the query involves several stops, call get_travel_matrix once with all of them instead of repeating get_travel_duration.
+Never call a tool in a loop: use get_weather_many for several locations and get_travel_durations for several legs.
+If the query asks to plan a day trip or the order of several stops, call optimize_itinerary once with all stops; it returns a timed schedule.
+If the query is about both, use both tools and combine the information.
+
+Format your response in a clear, user-friendly way.
+
+Show your thinking process by starting each thought with "Thought:".
+"""
+# "code" writes and runs Python to call tools; "tool_calling" uses the model's native tool calls,
+# several per step when the model asks for them together
+AGENT_TYPES = ("code", "tool_calling")
+MODEL_IDS = {"openai": "gpt-4", "claude": CLAUDE_MODEL_ID, "hedged": f"gpt-4+{CLAUDE_MODEL_ID}"}
+# Providers a hedged router can use, with the key each one needs
+HEDGE_PROVIDERS = {"openai": "OPENAI_API_KEY", "claude": "ANTHROPIC_API_KEY"}
+# Bump these when the routing prompt or a tool's behaviour changes, so cached responses are not reused
+PROMPT_VERSION = 4
+# Tools the fast path may call directly, by name
+FAST_PATH_TOOLS = {"get_weather": get_weather, "get_travel_duration": get_travel_duration}
+TOOL_VERSIONS = {
+    "get_weather": 2, "get_weather_many": 1, "get_travel_duration": 2, "get_travel_durations": 1,
+    "get_travel_matrix": 1, "optimize_itinerary": 1,
+}
+
+class _TracedExecutor:
+    """Times local code execution while delegating everything else to the wrapped executor"""
+
+    def __init__(self, executor):
+        self._executor = executor
+
+    def __call__(self, *args, **kwargs):
+        with span("code", "execute"):
+            return self._executor(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._executor, name)
 
 class Router:
-    def __init__(self, debug: bool = False, model_type: str = "openai"):
+    # stdout is process-wide, so concurrent routes share one redirect
+    _stdout_lock = threading.Lock()
+    _stdout_depth = 0
+    _stdout_saved = None
+
+    def __init__(self, debug: bool = False, model_type: str = None, max_concurrency: int = None,
+                 memory: ConversationMemory = None, agent_type: str = None, fast_path: bool = None):
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.INFO)
+        # Agent thoughts go to a child logger so RANGER_LOG_SAMPLE can thin them out
+        self.trace_logger = logging.getLogger(__name__ + ".trace")
         self.debug = debug
-        if model_type == "openai":
-            model = OpenAIServerModel(model_id="gpt-4")
-        elif model_type == "claude":
-            model = ClaudeServerModel()
+        # "hedged" spreads calls over every configured provider; see HedgedModel
+        model_type = model_type or env_str("RANGER_MODEL_TYPE", "openai")
+        if model_type not in MODEL_IDS:
+            raise ValueError("Unsupported model_type. Use 'openai', 'claude' or 'hedged'.")
+        self.model_type = model_type
+        self.model_id = MODEL_IDS[model_type]
+        agent_type = agent_type or env_str("RANGER_AGENT_TYPE", "code")
+        if agent_type not in AGENT_TYPES:
+            raise ValueError("Unsupported agent_type. Use 'code' or 'tool_calling'.")
+        self.agent_type = agent_type
+        # Answer clear single-tool queries without the agent; RANGER_FAST_PATH=0 turns it off
+        self.fast_path = env_flag("RANGER_FAST_PATH", True) if fast_path is None else fast_path
+        self.response_cache = get_response_cache()
+        # Earlier turns of a multi-turn session, put before each query by `route` and `route_stream`
+        self.memory = memory
+        # The model and agent are built on first use
+        self._agent = None
+        self._agent_lock = threading.Lock()
+        # Agents keep per-run memory, so concurrent queries each check one out of this pool
+        self.max_concurrency = max_concurrency or env_int("RANGER_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)
+        self._idle_agents = []
+        self._pool_lock = threading.Lock()
+        self._executor = None
+
+    def _build_agent(self) -> CodeAgent:
+        """Build the model and the agent, a CodeAgent or a ParallelToolCallingAgent"""
+        if self.model_type == "hedged":
+            model = self._build_hedged_model()
         else:
-            raise ValueError("Unsupported model_type. Use 'openai' or 'claude'.")
-        self.agent = CodeAgent(
-            tools=[get_weather, get_travel_duration],
-            model=model,
-            additional_authorized_imports=["datetime"]
+            model = instrument_model(self._build_model(self.model_type), self.model_type)
+        tools = [get_weather, get_weather_many, get_travel_duration, get_travel_durations, get_travel_matrix, optimize_itinerary]
+        if self.agent_type == "tool_calling":
+            agent = ParallelToolCallingAgent(tools=tools, model=model, step_callbacks=[self._trace_step])
+        else:
+            agent = CodeAgent(
+                tools=tools,
+                model=model,
+                additional_authorized_imports=["datetime"],
+                step_callbacks=[self._trace_step]
+            )
+        templates = getattr(agent, "prompt_templates", None)
+        if isinstance(templates, dict) and "system_prompt" in templates:
+            # smolagents renders the system prompt from this template at the start of every run
+            agent.prompt_templates = dict(templates, system_prompt=templates["system_prompt"] + "\n" + ROUTING_INSTRUCTIONS)
+        if hasattr(agent, "python_executor"):
+            agent.python_executor = _TracedExecutor(agent.python_executor)
+        return agent
+
+    @staticmethod
+    def _build_model(model_type: str):
+        if model_type == "openai":
+            model = OpenAIServerModel(model_id=MODEL_IDS["openai"], client_kwargs=get_transport().openai_client_kwargs())
+            return replay.record_model(model, model_type)
+        # ClaudeChatModel records and replays its own exchanges
+        return ClaudeChatModel(model_id=MODEL_IDS["claude"])
+
+    def _build_hedged_model(self) -> HedgedModel:
+        """Hedge across every provider with an API key, in RANGER_HEDGE_PROVIDERS order"""
+        order = [name.strip() for name in env_str("RANGER_HEDGE_PROVIDERS", "openai,claude").split(",")]
+        models = {
+            name: instrument_model(self._build_model(name), name)
+            for name in order if name in HEDGE_PROVIDERS and os.getenv(HEDGE_PROVIDERS[name])
+        }
+        if not models:
+            raise ValueError("Hedging needs OPENAI_API_KEY or ANTHROPIC_API_KEY to be set.")
+        return HedgedModel(models)
+
+    @staticmethod
+    def _step_tools(step, tool_names) -> List[str]:
+        """Names of the tools called by an agent step, natively or by its code"""
+        calls = getattr(step, "tool_calls", None) or []
+        called = [call.name for call in calls if call.name in tool_names]
+        code = " ".join(str(call.arguments) for call in calls if call.name == "python_interpreter")
+        return [name for name in tool_names if name != "final_answer" and (name in called or f"{name}(" in code)]
+
+    def _called_tools(self, agent) -> List[str]:
+        """Names of the tools the agent called in its last run, read from its memory steps"""
+        steps = getattr(getattr(agent, "memory", None), "steps", None) or []
+        called = []
+        for step in steps:
+            if type(step).__name__ == "ActionStep":
+                called.extend(name for name in self._step_tools(step, getattr(agent, "tools", {})) if name not in called)
+        return called
+
+    def _trace_step(self, step, agent=None):
+        """Agent step callback: write a span for each finished step"""
+        if type(step).__name__ != "ActionStep" or step.duration is None:
+            return
+        record(
+            "agent", "step", step.duration,
+            started_at=step.start_time,
+            step=step.step_number,
+            tools=self._step_tools(step, getattr(agent, "tools", {})),
+            error=str(step.error) if step.error is not None else None,
         )
 
+    @property
+    def agent(self) -> CodeAgent:
+        """The CodeAgent, built on first access"""
+        if self._agent is None:
+            with self._agent_lock:
+                if self._agent is None:
+                    self._agent = self._build_agent()
+        return self._agent
+
     @contextmanager
     def _redirect_stdout(self):
-        """Context manager to redirect stdout when not in debug mode"""
-        if not self.debug:
-            old_stdout = sys.stdout
-            sys.stdout = io.StringIO()
-            try:
-                yield
-            finally:
-                sys.stdout = old_stdout
-        else:
+        """Context manager to redirect stdout when not in debug mode.
+
+        Safe to nest and to use from several threads: the first entrant swaps
+        stdout out and the last one to leave restores it.
+        """
+        if self.debug:
+            yield
+            return
+        cls = Router
+        with cls._stdout_lock:
+            if cls._stdout_depth == 0:
+                cls._stdout_saved = sys.stdout
+                sys.stdout = io.StringIO()
+            cls._stdout_depth += 1
+        try:
             yield
+        finally:
+            with cls._stdout_lock:
+                cls._stdout_depth -= 1
+                if cls._stdout_depth == 0:
+                    sys.stdout = cls._stdout_saved
+                    cls._stdout_saved = None
 
-    def route(self, query: str) -> Tuple[str, str, List[str]]:
-        """Route the query to the appropriate handler using the agent"""
-        self.logger.info(f"Processing query: {query}")
-        self.logger.info("Agent thinking process:")
-        self.logger.info("-" * 50)
-        prompt = f"""
-        Analyze this query and use the appropriate tool to answer it:
-        Query: {query}
-        
-        If the query is about weather, use the get_weather tool.
-        If the query is about travel time or directions, use the get_travel_duration tool.
-        If the query is about both, use both tools and combine the information.
-        
-        Format your response in a clear, user-friendly way.
-        
-        Show your thinking process by starting each thought with "Thought:".
+    @property
+    def cache_namespace(self) -> str:
+        """Everything besides the query that a cached response depends on"""
+        tools = ",".join(f"{name}@{version}" for name, version in sorted(TOOL_VERSIONS.items()))
+        return f"{self.model_id}|{self.agent_type}|prompt@{PROMPT_VERSION}|{tools}"
+
+    def _cached(self, query: str):
+        # Mid-conversation, the same words can ask something else ("and tomorrow?");
+        # recordings and replays need the agent to actually run
+        if self.response_cache is None or self.memory or replay.active() is not None:
+            return None
+        result = self.response_cache.get(query, self.cache_namespace)
+        if result is not None:
+            self.logger.info("Response cache hit for query: %s", query)
+        return result
+
+    def _remember(self, query: str, result: Tuple[str, str, List[str]]):
+        if self.response_cache is not None and not self.memory and replay.active() is None:
+            self.response_cache.set(query, self.cache_namespace, result)
+
+    def _fast(self, query: str) -> Optional[Tuple[str, str, List[str]]]:
+        """Answer a query that clearly needs one tool call by making it directly, or return None to run the agent.
+
+        Fast answers are not put in the response cache; the tools cache their own results.
         """
-        
+        # Mid-conversation a query may lean on earlier turns, and recordings need the agent to run
+        if not self.fast_path or self.memory or replay.active() is not None:
+            return None
+        stats = get_fast_path_stats()
+        intent = classify(query)
+        if intent is None:
+            stats.miss()
+            return None
+        start = time.perf_counter()
+        try:
+            answer = intent.answer(FAST_PATH_TOOLS[intent.tool](**intent.arguments))
+        except Exception as e:
+            self.logger.warning("Fast path %s failed, using the agent: %s", intent.tool, str(e))
+            answer = None
+        if answer is None:
+            stats.fallback()
+            return None
+        stats.hit(time.perf_counter() - start)
+        annotate(fast_path=intent.tool)
+        self.logger.info("Fast path answered with %s", intent.tool)
+        return answer, f"Thought: Using tool: {intent.tool}", [intent.tool]
+
+    def _run_agent(self, agent, prompt: str):
+        """Run the agent to completion, timing it for the fast path report"""
+        start = time.perf_counter()
         with self._redirect_stdout():
-            response = self.agent.run(prompt)
-            self.logger.debug("Raw agent response: %s", response)
-        
-        self.logger.info("-" * 50)
-        
-        # Process the response to extract thoughts, final response, and tools used
-        response = response.strip()
+            response = agent.run(prompt)
+        get_fast_path_stats().agent(time.perf_counter() - start)
+        return response
+
+    def _record_turn(self, query: str, result: Tuple[str, str, List[str]]):
+        if self.memory is not None:
+            response, _, tools_used = result
+            self.memory.add(query, response, tools_used)
+
+    def _build_prompt(self, query: str, context: str = "") -> str:
+        """Build the routing task for a query; the instructions live in the system prompt"""
+        if context:
+            return f"{context}\n\nQuery: {query}"
+        return f"Query: {query}"
+
+    def _conversation(self) -> str:
+        """The conversation context for the next query, recorded on the current span"""
+        if self.memory is None:
+            return ""
+        context = self.memory.render()
+        annotate(memory_tokens=self.memory.tokens())
+        return context
+
+    def _parse_response(self, response: str, called: List[str] = ()) -> Tuple[str, str, List[str]]:
+        """Split the agent response into the final response, thoughts and tools used.
+
+        Tools named in "Using tool:" thoughts come first, then those in `called`,
+        the tools the agent's steps actually called.
+        """
+        response = str(response).strip()
         lines = response.split('\n')
         
         final_lines = []
@@ -75,7 +306,7 @@ class Router:
         for line in lines:
             if line.strip().startswith("Thought:"):
                 thoughts.append(line.strip())
-                self.logger.info(line.strip())
+                self.trace_logger.info("%s", line.strip())
                 # Track tools used
                 if "using tool:" in line.lower():
                     tool_name = line.lower().split("using tool:")[-1].strip()
@@ -85,5 +316,193 @@ class Router:
                 final_lines.append(line)
         
         final_response = '\n'.join(final_lines)
+        tools_used.extend(name for name in called if name not in tools_used)
         
-        return final_response, '\n'.join(thoughts), tools_used 
\ No newline at end of file
+        return final_response, '\n'.join(thoughts), tools_used
+
+    def route(self, query: str) -> Tuple[str, str, List[str]]:
+        """Route the query to the appropriate handler using the agent"""
+        self.logger.info("Processing query: %s", query)
+        with span("router", "route", model_id=self.model_id) as active:
+            cached = self._cached(query)
+            active.set(cache_hit=cached is not None)
+            if cached is not None:
+                self._record_turn(query, cached)
+                return cached
+            fast = self._fast(query)
+            if fast is not None:
+                self._record_turn(query, fast)
+                return fast
+            self.trace_logger.info("Agent thinking process:")
+            self.trace_logger.info("-" * 50)
+            prompt = self._build_prompt(query, self._conversation())
+            
+            agent = self.agent
+            response = self._run_agent(agent, prompt)
+            self.logger.debug("Raw agent response: %s", response)
+            
+            self.trace_logger.info("-" * 50)
+            
+            # Process the response to extract thoughts, final response, and tools used
+            result = self._parse_response(response, self._called_tools(agent))
+            self._remember(query, result)
+            self._record_turn(query, result)
+            return result
+
+    def route_stream(self, query: str) -> Iterator[Tuple[str, Any]]:
+        """Route the query like `route`, yielding progress events as the agent works.
+
+        Events are (kind, payload) tuples:
+            ("delta", str): a chunk of model output, when the model supports streaming
+            ("thought", str): a "Thought:" line from a finished agent step
+            ("step", str): a one-line summary of a finished agent step
+            ("answer", str): the final response text
+            ("done", (response, thoughts, tools_used)): the same result `route` returns
+        """
+        self.logger.info("Processing query (streaming): %s", query)
+        # A generator cannot hold a span open across yields, so steps run inside it explicitly
+        route_span = open_span("router", "route_stream", model_id=self.model_id)
+        try:
+            yield from self._route_stream(query, route_span)
+        except Exception as e:
+            route_span.set(error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            route_span.end()
+
+    def _route_stream(self, query: str, route_span) -> Iterator[Tuple[str, Any]]:
+        cached = route_span.run(self._cached, query)
+        route_span.set(cache_hit=cached is not None)
+        if cached is not None:
+            self._record_turn(query, cached)
+            yield "answer", cached[0]
+            yield "done", cached
+            return
+        fast = route_span.run(self._fast, query)
+        if fast is not None:
+            self._record_turn(query, fast)
+            yield "step", f"Fast path: {fast[2][0]}"
+            yield "answer", fast[0]
+            yield "done", fast
+            return
+        started = time.perf_counter()
+        prompt = route_span.run(self._build_prompt, query, route_span.run(self._conversation))
+        agent = self.agent
+        # Only CodeAgent steps stream token deltas; tool calls arrive whole
+        # Streamed replies are not recorded, so recording and replaying use whole replies
+        agent.stream_outputs = (
+            self.agent_type == "code" and hasattr(agent.model, "generate_stream") and replay.active() is None
+        )
+        # The agent draws its own live output while streaming; keep it off the terminal
+        agent_console = agent.logger.console
+        if not self.debug:
+            agent.logger.console = Console(file=io.StringIO())
+        events = route_span.run(agent.run, prompt, stream=True)
+        step_tools = []
+        final_answer = None
+        try:
+            while True:
+                # Only silence stdout while the agent works, not while the caller renders
+                with self._redirect_stdout():
+                    try:
+                        event = route_span.run(next, events)
+                    except StopIteration:
+                        break
+                kind = type(event).__name__
+                if kind == "ChatMessageStreamDelta":
+                    if event.content:
+                        yield "delta", event.content
+                elif kind == "ActionStep":
+                    for line in (event.model_output or "").split("\n"):
+                        if line.strip().startswith("Thought:"):
+                            yield "thought", line.strip()
+                    called = self._step_tools(event, agent.tools)
+                    step_tools.extend(name for name in called if name not in step_tools)
+                    summary = f"Step {event.step_number}"
+                    if event.duration is not None:
+                        summary += f" ({event.duration:.1f}s)"
+                    if event.error is not None:
+                        summary += f": error: {event.error}"
+                    elif called:
+                        summary += f": {', '.join(called)}"
+                    yield "step", summary
+                elif kind == "FinalAnswerStep":
+                    final_answer = event.final_answer
+        finally:
+            agent.stream_outputs = False
+            agent.logger.console = agent_console
+        get_fast_path_stats().agent(time.perf_counter() - started)
+        
+        self.logger.debug("Raw agent response: %s", final_answer)
+        response, thoughts, tools_used = self._parse_response("" if final_answer is None else final_answer, step_tools)
+        self._remember(query, (response, thoughts, tools_used))
+        self._record_turn(query, (response, thoughts, tools_used))
+        yield "answer", response
+        yield "done", (response, thoughts, tools_used)
+
+    def _checkout_agent(self) -> CodeAgent:
+        """Take an idle agent from the pool, building a new one if none is free"""
+        with self._pool_lock:
+            if self._idle_agents:
+                return self._idle_agents.pop()
+        return self._build_agent()
+
+    def _checkin_agent(self, agent: CodeAgent):
+        with self._pool_lock:
+            if len(self._idle_agents) < self.max_concurrency:
+                self._idle_agents.append(agent)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="ranger-route")
+            return self._executor
+
+    def _route_pooled(self, query: str) -> Tuple[str, str, List[str]]:
+        """Run one query on a pooled agent so it can overlap with other queries"""
+        with span("router", "aroute", model_id=self.model_id) as active:
+            cached = self._cached(query)
+            active.set(cache_hit=cached is not None)
+            if cached is not None:
+                self._record_turn(query, cached)
+                return cached
+            fast = self._fast(query)
+            if fast is not None:
+                self._record_turn(query, fast)
+                return fast
+            prompt = self._build_prompt(query, self._conversation())
+            agent = self._checkout_agent()
+            try:
+                response = self._run_agent(agent, prompt)
+                self.logger.debug("Raw agent response: %s", response)
+                # Read before check-in, while no other query can reuse the agent's memory
+                called = self._called_tools(agent)
+            finally:
+                self._checkin_agent(agent)
+            result = self._parse_response(response, called)
+            self._remember(query, result)
+            self._record_turn(query, result)
+            return result
+
+    async def aroute(self, query: str) -> Tuple[str, str, List[str]]:
+        """Route the query like `route` without blocking the event loop.
+
+        smolagents agents run synchronously, so each query runs on a pooled
+        agent in a worker thread; up to `max_concurrency` run at once, and many
+        `aroute` calls can be awaited together on one event loop. With memory,
+        each query sees the turns finished before it started and is added to
+        them when it finishes, so await the turns of one conversation in order.
+        """
+        self.logger.info("Processing query (async): %s", query)
+        loop = asyncio.get_running_loop()
+        # Carry the caller's context (and so its current span) into the worker thread
+        run = partial(contextvars.copy_context().run, self._route_pooled, query)
+        return await loop.run_in_executor(self._get_executor(), run)
+
+    def close(self):
+        """Shut down the worker threads used by `aroute`"""
+        with self._pool_lock:
+            executor, self._executor = self._executor, None
+            self._idle_agents.clear()
+        if executor is not None:
+            executor.shutdown(wait=False)
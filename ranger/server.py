@@ -0,0 +1,330 @@
+"""
+This module serves Router queries over HTTP from a pool of warm routers.
+"""
+
+import json
+import time
+import queue
+import signal
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import urlparse
+from ranger.batch import RouterPool
+from ranger.config import env_float, env_int
+from ranger.tracing import PERCENTILES, percentile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_WORKERS = 4
+# Requests allowed to wait for a free router, per worker
+DEFAULT_QUEUE_PER_WORKER = 2
+DEFAULT_QUEUE_TIMEOUT = 30.0
+DEFAULT_SHUTDOWN_GRACE = 30.0
+MAX_BODY_BYTES = 64 * 1024
+# Latency samples kept for the metrics percentiles
+LATENCY_WINDOW = 1000
+
+
+class _LengthRequired(ValueError):
+    """A request body without a Content-Length, answered with 411."""
+
+
+class _Metrics:
+    """Request counters and a sliding window of route latencies."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self._latencies = []
+
+    def count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+            del self._latencies[:-LATENCY_WINDOW]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = list(self._latencies)
+            counters = {"requests": self.requests, "errors": self.errors, "rejected": self.rejected}
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            **counters,
+            **{f"p{pct}_seconds": round(percentile(latencies, pct), 4) for pct in PERCENTILES},
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server_version = "Ranger"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, body: dict, status: int = 200, headers: dict = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_query(self) -> str:
+        """Read the query from the JSON body; on a body that is not read or not understood, the connection is closed."""
+        if self.headers.get("Transfer-Encoding"):
+            # Only Content-Length bodies are read; a chunked body would be left on the connection
+            self.close_connection = True
+            raise _LengthRequired("Content-Length is required; chunked request bodies are not supported.")
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY_BYTES:
+            # The body is left unread, so the next request on this connection would start inside it
+            self.close_connection = True
+            raise ValueError("Request body too large." if length > 0 else "Invalid Content-Length.")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            self.close_connection = True
+            raise ValueError(f"Invalid JSON: {e}")
+        query = body.get("query") if isinstance(body, dict) else None
+        if not isinstance(query, str) or not query.strip():
+            raise ValueError('Body must be a JSON object with a non-empty "query".')
+        return query
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        ranger = self.server.ranger
+        if path == "/healthz":
+            health = ranger.health()
+            self._send_json(health, status=200 if health["status"] == "ok" else 503)
+        elif path == "/metrics":
+            self._send_json(ranger.metrics())
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path not in ("/route", "/route/stream"):
+            self._send_json({"error": "not found"}, status=404)
+            return
+        ranger = self.server.ranger
+        ranger.stats.count("requests")
+        try:
+            query = self._read_query()
+        except ValueError as e:
+            self._send_json({"error": str(e)}, status=411 if isinstance(e, _LengthRequired) else 400,
+                            headers={"Connection": "close"} if self.close_connection else None)
+            return
+        if not ranger.admit():
+            ranger.stats.count("rejected")
+            self._send_json({"error": "server busy" if not ranger.draining else "shutting down"},
+                            status=503, headers={"Retry-After": "1"})
+            return
+        try:
+            with ranger.pool.lease(timeout=ranger.queue_timeout) as router:
+                if path == "/route":
+                    self._route(router, query)
+                else:
+                    self._route_stream(router, query)
+        except queue.Empty:
+            ranger.stats.count("rejected")
+            self._send_json({"error": "no router free"}, status=503, headers={"Retry-After": "1"})
+        finally:
+            ranger.release()
+
+    def _route(self, router, query: str):
+        start = time.perf_counter()
+        try:
+            response, thoughts, tools_used = router.route(query)
+        except Exception as e:
+            logger.error("Query failed: %s", str(e), exc_info=True)
+            self.server.ranger.stats.count("errors")
+            self._send_json({"error": str(e)}, status=500)
+            return
+        seconds = time.perf_counter() - start
+        self.server.ranger.stats.observe(seconds)
+        self._send_json({"response": response, "thoughts": thoughts, "tools_used": tools_used,
+                         "seconds": round(seconds, 3)})
+
+    def _write_chunk(self, event: dict):
+        data = (json.dumps(event) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _route_stream(self, router, query: str):
+        """Send Router.route_stream events as newline-delimited JSON in a chunked response."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        start = time.perf_counter()
+        try:
+            for kind, payload in router.route_stream(query):
+                if kind == "done":
+                    response, thoughts, tools_used = payload
+                    payload = {"response": response, "thoughts": thoughts, "tools_used": tools_used}
+                self._write_chunk({"event": kind, "data": payload})
+            self.server.ranger.stats.observe(time.perf_counter() - start)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info("Client went away during a streamed query")
+            self.close_connection = True
+            return
+        except Exception as e:
+            logger.error("Streamed query failed: %s", str(e), exc_info=True)
+            self.server.ranger.stats.count("errors")
+            self._write_chunk({"event": "error", "data": str(e)})
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class RangerServer:
+    """An HTTP front end for a pool of warm routers.
+
+    Endpoints:
+        POST /route         {"query": ...} -> {"response", "thoughts", "tools_used", "seconds"}
+        POST /route/stream  the same, as newline-delimited JSON progress events
+        GET  /healthz       status and concurrency limits; 503 while shutting down
+        GET  /metrics       request counters, latency percentiles and cache, pool and rate limit stats
+
+    At most `workers` queries run at once; up to `queue_size` more wait
+    (for at most `queue_timeout` seconds) for a router, and anything beyond
+    that is turned away with 503 and Retry-After.
+    """
+
+    def __init__(self, router_factory: Callable, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 workers: int = None, queue_size: int = None, queue_timeout: float = None,
+                 warm: bool = True):
+        self.workers = workers or env_int("RANGER_SERVE_WORKERS", DEFAULT_WORKERS)
+        self.queue_size = queue_size if queue_size is not None else env_int(
+            "RANGER_SERVE_QUEUE", self.workers * DEFAULT_QUEUE_PER_WORKER
+        )
+        self.queue_timeout = queue_timeout or env_float("RANGER_SERVE_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT)
+        self.pool = RouterPool(self.workers, router_factory, warm=warm)
+        self.stats = _Metrics()
+        self.draining = False
+        self._in_flight = 0
+        self._idle = threading.Condition()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.ranger = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def admit(self) -> bool:
+        """Take an admission slot for a query, or return False when full or shutting down."""
+        with self._idle:
+            if self.draining or self._in_flight >= self.workers + self.queue_size:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self):
+        with self._idle:
+            self._in_flight -= 1
+            self._idle.notify_all()
+
+    def limits(self) -> dict:
+        return {"workers": self.workers, "queue_size": self.queue_size,
+                "max_in_flight": self.workers + self.queue_size, "queue_timeout": self.queue_timeout}
+
+    def health(self) -> dict:
+        with self._idle:
+            in_flight = self._in_flight
+        return {
+            "status": "draining" if self.draining else "ok",
+            "in_flight": in_flight,
+            "idle_routers": self.pool.idle,
+            **self.limits(),
+        }
+
+    def metrics(self) -> dict:
+        from ranger import logs
+        from ranger.intents import get_fast_path_stats
+        from ranger.models.hedged import provider_report
+        from ranger.ratelimit import get_limiter
+        from ranger.response_cache import get_response_cache
+        from ranger.singleflight import flight_report
+        from ranger.transport import get_transport
+
+        response_cache = get_response_cache()
+        return {
+            **self.stats.snapshot(),
+            **self.health(),
+            "transport": get_transport().stats(),
+            "response_cache": response_cache.stats() if response_cache is not None else None,
+            "fast_path": get_fast_path_stats().report(),
+            "rate_limits": {name: get_limiter(name).stats() for name in ("anthropic", "openai", "maps")},
+            "providers": provider_report(),
+            "single_flight": flight_report(),
+            "logging": logs.stats(),
+        }
+
+    def start(self) -> "RangerServer":
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="ranger-serve", daemon=True)
+        self._thread.start()
+        logger.info("Serving on %s with %s", self.url, self.limits())
+        return self
+
+    def serve_forever(self, grace: float = None):
+        """Serve until SIGINT or SIGTERM, then shut down gracefully."""
+        stop = threading.Event()
+
+        def request_stop(signum, frame):
+            logger.info("Received signal %s; shutting down", signum)
+            stop.set()
+
+        previous = {sig: signal.signal(sig, request_stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            self.start()
+            stop.wait()
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+            self.shutdown(grace)
+
+    def shutdown(self, grace: float = None) -> bool:
+        """Stop taking queries, wait up to `grace` seconds for running ones, then stop serving.
+
+        Returns True if every running query finished in time.
+        """
+        grace = grace if grace is not None else env_float("RANGER_SERVE_SHUTDOWN_GRACE", DEFAULT_SHUTDOWN_GRACE)
+        deadline = time.monotonic() + grace
+        with self._idle:
+            self.draining = True
+            while self._in_flight and time.monotonic() < deadline:
+                self._idle.wait(timeout=deadline - time.monotonic())
+            drained = self._in_flight == 0
+        if not drained:
+            logger.warning("Shutting down with %d queries still running", self._in_flight)
+        if self._thread is not None:
+            self._httpd.shutdown()
+        self._httpd.server_close()
+        self.pool.close()
+        logger.info("Server stopped")
+        return drained
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.shutdown(grace=0)
@@ -0,0 +1,100 @@
+"""
+This module coalesces identical concurrent calls so that only one of them reaches the upstream service.
+"""
+
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Tuple
+from ranger.config import env_flag
+from ranger.tracing import annotate
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; callers arriving meanwhile share its outcome.
+
+    The first caller for a key (the leader) makes the call. Callers with the
+    same key that arrive before it finishes wait for it and get the same
+    result, or the same exception. Nothing is kept once the call is done;
+    caching results is left to the caches around it. Set RANGER_SINGLE_FLIGHT=0
+    to turn coalescing off.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.coalesced = 0
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """Return the future for `key` and whether the caller leads (makes) the call."""
+        with self._lock:
+            self.calls += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _finish(self, key: str, future: Future, result=None, error: BaseException = None):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: str, func: Callable, *args, **kwargs):
+        """Call `func(*args, **kwargs)`, or wait for the identical call already in flight."""
+        if not env_flag("RANGER_SINGLE_FLIGHT", True):
+            return func(*args, **kwargs)
+        future, leader = self._join(key)
+        if not leader:
+            logger.debug("Coalesced %s call %s", self.name, key)
+            annotate(coalesced=True)
+            return future.result()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def stats(self) -> dict:
+        """Calls seen, calls that reached upstream, and calls saved by waiting on another."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "upstream": self.calls - self.coalesced,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._inflight),
+            }
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(name: str) -> SingleFlight:
+    """Return the process-wide coalescing group for one kind of call, e.g. "weather" or "anthropic"."""
+    with _flights_lock:
+        if name not in _flights:
+            _flights[name] = SingleFlight(name)
+        return _flights[name]
+
+
+def flight_report() -> dict:
+    """Counters of every coalescing group used in this process."""
+    with _flights_lock:
+        flights = dict(_flights)
+    return {name: flight.stats() for name, flight in flights.items()}
+
+
+def reset_flights():
+    with _flights_lock:
+        _flights.clear()
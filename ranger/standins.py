@@ -0,0 +1,294 @@
+"""
+This module provides local stand-in servers for the Anthropic, OpenAI and Google Maps APIs, for benchmarks and tests.
+"""
+
+import re
+import json
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger(__name__)
+
+WEATHER_REPLY = "- Temperature: 72°F\n- Conditions: Sunny\n- Humidity: 40%\n- Wind: 5 mph"
+
+# A two-step CodeAgent run: call both tools, then answer. {n} is the "#n" tag of the query.
+AGENT_SCRIPT = [
+    "Thought: Using tool: get_weather\n"
+    "Thought: Using tool: get_travel_duration\n"
+    "Code:\n"
+    "```py\n"
+    "weather = get_weather(\"Bench City #{n}\")\n"
+    "duration = get_travel_duration(\"Bench Town #{n}\", \"Bench City #{n}\")\n"
+    "print(weather, duration)\n"
+    "```<end_code>",
+    "Thought: I have everything I need.\n"
+    "Code:\n"
+    "```py\n"
+    "final_answer(\"Sunny and 72F in Bench City #{n}, 12 mins away by car.\")\n"
+    "```<end_code>",
+]
+
+# The same run for a tool-calling agent: both tools in one turn, then the answer. Blocks as in Messages API replies.
+TOOL_SCRIPT = [
+    [
+        {"type": "text", "text": "Thought: I need the weather and the drive; I can ask for both at once."},
+        {"type": "tool_use", "id": "toolu_{n}_1", "name": "get_weather", "input": {"location": "Bench City #{n}"}},
+        {"type": "tool_use", "id": "toolu_{n}_2", "name": "get_travel_duration",
+         "input": {"start_location": "Bench Town #{n}", "destination_location": "Bench City #{n}"}},
+    ],
+    [
+        {"type": "tool_use", "id": "toolu_{n}_3", "name": "final_answer",
+         "input": {"answer": "Sunny and 72F in Bench City #{n}, 12 mins away by car."}},
+    ],
+]
+
+
+def _text(content) -> str:
+    """Flatten message content given as a string or a list of text blocks."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return ""
+
+
+def _has_tool_blocks(messages: List[dict]) -> bool:
+    return any(isinstance(block, dict) and block.get("type") in ("tool_use", "tool_result")
+               for message in messages if isinstance(message.get("content"), list) for block in message["content"])
+
+
+def scripted_reply(messages: List[dict], script: List[str] = AGENT_SCRIPT) -> str:
+    """Pick the reply for a conversation: a weather report for weather prompts, otherwise
+    the script entry for the current agent step (the number of assistant turns so far)."""
+    user_texts = [_text(m.get("content")) for m in messages if m.get("role") == "user"]
+    if user_texts and "weather report" in user_texts[0]:
+        return WEATHER_REPLY
+    task = next((text for text in user_texts if "#" in text), "")
+    match = re.search(r"#(\d+)", task)
+    step = sum(1 for m in messages if m.get("role") == "assistant")
+    return script[min(step, len(script) - 1)].replace("{n}", match.group(1) if match else "0")
+
+
+def scripted_tool_use(messages: List[dict], script: List[List[dict]] = TOOL_SCRIPT) -> List[dict]:
+    """Pick the content blocks for a tool-calling conversation: the script entry for the
+    current step, the number of turns of tool results sent back so far."""
+    users = [m.get("content") for m in messages if m.get("role") == "user"]
+    task = next((text for text in map(_text, users) if "#" in text), "")
+    match = re.search(r"#(\d+)", task)
+    step = sum(1 for content in users if isinstance(content, list)
+               and any(isinstance(block, dict) and block.get("type") == "tool_result" for block in content))
+    blocks = json.dumps(script[min(step, len(script) - 1)]).replace("{n}", match.group(1) if match else "0")
+    return json.loads(blocks)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, delayed ACKs add ~40ms per request
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, body: dict, status: int = 200):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _delay(self):
+        self.server.standin.record_request()
+        if self.server.standin.latency:
+            time.sleep(self.server.standin.latency)
+
+
+class _ModelHandler(_Handler):
+    """Anthropic Messages and OpenAI Chat Completions endpoints."""
+
+    def do_GET(self):
+        self._delay()
+        if urlparse(self.path).path.endswith("/models"):
+            self._send_json({"data": [{"id": "stand-in"}]})
+        else:
+            self._send_json({"error": {"message": "not found"}}, status=404)
+
+    def do_POST(self):
+        self._delay()
+        path = urlparse(self.path).path
+        request = self._read_json()
+        messages = list(request.get("messages", []))
+        text = self.server.standin.reply(messages)
+        input_tokens = sum(len(_text(m.get("content")).split()) for m in messages)
+        output_tokens = len(text.split())
+        if path.endswith("/v1/messages"):
+            if not request.get("tools") and _has_tool_blocks(messages):
+                # As the Messages API does
+                self._send_json({"type": "error", "error": {
+                    "type": "invalid_request_error",
+                    "message": "Requests with tool_use or tool_result blocks must define tools.",
+                }}, status=400)
+                return
+            usage = {"input_tokens": input_tokens, "output_tokens": output_tokens}
+            usage.update(self.server.standin.prompt_cache_usage(request))
+            if request.get("tools") and not request.get("stream"):
+                content = self.server.standin.tool_reply(messages)
+                self._send_json({
+                    "id": "msg_standin",
+                    "type": "message",
+                    "role": "assistant",
+                    "model": request.get("model"),
+                    "content": content,
+                    "stop_reason": "tool_use" if any(block["type"] == "tool_use" for block in content) else "end_turn",
+                    "usage": dict(usage, output_tokens=len(json.dumps(content).split())),
+                })
+            elif request.get("stream"):
+                self._stream_anthropic(text, usage)
+            else:
+                self._send_json({
+                    "id": "msg_standin",
+                    "type": "message",
+                    "role": "assistant",
+                    "model": request.get("model"),
+                    "content": [{"type": "text", "text": text}],
+                    "stop_reason": "end_turn",
+                    "usage": usage,
+                })
+        elif path.endswith("/chat/completions"):
+            self._send_json({
+                "id": "chatcmpl-standin",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": input_tokens, "completion_tokens": output_tokens,
+                          "total_tokens": input_tokens + output_tokens},
+            })
+        else:
+            self._send_json({"error": {"message": "not found"}}, status=404)
+
+    def _stream_anthropic(self, text: str, usage: dict):
+        events = [
+            {"type": "message_start", "message": {"usage": dict(usage, output_tokens=0)}},
+            {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+        ]
+        events += [{"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": word}}
+                   for word in re.findall(r"\S+\s*", text)]
+        events += [
+            {"type": "content_block_stop", "index": 0},
+            {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": usage["output_tokens"]}},
+            {"type": "message_stop"},
+        ]
+        body = "".join(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n" for event in events).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _MapsHandler(_Handler):
+    """Google Maps directions, distance matrix and geocode endpoints."""
+
+    LEG = {"duration": {"text": "12 mins", "value": 720}, "distance": {"text": "9.0 km", "value": 9000}}
+
+    def do_GET(self):
+        self._delay()
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path.endswith("/directions/json"):
+            self._send_json({"status": "OK", "routes": [{"legs": [self.LEG]}]})
+        elif url.path.endswith("/distancematrix/json"):
+            origins = params.get("origins", [""])[0].split("|")
+            destinations = params.get("destinations", [""])[0].split("|")
+            rows = [{"elements": [dict(self.LEG, status="OK") for _ in destinations]} for _ in origins]
+            self._send_json({"status": "OK", "rows": rows})
+        elif url.path.endswith("/geocode/json"):
+            address = params.get("address", [""])[0]
+            self._send_json({"status": "OK", "results": [{
+                "formatted_address": address,
+                "place_id": "standin-" + "-".join(address.lower().split()),
+                "geometry": {"location": {"lat": 45.0, "lng": -85.6}},
+            }]})
+        else:
+            self._send_json({"status": "NOT_FOUND"}, status=404)
+
+
+class StandInServer:
+    """A threaded local HTTP server imitating one upstream API.
+
+    Every request waits `latency` seconds before it is answered. Use as a
+    context manager; `url` is the server root.
+    """
+
+    def __init__(self, handler, latency: float = 0.0, reply: Callable[[List[dict]], str] = scripted_reply,
+                 tool_reply: Callable[[List[dict]], List[dict]] = scripted_tool_use):
+        self.latency = latency
+        self.reply = reply
+        # Answers requests that offer tools
+        self.tool_reply = tool_reply
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._cached_prefixes = set()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self._server.standin = self
+        self._thread = None
+
+    def prompt_cache_usage(self, request: dict) -> dict:
+        """Imitate Anthropic prompt caching: the system prefix up to a cache_control
+        breakpoint is written on first sight and read afterwards. Tokens are counted as words."""
+        system = request.get("system")
+        if not isinstance(system, list) or not any("cache_control" in block for block in system):
+            return {}
+        prefix = json.dumps(system, sort_keys=True)
+        tokens = sum(len(block.get("text", "").split()) for block in system)
+        with self._lock:
+            seen = prefix in self._cached_prefixes
+            self._cached_prefixes.add(prefix)
+        if seen:
+            return {"cache_read_input_tokens": tokens, "cache_creation_input_tokens": 0}
+        return {"cache_read_input_tokens": 0, "cache_creation_input_tokens": tokens}
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.debug("Stand-in %s listening on %s", type(self).__name__, self.url)
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def model_server(latency: float = 0.0, reply: Callable[[List[dict]], str] = scripted_reply,
+                 tool_reply: Callable[[List[dict]], List[dict]] = scripted_tool_use) -> StandInServer:
+    """A stand-in for the Anthropic Messages and OpenAI Chat Completions APIs."""
+    return StandInServer(_ModelHandler, latency=latency, reply=reply, tool_reply=tool_reply)
+
+
+def maps_server(latency: float = 0.0) -> StandInServer:
+    """A stand-in for the Google Maps directions, distance matrix and geocode APIs."""
+    return StandInServer(_MapsHandler, latency=latency)
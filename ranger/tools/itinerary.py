@@ -0,0 +1,320 @@
+"""
+This module plans the visiting order and timing of multi-stop day trips.
+
+The whole plan costs one travel-time matrix lookup; the order is then solved
+locally with a nearest-neighbour tour improved by 2-opt moves and, when stops
+have time windows, single-stop relocations. 2-opt gains are computed for all
+segment pairs at once with NumPy when it is installed, and in plain Python
+otherwise.
+"""
+
+import re
+import logging
+from typing import Dict, List, Optional, Tuple
+from smolagents import tool
+from ranger.places import place_key
+from ranger.tools.maps import fetch_travel_matrix
+from ranger.replay import recorded
+from ranger.tracing import annotate, traced
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_START_TIME = "09:00"
+DEFAULT_STAY_MINUTES = 60
+# One Distance Matrix request covers up to 25 places, the start included
+MAX_STOPS = 24
+# Travel time charged for a leg Maps found no route for, so tours avoid it
+UNREACHABLE_S = 24 * 60 * 60
+# A second of arriving after a stop's window closes costs this many seconds of travel
+LATENESS_PENALTY = 10
+# Improvement passes before the local search settles for what it has
+MAX_PASSES = 100
+
+_CLOCK = re.compile(r"^\s*(\d{1,2})(?::(\d{2}))?\s*([ap]\.?m\.?)?\s*$", re.IGNORECASE)
+
+
+def parse_clock(text: str) -> int:
+    """Seconds after midnight for a clock time such as "9:30", "14:00" or "1:30 pm"."""
+    match = _CLOCK.match(str(text))
+    if not match:
+        raise ValueError(f"Not a clock time: {text!r}")
+    hours, minutes = int(match.group(1)), int(match.group(2) or 0)
+    suffix = (match.group(3) or "").lower().replace(".", "")
+    if suffix == "pm" and hours < 12:
+        hours += 12
+    elif suffix == "am" and hours == 12:
+        hours = 0
+    if hours > 23 or minutes > 59:
+        raise ValueError(f"Not a clock time: {text!r}")
+    return hours * 3600 + minutes * 60
+
+
+def format_clock(seconds: float) -> str:
+    minutes = int(round(seconds / 60))
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def format_minutes(seconds: float) -> str:
+    minutes = int(round(seconds / 60))
+    return f"{minutes // 60} h {minutes % 60} min" if minutes >= 60 else f"{minutes} min"
+
+
+def parse_window(value) -> Tuple[int, int]:
+    """An (opening, closing) pair in seconds from "11:30-13:30" or ["11:30", "13:30"]."""
+    parts = value.split("-") if isinstance(value, str) else list(value)
+    if len(parts) != 2:
+        raise ValueError(f"Not a time window: {value!r}")
+    opening, closing = parse_clock(parts[0]), parse_clock(parts[1])
+    if closing < opening:
+        raise ValueError(f"Time window closes before it opens: {value!r}")
+    return opening, closing
+
+
+def schedule(route: List[int], durations, start_s: int, stay_s: int, windows: Dict[int, Tuple[int, int]]) -> dict:
+    """Time a visiting order.
+
+    `route` lists stop indices into `durations`, where index 0 is the start
+    and the last index is where the day ends (the start again, or anywhere for
+    one-way trips). A stop reached before its window opens waits; one reached
+    after it closes is still visited but counts as late.
+    """
+    now, here = start_s, 0
+    visits = []
+    travel = wait = late = 0
+    for stop in route:
+        leg = durations[here][stop]
+        arrive = now + leg
+        opening, closing = windows.get(stop, (None, None))
+        waited = max(opening - arrive, 0) if opening is not None else 0
+        lateness = max(arrive - closing, 0) if closing is not None else 0
+        now = arrive + waited + stay_s
+        visits.append({"stop": stop, "leg": leg, "arrive": arrive, "wait": waited, "late": lateness, "leave": now})
+        travel, wait, late, here = travel + leg, wait + waited, late + lateness, stop
+    end_leg = durations[here][len(durations) - 1]
+    return {
+        "visits": visits,
+        "end_leg": end_leg,
+        "end": now + end_leg,
+        "travel": travel + end_leg,
+        "wait": wait,
+        "late": late,
+        "cost": travel + end_leg + wait + LATENESS_PENALTY * late,
+    }
+
+
+def _step_cost(durations, here: int, stop: int, now: float, windows: dict) -> float:
+    arrive = now + durations[here][stop]
+    opening, closing = windows.get(stop, (arrive, arrive))
+    return durations[here][stop] + max(opening - arrive, 0) + LATENESS_PENALTY * max(arrive - closing, 0)
+
+
+def _nearest_neighbour(durations, start_s: int, stay_s: int, windows: dict) -> List[int]:
+    """Greedy tour: always go next to the stop that is cheapest to reach and start from here."""
+    left = set(range(1, len(durations) - 1))
+    route, now, here = [], start_s, 0
+    while left:
+        stop = min(left, key=lambda stop: (_step_cost(durations, here, stop, now, windows), stop))
+        arrive = now + durations[here][stop]
+        now = max(arrive, windows.get(stop, (arrive, None))[0]) + stay_s
+        route.append(stop)
+        left.remove(stop)
+        here = stop
+    return route
+
+
+def two_opt_gains(durations, tour: List[int]):
+    """Travel saved by reversing each segment tour[i..j] of a tour that starts and ends fixed.
+
+    Entry [i - 1][j - 1] holds the saving for 1 <= i < j <= len(tour) - 2;
+    other entries are not moves and hold -inf. Reversing a segment of an
+    asymmetric matrix also turns its inner legs around, which the forward
+    and backward running sums account for.
+    """
+    m = len(tour) - 2
+    if np is not None:
+        d = np.asarray(durations, dtype=float)
+        t = np.asarray(tour)
+        forward = np.concatenate(([0.0], np.cumsum(d[t[:-1], t[1:]])))
+        backward = np.concatenate(([0.0], np.cumsum(d[t[1:], t[:-1]])))
+        i = np.arange(1, m + 1)[:, None]
+        j = np.arange(1, m + 1)[None, :]
+        gains = (d[t[i - 1], t[i]] + d[t[j], t[j + 1]] - d[t[i - 1], t[j]] - d[t[i], t[j + 1]]
+                 + (forward[j] - forward[i]) - (backward[j] - backward[i]))
+        return np.where(j > i, gains, -np.inf)
+
+    forward, backward = [0.0], [0.0]
+    for a, b in zip(tour, tour[1:]):
+        forward.append(forward[-1] + durations[a][b])
+        backward.append(backward[-1] + durations[b][a])
+    gains = [[float("-inf")] * m for _ in range(m)]
+    for i in range(1, m + 1):
+        for j in range(i + 1, m + 1):
+            gains[i - 1][j - 1] = (
+                durations[tour[i - 1]][tour[i]] + durations[tour[j]][tour[j + 1]]
+                - durations[tour[i - 1]][tour[j]] - durations[tour[i]][tour[j + 1]]
+                + (forward[j] - forward[i]) - (backward[j] - backward[i])
+            )
+    return gains
+
+
+def _best_gain(gains) -> Tuple[float, int, int]:
+    if np is not None:
+        i, j = np.unravel_index(np.argmax(gains), gains.shape)
+        return float(gains[i, j]), int(i) + 1, int(j) + 1
+    return max(((gain, i + 1, j + 1) for i, row in enumerate(gains) for j, gain in enumerate(row)), default=(0.0, 0, 0))
+
+
+def _two_opt(durations, route: List[int]) -> List[int]:
+    """Apply the best 2-opt reversal until none shortens the tour."""
+    tour = [0] + route + [len(durations) - 1]
+    for _ in range(MAX_PASSES):
+        if len(tour) < 4:
+            break
+        gain, i, j = _best_gain(two_opt_gains(durations, tour))
+        if gain <= 1e-9:
+            break
+        tour[i:j + 1] = reversed(tour[i:j + 1])
+    return tour[1:-1]
+
+
+def _neighbours(route: List[int]):
+    """Every 2-opt reversal and single-stop relocation of `route`."""
+    for i in range(len(route)):
+        for j in range(i + 1, len(route)):
+            yield route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+        rest = route[:i] + route[i + 1:]
+        for k in range(len(route)):
+            if k != i:
+                yield rest[:k] + [route[i]] + rest[k:]
+
+
+def _local_search(durations, route: List[int], start_s: int, stay_s: int, windows: dict) -> List[int]:
+    """First-improvement search over schedule cost, for tours whose timing depends on the order."""
+    best = schedule(route, durations, start_s, stay_s, windows)["cost"]
+    for _ in range(MAX_PASSES):
+        for candidate in _neighbours(route):
+            cost = schedule(candidate, durations, start_s, stay_s, windows)["cost"]
+            if cost < best - 1e-9:
+                route, best = candidate, cost
+                break
+        else:
+            break
+    return route
+
+
+def solve(durations, start_s: int, stay_s: int, windows: Dict[int, Tuple[int, int]] = None) -> dict:
+    """Order and time the stops of `durations` (see `schedule` for its layout)."""
+    windows = windows or {}
+    greedy = _nearest_neighbour(durations, start_s, stay_s, windows)
+    route = _two_opt(durations, greedy)
+    if windows:
+        # The shortest tour may miss windows the greedy one kept; search from both
+        plans = [schedule(_local_search(durations, candidate, start_s, stay_s, windows), durations, start_s, stay_s, windows)
+                 for candidate in (route, greedy)]
+        return min(plans, key=lambda plan: plan["cost"])
+    return schedule(route, durations, start_s, stay_s, windows)
+
+
+def _duration_matrix(places: List[str], legs: dict, return_to_start: bool) -> List[List[float]]:
+    """Travel seconds between places, plus a last row and column for where the day ends."""
+    size = len(places)
+    durations = [[0.0] * (size + 1) for _ in range(size + 1)]
+    for a, origin in enumerate(places):
+        for b, destination in enumerate(places):
+            if a != b:
+                leg = legs.get((origin, destination))
+                durations[a][b] = float(leg["duration_s"]) if leg and leg.get("duration_s") is not None else UNREACHABLE_S
+        durations[a][size] = durations[a][0] if return_to_start else 0.0
+    return durations
+
+
+def _match_windows(stops: List[str], time_windows: Optional[dict]) -> Tuple[Dict[int, Tuple[int, int]], List[str]]:
+    """Windows by stop index; windows naming no stop are returned separately."""
+    indices = {place_key(stop): index for index, stop in enumerate(stops, start=1)}
+    windows, unknown = {}, []
+    for name, value in (time_windows or {}).items():
+        index = indices.get(place_key(name))
+        if index is None:
+            unknown.append(name)
+        else:
+            windows[index] = parse_window(value)
+    return windows, unknown
+
+
+def _describe(plan: dict, places: List[str], transportation_mode: str, stay_s: int,
+              windows: dict, return_to_start: bool, start_s: int) -> str:
+    ending = "back" if return_to_start else "done"
+    lines = [
+        f"Itinerary from {places[0]} by {transportation_mode}: {len(plan['visits'])} stops, "
+        f"{format_minutes(plan['travel'])} of travel, {ending} by {format_clock(plan['end'])}.",
+        f"{format_clock(start_s)} leave {places[0]}",
+    ]
+    here = 0
+    for visit in plan["visits"]:
+        stop = visit["stop"]
+        leg = "no route found" if visit["leg"] >= UNREACHABLE_S else format_minutes(visit["leg"])
+        line = f"{format_clock(visit['arrive'])} arrive {places[stop]} ({leg} from {places[here]})"
+        if visit["wait"]:
+            line += f", wait {format_minutes(visit['wait'])} until it opens at {format_clock(windows[stop][0])}"
+        if visit["late"]:
+            line += f", {format_minutes(visit['late'])} after its window closes at {format_clock(windows[stop][1])}"
+        line += f", stay {format_minutes(stay_s)} until {format_clock(visit['leave'])}"
+        lines.append(line)
+        here = stop
+    if return_to_start:
+        lines.append(f"{format_clock(plan['end'])} back at {places[0]} ({format_minutes(plan['end_leg'])} from {places[here]})")
+    return "\n".join(lines)
+
+
+@tool
+@traced("tool")
+@recorded("tool")
+def optimize_itinerary(stops: List[str], start: str, transportation_mode: Optional[str] = None,
+                       time_windows: Optional[dict] = None, start_time: Optional[str] = None,
+                       stay_minutes: Optional[int] = None, return_to_start: Optional[bool] = None) -> str:
+    """Plans the best order to visit several stops in a day trip and returns a timed schedule, using one travel-time lookup for all stops. Prefer this over get_travel_matrix or get_travel_duration when planning a multi-stop trip.
+
+    Args:
+        stops: the places to visit, in any order, e.g. ["Leland, MI", "Glen Arbor, MI", "Suttons Bay, MI"]
+        start: the place where the day starts, e.g. "Northport, MI"
+        transportation_mode: The transportation mode, in 'driving', 'walking', 'bicycling', or 'transit'. Defaults to 'driving'.
+        time_windows: optional opening hours per stop, e.g. {"Glen Arbor, MI": "11:30-13:30"}; a visit starts within its window.
+        start_time: when the day starts, e.g. "9:00". Defaults to 09:00.
+        stay_minutes: how long each stop takes, in minutes. Defaults to 60.
+        return_to_start: whether the day ends back at the start. Defaults to True.
+    """
+    if transportation_mode is None:
+        transportation_mode = "driving"
+    if return_to_start is None:
+        return_to_start = True
+    stay_s = int(60 * (DEFAULT_STAY_MINUTES if stay_minutes is None else stay_minutes))
+    stops = [stop for stop in dict.fromkeys(stops) if place_key(stop) != place_key(start)]
+    if not stops:
+        return "No stops to visit besides the start."
+    if len(stops) > MAX_STOPS:
+        return f"Too many stops: at most {MAX_STOPS} can be planned at once."
+    try:
+        start_s = parse_clock(start_time or DEFAULT_START_TIME)
+        windows, unknown = _match_windows(stops, time_windows)
+    except ValueError as e:
+        return str(e)
+
+    places = [start] + stops
+    try:
+        legs = fetch_travel_matrix(places, places, transportation_mode)
+    except Exception as e:
+        logger.error("Error getting travel matrix for itinerary: %s", str(e))
+        return str(e)
+    durations = _duration_matrix(places, legs, return_to_start)
+    plan = solve(durations, start_s, stay_s, windows)
+    annotate(stops=len(stops), vectorized=np is not None)
+
+    text = _describe(plan, places, transportation_mode, stay_s, windows, return_to_start, start_s)
+    if unknown:
+        text += "\nIgnored time windows for places that are not stops: " + ", ".join(unknown)
+    return text
@@ -4,14 +4,113 @@ This module provides travel duration functionality using Google Maps.
 
 import os
 import logging
+import threading
 import googlemaps
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from smolagents import tool
+from ranger.cache import TTLCache, SQLiteBackend
+from ranger.config import env_int, env_float, env_str
+from ranger.fanout import fan_out
+from ranger.places import canonical_place, maps_location, resolve_place
+from ranger.singleflight import get_flight
+from ranger.transport import get_transport
+from ranger.replay import recorded
+from ranger.tracing import annotate, span, traced
 
 logger = logging.getLogger(__name__)
 
+# At 11, date far in the future
+DEPARTURE_TIME = datetime(2025, 6, 6, 11, 0)
+# Departure times within the same bucket share cached directions
+DEPARTURE_BUCKET_SECONDS = 15 * 60
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL = 6 * 60 * 60
+# Distance Matrix API limits per request
+MATRIX_MAX_ORIGINS = 25
+MATRIX_MAX_DESTINATIONS = 25
+MATRIX_MAX_ELEMENTS = 100
+NO_ROUTE = "No way found between these places with the required transportation mode."
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+_directions_cache = None
+_directions_cache_lock = threading.Lock()
+
+
+def gmaps_client(api_key: str, base_url: str = None) -> googlemaps.Client:
+    """Build a Google Maps client that sends its requests through the shared connection pool.
+
+    `base_url` replaces the Maps API root, e.g. to point at a local stand-in server.
+    """
+    transport = get_transport()
+    kwargs = {"base_url": base_url.rstrip("/")} if base_url else {}
+    return googlemaps.Client(
+        api_key,
+        requests_session=transport.session,
+        connect_timeout=transport.connect_timeout,
+        read_timeout=transport.read_timeout,
+        **kwargs,
+    )
+
+
+def get_client() -> googlemaps.Client:
+    """Return the module-level Google Maps client, rebuilding it if GMAPS_API_KEY or GMAPS_BASE_URL changed."""
+    global _client, _client_key
+    client_key = (os.getenv("GMAPS_API_KEY"), env_str("GMAPS_BASE_URL"))
+    with _client_lock:
+        if _client is None or client_key != _client_key:
+            _client = gmaps_client(*client_key)
+            _client_key = client_key
+        return _client
+
+
+def get_directions_cache() -> TTLCache:
+    """Return the directions cache, backed by SQLite when RANGER_MAPS_CACHE_PATH is set."""
+    global _directions_cache
+    with _directions_cache_lock:
+        if _directions_cache is None:
+            size = env_int("RANGER_MAPS_CACHE_SIZE", DEFAULT_CACHE_SIZE)
+            path = env_str("RANGER_MAPS_CACHE_PATH")
+            backend = SQLiteBackend(path, maxsize=size * 10) if path else None
+            _directions_cache = TTLCache(
+                maxsize=size,
+                ttl=env_float("RANGER_MAPS_CACHE_TTL", DEFAULT_CACHE_TTL),
+                backend=backend,
+            )
+        return _directions_cache
+
+
+def reset_directions_cache():
+    """Drop the process-wide directions cache so the next call rebuilds it from the current settings."""
+    global _directions_cache
+    with _directions_cache_lock:
+        if _directions_cache is not None and _directions_cache.backend is not None:
+            _directions_cache.backend.close()
+        _directions_cache = None
+
+
+def leg_cache_key(start_location: str, destination_location: str, transportation_mode: str,
+                  departure_time: datetime = DEPARTURE_TIME) -> str:
+    """Build the cache key for one leg: canonical places, mode and departure-time bucket."""
+    bucket = int(departure_time.timestamp()) // DEPARTURE_BUCKET_SECONDS
+    return "|".join([
+        canonical_place(start_location),
+        canonical_place(destination_location),
+        transportation_mode,
+        str(bucket),
+    ])
+
+
+def _maps_location(place: str) -> str:
+    return maps_location(resolve_place(place), place)
+
+
 @tool
+@traced("tool")
+@recorded("tool")
 def get_travel_duration(start_location: str, destination_location: str, transportation_mode: Optional[str] = None) -> str:
     """Gets the travel time between two places.
 
@@ -20,33 +119,201 @@ def get_travel_duration(start_location: str, destination_location: str, transpor
         destination_location: the place of arrival
         transportation_mode: The transportation mode, in 'driving', 'walking', 'bicycling', or 'transit'. Defaults to 'driving'.
     """
-    gmaps = googlemaps.Client(os.getenv("GMAPS_API_KEY"))
-
     if transportation_mode is None:
         transportation_mode = "driving"
     try:
-        directions_result = gmaps.directions(
-            start_location,
-            destination_location,
+        return _leg_duration(start_location, destination_location, transportation_mode)
+    except Exception as e:
+        logger.error("Error getting travel duration: %s", str(e))
+        return str(e)
+
+
+def _leg_duration(start_location: str, destination_location: str, transportation_mode: str) -> str:
+    """The travel time of one leg, from the cache or the Directions API; API errors are raised."""
+    cache = get_directions_cache()
+    key = leg_cache_key(start_location, destination_location, transportation_mode)
+    leg = cache.get(key)
+    annotate(cache_hit=leg is not None)
+    if leg is not None:
+        logger.debug("Directions cache hit for %s", key)
+        return leg["duration_text"]
+    # Concurrent lookups of the same leg wait for one Directions request
+    leg = get_flight("directions").do(key, _fetch_leg, start_location, destination_location, transportation_mode, key)
+    if leg is None:
+        return NO_ROUTE
+    return leg["duration_text"]
+
+
+def _fetch_leg(start_location: str, destination_location: str, transportation_mode: str, key: str) -> Optional[dict]:
+    """Request one leg from the Directions API and cache it; None when there is no route."""
+    with span("maps", "directions"):
+        directions_result = get_client().directions(
+            _maps_location(start_location),
+            _maps_location(destination_location),
             mode=transportation_mode,
-            departure_time=datetime(2025, 6, 6, 11, 0), # At 11, date far in the future
+            departure_time=DEPARTURE_TIME,
         )
-        if len(directions_result) == 0:
-            return "No way found between these places with the required transportation mode."
-        return directions_result[0]["legs"][0]["duration"]["text"]
+    if len(directions_result) == 0:
+        return None
+    result_leg = directions_result[0]["legs"][0]
+    leg = {
+        "duration_text": result_leg["duration"]["text"],
+        "duration_s": result_leg["duration"].get("value"),
+        "distance_m": result_leg.get("distance", {}).get("value"),
+    }
+    get_directions_cache().set(key, leg)
+    return leg
+
+
+def _matrix_chunks(origins: list, destinations: list):
+    """Split an origins x destinations request into chunks within the Distance Matrix limits."""
+    destination_step = min(len(destinations), MATRIX_MAX_DESTINATIONS)
+    origin_step = min(MATRIX_MAX_ORIGINS, max(MATRIX_MAX_ELEMENTS // destination_step, 1))
+    for i in range(0, len(origins), origin_step):
+        for j in range(0, len(destinations), destination_step):
+            yield origins[i:i + origin_step], destinations[j:j + destination_step]
+
+
+def fetch_travel_matrix(origins: List[str], destinations: List[str], transportation_mode: str = "driving") -> dict:
+    """Look up every origin/destination pair, using the directions cache where possible.
+
+    Returns a dict mapping (origin, destination) to a leg dict with duration_text,
+    duration_s and distance_m, or None when no route was found.
+    """
+    cache = get_directions_cache()
+    legs = {}
+    missing = []
+    for origin in origins:
+        for destination in destinations:
+            leg = cache.get(leg_cache_key(origin, destination, transportation_mode))
+            legs[(origin, destination)] = leg
+            if leg is None:
+                missing.append((origin, destination))
+    annotate(cache_hit=not missing)
+    if not missing:
+        return legs
+
+    # Only request the origins and destinations that still have uncached pairs
+    missing_origins = list(dict.fromkeys(origin for origin, _ in missing))
+    missing_destinations = list(dict.fromkeys(destination for _, destination in missing))
+    for origin_chunk, destination_chunk in _matrix_chunks(missing_origins, missing_destinations):
+        if not any(legs[(o, d)] is None for o in origin_chunk for d in destination_chunk):
+            continue
+        # Concurrent requests for the same chunk wait for one Distance Matrix call
+        chunk_key = "|".join([
+            ",".join(canonical_place(origin) for origin in origin_chunk),
+            ",".join(canonical_place(destination) for destination in destination_chunk),
+            transportation_mode,
+        ])
+        rows = get_flight("distance_matrix").do(
+            chunk_key, _fetch_matrix_chunk, origin_chunk, destination_chunk, transportation_mode
+        )
+        for origin, row in zip(origin_chunk, rows):
+            for destination, leg in zip(destination_chunk, row):
+                if leg is not None:
+                    legs[(origin, destination)] = leg
+    return legs
+
+
+def _fetch_matrix_chunk(origins: List[str], destinations: List[str], transportation_mode: str) -> List[list]:
+    """Request one chunk from the Distance Matrix API and cache its legs.
+
+    Returns a row of legs (None where there is no route) per origin, by
+    position, so callers that spell the same places differently can share it.
+    """
+    cache = get_directions_cache()
+    rows = [[None] * len(destinations) for _ in origins]
+    with span("maps", "distance_matrix", elements=len(origins) * len(destinations)):
+        result = get_client().distance_matrix(
+            [_maps_location(origin) for origin in origins],
+            [_maps_location(destination) for destination in destinations],
+            mode=transportation_mode,
+            departure_time=DEPARTURE_TIME,
+        )
+    for i, (origin, row) in enumerate(zip(origins, result.get("rows", []))):
+        for j, (destination, element) in enumerate(zip(destinations, row.get("elements", []))):
+            if element.get("status") != "OK":
+                continue
+            leg = {
+                "duration_text": element["duration"]["text"],
+                "duration_s": element["duration"]["value"],
+                "distance_m": element.get("distance", {}).get("value"),
+            }
+            cache.set(leg_cache_key(origin, destination, transportation_mode), leg)
+            rows[i][j] = leg
+    return rows
+
+
+@tool
+@traced("tool")
+@recorded("tool")
+def get_travel_matrix(origins: List[str], destinations: List[str], transportation_mode: Optional[str] = None) -> str:
+    """Gets the travel time and distance between every origin and every destination in one call. Prefer this over repeated get_travel_duration calls when planning trips with several stops.
+
+    Args:
+        origins: the places from which you start, e.g. ["Northport, MI", "Leland, MI"]
+        destinations: the places of arrival, e.g. ["Suttons Bay, MI", "Glen Arbor, MI"]
+        transportation_mode: The transportation mode, in 'driving', 'walking', 'bicycling', or 'transit'. Defaults to 'driving'.
+    """
+    if transportation_mode is None:
+        transportation_mode = "driving"
+    try:
+        legs = fetch_travel_matrix(list(origins), list(destinations), transportation_mode)
     except Exception as e:
-        logger.error("Error getting travel duration: %s", str(e))
+        logger.error("Error getting travel matrix: %s", str(e))
         return str(e)
+    lines = ["origin | destination | duration_s | distance_m"]
+    for (origin, destination), leg in legs.items():
+        if leg is None:
+            lines.append(f"{origin} | {destination} | no route | no route")
+        else:
+            lines.append(f"{origin} | {destination} | {leg['duration_s']} | {leg['distance_m']}")
+    return "\n".join(lines)
+
+
+# Each leg of a batch gets its own span, as a get_travel_duration call would
+_traced_leg_duration = traced("tool", "get_travel_duration")(_leg_duration)
+
+
+@tool
+@traced("tool")
+@recorded("tool")
+def get_travel_durations(pairs: List[List[str]], transportation_mode: Optional[str] = None) -> str:
+    """Gets the travel time for several (start, destination) pairs at once; the lookups run concurrently. Prefer this over calling get_travel_duration in a loop.
+
+    Args:
+        pairs: the legs to look up, each a [start_location, destination_location] pair, e.g. [["Northport, MI", "Leland, MI"], ["Leland, MI", "Glen Arbor, MI"]]
+        transportation_mode: The transportation mode, in 'driving', 'walking', 'bicycling', or 'transit'. Defaults to 'driving'.
+    """
+    if transportation_mode is None:
+        transportation_mode = "driving"
+    pairs = [list(pair) for pair in pairs]
+    valid = [len(pair) == 2 for pair in pairs]
+    outcomes = iter(fan_out(_traced_leg_duration, [
+        (pair[0], pair[1], transportation_mode) for pair, ok in zip(pairs, valid) if ok
+    ]))
+    lines = []
+    failed = 0
+    for pair, ok in zip(pairs, valid):
+        duration, error = next(outcomes) if ok else (None, "expected a [start_location, destination_location] pair")
+        if error is None:
+            lines.append(f"{pair[0]} -> {pair[1]}: {duration}")
+            continue
+        failed += 1
+        logger.error("Error getting travel duration for %s: %s", pair, str(error))
+        lines.append(f"{' -> '.join(map(str, pair))}: error: {error}")
+    annotate(items=len(pairs), failed=failed)
+    return "\n".join(lines)
+
 
-@staticmethod
 def check_status() -> str:
     """Check the status of the Google Maps API."""
     gmaps_key = os.getenv("GMAPS_API_KEY")
     if not gmaps_key:
         return "❌ Not configured"
     try:
-        gmaps = googlemaps.Client(gmaps_key)
+        gmaps = get_client()
         result = gmaps.geocode("New York")
         return "✅ Connected" if result else "❌ Error connecting"
     except Exception as e:
-        return f"❌ Error: {str(e)}" 
\ No newline at end of file
+        return f"❌ Error: {str(e)}"
@@ -1,16 +1,138 @@
 """
 This module is used to get the weather data for a given location.
+
+The weather mode is chosen with RANGER_WEATHER_MODE:
+- "direct" (default): one completion from a reused model instance.
+- "agent": a nested CodeAgent run, as in earlier versions.
+- any name registered with `register_weather_provider`.
 """
 
+import time
 import logging
+import threading
+from typing import Callable, List
 from smolagents import CodeAgent, tool
 from smolagents.models import OpenAIServerModel
 from ranger.models.claude import ClaudeServerModel
+from ranger.cache import TTLCache
+from ranger.config import env_str
+from ranger.fanout import fan_out
+from ranger.places import canonical_place, resolve_place
+from ranger.singleflight import get_flight
+from ranger.replay import recorded
+from ranger.tracing import annotate, span, traced
+from ranger.transport import get_transport
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_WEATHER_MODE = "direct"
+# Reports are reused for the rest of the hour they were generated in
+WEATHER_BUCKET_SECONDS = 60 * 60
+
+WEATHER_PROMPT = """
+    Generate a realistic weather report for {location}. Include:
+    - Temperature in Fahrenheit
+    - Weather conditions (sunny, cloudy, rainy, etc.)
+    - Humidity percentage
+    - Wind speed in miles/hour
+
+    Format the response in a clear, bullet-point style.
+    """
+
+_models = {}
+_models_lock = threading.Lock()
+_providers = {}
+weather_cache = TTLCache(maxsize=512, ttl=WEATHER_BUCKET_SECONDS)
+
+
+def register_weather_provider(name: str, provider: Callable[[str], str]):
+    """Register a weather data provider that RANGER_WEATHER_MODE can select by name.
+
+    Args:
+        name: The mode name, e.g. "openweathermap".
+        provider: A callable taking a location and returning a weather report.
+    """
+    _providers[name] = provider
+
+
+def _get_model(model_type: str):
+    """Return the shared model instance for `model_type`, creating it on first use."""
+    with _models_lock:
+        if model_type not in _models:
+            if model_type == "openai":
+                logger.debug("Using OpenAIServerModel in get_weather")
+                _models[model_type] = OpenAIServerModel(
+                    model_id="gpt-4", client_kwargs=get_transport().openai_client_kwargs()
+                )
+            elif model_type == "claude":
+                logger.debug("Using ClaudeServerModel in get_weather")
+                # A factual report, cached for the hour: identical lookups may share one call
+                _models[model_type] = ClaudeServerModel(temperature=0)
+            else:
+                raise ValueError("Unsupported model_type. Use 'openai' or 'claude'.")
+            logger.debug("Instantiated model, got %r", _models[model_type])
+        return _models[model_type]
+
+
+def _token_counts(message) -> dict:
+    """Token usage of one OpenAI completion, from the raw response on its ChatMessage, for span attributes.
+
+    Read from the reply rather than the model's last_* attributes, which other
+    threads sharing the model overwrite.
+    """
+    usage = getattr(getattr(message, "raw", None), "usage", None)
+    counts = {
+        "input_tokens": getattr(usage, "prompt_tokens", None),
+        "output_tokens": getattr(usage, "completion_tokens", None),
+        "cache_read_tokens": getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None),
+    }
+    return {key: value for key, value in counts.items() if isinstance(value, int)}
+
+
+def _direct_weather(location: str, model_type: str) -> str:
+    """Produce the report with a single model completion."""
+    model = _get_model(model_type)
+    prompt = WEATHER_PROMPT.format(location=location)
+    logger.debug("Prompt sent to model: %r", prompt)
+    with span("model", model_type, model_id=getattr(model, "model_id", None)) as model_span:
+        if model_type == "claude":
+            # Puts its own call's token counts on the span
+            response = model.generate(prompt)
+        else:
+            messages = [{"role": "user", "content": [{"type": "text", "text": prompt}]}]
+            message = model.generate(messages)
+            model_span.set(**_token_counts(message))
+            response = message.content
+    return response
+
+
+def _agent_weather(location: str, model_type: str) -> str:
+    """Produce the report with a nested CodeAgent run."""
+    agent = CodeAgent(
+        tools=[],
+        model=_get_model(model_type),
+        additional_authorized_imports=["datetime"]
+    )
+    prompt = WEATHER_PROMPT.format(location=location)
+    logger.debug("Prompt sent to agent.run: %r", prompt)
+    return agent.run(prompt)
+
+
+def _place_name(location: str) -> str:
+    """The resolved, unambiguous address of a location, or the location as given."""
+    place = resolve_place(location)
+    return place["address"] if place else location
+
+
+def _cache_key(location: str, mode: str, model_type: str) -> str:
+    """Cache key for a report: canonical place, mode, model and clock hour."""
+    bucket = int(time.time()) // WEATHER_BUCKET_SECONDS
+    return f"{canonical_place(location)}|{mode}|{model_type}|{bucket}"
+
 
 @tool
+@traced("tool")
+@recorded("tool")
 def get_weather(location: str, model_type: str = "claude") -> str:
     """Get a detailed weather report for a specific location.
 
@@ -20,31 +142,56 @@ def get_weather(location: str, model_type: str = "claude") -> str:
                  Examples: "New York", "Paris, France", "Mount Everest"
         model_type: The type of model to use. Options: "openai" or "claude".
     """
-    if model_type == "openai":
-        logger.debug("Using OpenAIServerModel in get_weather")
-        model_instance = OpenAIServerModel(model_id="gpt-4")
-    elif model_type == "claude":
-        logger.debug("Using ClaudeServerModel in get_weather")
-        model_instance = ClaudeServerModel()
-    else:
+    if model_type not in ("openai", "claude"):
         raise ValueError("Unsupported model_type. Use 'openai' or 'claude'.")
-    logger.debug("Instantiated model, got %r", model_instance)
-    agent = CodeAgent(
-        tools=[],
-        model=model_instance,
-        additional_authorized_imports=["datetime"]
-    )
-    prompt = f"""
-    Generate a realistic weather report for {location}. Include:
-    - Temperature in Fahrenheit
-    - Weather conditions (sunny, cloudy, rainy, etc.)
-    - Humidity percentage
-    - Wind speed in miles/hour
-    
-    Format the response in a clear, bullet-point style.
-    """
-    logger.debug("Prompt sent to agent.run: %r", prompt)
-    response = agent.run(prompt)
-    logger.debug("Response from agent.run: %r", response)
+    mode = env_str("RANGER_WEATHER_MODE", DEFAULT_WEATHER_MODE)
+    key = _cache_key(location, mode, model_type)
+    cached = weather_cache.get(key)
+    annotate(cache_hit=cached is not None)
+    if cached is not None:
+        logger.debug("Weather cache hit for %s", key)
+        return cached
+
+    if mode not in ("direct", "agent") and mode not in _providers:
+        raise ValueError(f"Unsupported RANGER_WEATHER_MODE {mode!r}. Use 'direct', 'agent' or a registered provider.")
+    # Concurrent requests for the same report wait for one upstream call
+    return get_flight("weather").do(key, _fetch_weather, location, mode, model_type, key)
+
+
+def _fetch_weather(location: str, mode: str, model_type: str, key: str) -> str:
+    location = _place_name(location)
+    with span("weather", mode):
+        if mode == "direct":
+            response = _direct_weather(location, model_type)
+        elif mode == "agent":
+            response = _agent_weather(location, model_type)
+        else:
+            response = _providers[mode](location)
+    logger.debug("Weather response: %r", response)
+    weather_cache.set(key, response)
     return response
 
+
+@tool
+@traced("tool")
+@recorded("tool")
+def get_weather_many(locations: List[str], model_type: str = "claude") -> str:
+    """Get weather reports for several locations at once; the lookups run concurrently. Prefer this over calling get_weather in a loop.
+
+    Args:
+        locations: The places to get weather information for, e.g. ["Northport, MI", "Leland, MI"].
+        model_type: The type of model to use. Options: "openai" or "claude".
+    """
+    locations = list(locations)
+    outcomes = fan_out(get_weather, [(location, model_type) for location in locations])
+    sections = []
+    failed = 0
+    for location, (report, error) in zip(locations, outcomes):
+        if error is None:
+            sections.append(f"Weather in {location}:\n{report}")
+            continue
+        failed += 1
+        logger.error("Error getting weather for %s: %s", location, str(error))
+        sections.append(f"Weather in {location}: error: {error}")
+    annotate(items=len(locations), failed=failed)
+    return "\n\n".join(sections)
@@ -0,0 +1,366 @@
+"""
+This module records timing spans around model calls, tool calls and agent steps as JSON lines.
+"""
+
+import json
+import math
+import time
+import uuid
+import queue
+import atexit
+import logging
+import logging.handlers
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+from ranger.config import env_flag, env_int, env_str
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 95, 99)
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+DEFAULT_QUEUE_SIZE = 10000
+TOKEN_ATTRS = ("input_tokens", "output_tokens", "cache_read_tokens", "cache_write_tokens")
+
+_current_span = contextvars.ContextVar("ranger_span", default=None)
+# Seconds per component for spans finished inside `stage_times`
+_stage_times = contextvars.ContextVar("ranger_stage_times", default=None)
+_writer_lock = threading.Lock()
+# The queue handler spans are put on and the listener that writes them to _writer_path
+_writer = None
+_listener = None
+_writer_path = None
+_configured_path = None
+
+
+class Span:
+    """One timed unit of work. Attributes set while it is open are written with it."""
+
+    def __init__(self, component: str, name: str, parent: "Span" = None, **attrs):
+        self.component = component
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self._parent_component = parent.component if parent is not None else None
+        self.attrs = {key: value for key, value in attrs.items() if value is not None}
+        self.started_at = time.time()
+        self._opened = time.perf_counter()
+        self._context = None
+
+    def set(self, **attrs):
+        """Add attributes such as token counts or cache hits to the span."""
+        self.attrs.update({key: value for key, value in attrs.items() if value is not None})
+
+    def setdefault(self, **attrs):
+        """Add attributes the span does not have yet, e.g. fallbacks for values the work recorded itself."""
+        self.set(**{key: value for key, value in attrs.items() if key not in self.attrs})
+
+    def run(self, func: Callable, *args, **kwargs):
+        """Call `func` with this span as the current one, e.g. to step a generator inside it."""
+        if self._context is None:
+            self._context = contextvars.copy_context()
+            self._context.run(_current_span.set, self)
+        return self._context.run(func, *args, **kwargs)
+
+    def end(self):
+        """Write the span, timed from when it was opened."""
+        self._finish(time.perf_counter() - self._opened)
+
+    def _finish(self, seconds: float):
+        stages = _stage_times.get()
+        # A span inside one of its own component (a tool calling a tool) is already counted
+        if stages is not None and self._parent_component != self.component:
+            stages[self.component] = stages.get(self.component, 0.0) + seconds
+        _write(self.to_dict(seconds))
+
+    def to_dict(self, seconds: float) -> dict:
+        return {
+            "ts": round(self.started_at, 6),
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "component": self.component,
+            "name": self.name,
+            "seconds": round(seconds, 6),
+            "attrs": self.attrs,
+        }
+
+
+def configure(path: Optional[str]):
+    """Write spans to `path`, or stop writing them when `path` is None.
+
+    RANGER_TRACE_PATH, when set, takes precedence; RANGER_TRACE=0 turns tracing off.
+    Spans are queued and written by a background thread to a file rotated by
+    size, per RANGER_TRACE_MAX_BYTES, RANGER_TRACE_BACKUPS and
+    RANGER_TRACE_QUEUE_SIZE (spans are dropped while the queue is full).
+    """
+    global _configured_path
+    with _writer_lock:
+        _configured_path = path
+
+
+def trace_path() -> Optional[Path]:
+    """Return the file spans are written to, or None when tracing is off."""
+    if not env_flag("RANGER_TRACE", True):
+        return None
+    path = env_str("RANGER_TRACE_PATH") or _configured_path
+    return Path(path).expanduser() if path else None
+
+
+def _start_writer(path: Path):
+    """Start a background thread writing queued spans to a rotating file at `path`."""
+    # ranger.logs imports this module for current_span, so import its pipeline pieces late
+    from ranger.logs import DroppingQueueHandler, file_handler
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    sink = file_handler(
+        str(path),
+        max_bytes=env_int("RANGER_TRACE_MAX_BYTES", DEFAULT_MAX_BYTES),
+        backups=env_int("RANGER_TRACE_BACKUPS", DEFAULT_BACKUPS),
+    )
+    sink.setFormatter(logging.Formatter("%(message)s"))
+    handler = DroppingQueueHandler(queue.Queue(env_int("RANGER_TRACE_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)))
+    listener = logging.handlers.QueueListener(handler.queue, sink)
+    listener.start()
+    return handler, listener
+
+
+def _write(record: dict):
+    global _writer, _listener, _writer_path
+    path = trace_path()
+    if path is None:
+        return
+    line = json.dumps(record, default=str)
+    with _writer_lock:
+        if _writer is None or _writer_path != path:
+            _stop_writer()
+            try:
+                _writer, _listener = _start_writer(path)
+            except OSError as e:
+                logger.warning("Could not write spans to %s: %s", path, str(e))
+                return
+            _writer_path = path
+        writer = _writer
+    # Only the enqueue happens here; the listener thread does the file I/O
+    writer.handle(logging.makeLogRecord({"msg": line, "levelno": logging.INFO, "levelname": "INFO"}))
+
+
+def _stop_writer():
+    """Write out queued spans and close the file. Call with _writer_lock held."""
+    global _writer, _listener, _writer_path
+    if _listener is not None:
+        _listener.stop()
+        for sink in _listener.handlers:
+            sink.close()
+    _writer = _listener = _writer_path = None
+
+
+def flush():
+    """Block until every span written so far is in the file, e.g. before reading it."""
+    with _writer_lock:
+        writer = _writer
+    if writer is not None:
+        writer.queue.join()
+
+
+def shutdown():
+    """Write out queued spans and close the span file; the next span reopens it."""
+    with _writer_lock:
+        _stop_writer()
+
+
+atexit.register(shutdown)
+
+
+def current_span() -> Optional[Span]:
+    """Return the innermost open span in this context, if any."""
+    return _current_span.get()
+
+
+def annotate(**attrs):
+    """Add attributes to the innermost open span, if any."""
+    active = _current_span.get()
+    if active is not None:
+        active.set(**attrs)
+
+
+@contextmanager
+def span(component: str, name: str, **attrs) -> Iterator[Span]:
+    """Time the enclosed block as a span nested under the current one.
+
+    Exceptions are recorded in the span's "error" attribute and re-raised.
+    """
+    active = Span(component, name, parent=_current_span.get(), **attrs)
+    token = _current_span.set(active)
+    start = time.perf_counter()
+    try:
+        yield active
+    except Exception as e:
+        active.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current_span.reset(token)
+        active._finish(time.perf_counter() - start)
+
+
+def open_span(component: str, name: str, **attrs) -> Span:
+    """Open a span without making it current; use `Span.run` to work inside it and `Span.end` to write it.
+
+    This suits generators, which cannot hold a context manager open across yields.
+    """
+    return Span(component, name, parent=_current_span.get(), **attrs)
+
+
+def record(component: str, name: str, seconds: float, started_at: float = None, **attrs):
+    """Write a span for work that was timed elsewhere, such as an agent step."""
+    finished = Span(component, name, parent=_current_span.get(), **attrs)
+    if started_at is not None:
+        finished.started_at = started_at
+    finished._finish(seconds)
+
+
+@contextmanager
+def stage_times() -> Iterator[Dict[str, float]]:
+    """Total the seconds of spans finished in the block by component, e.g. {"router": 1.2, "model": 0.9}.
+
+    Spans count whether or not tracing writes them to a file. A component's
+    time includes the spans nested inside it, so a tool's includes its maps calls.
+    """
+    stages = {}
+    token = _stage_times.set(stages)
+    try:
+        yield stages
+    finally:
+        _stage_times.reset(token)
+
+
+def traced(component: str, name: str = None) -> Callable:
+    """Decorator that runs every call to the function inside a span."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(component, name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_model(model, provider: str):
+    """Wrap a model instance's generate methods in "model" spans with token counts.
+
+    Models that put their own call's token counts on the current span (as
+    ClaudeServerModel does) keep them. Otherwise counts are read from the
+    smolagents `last_input_token_count` and `last_output_token_count`
+    attributes after each call, and prompt cache counts from
+    `last_cache_read_token_count` and `last_cache_write_token_count` where the
+    model has them; those are shared by every caller of the instance.
+    """
+    model_id = getattr(model, "model_id", None)
+
+    def token_attrs() -> dict:
+        return {
+            "input_tokens": getattr(model, "last_input_token_count", None),
+            "output_tokens": getattr(model, "last_output_token_count", None),
+            "cache_read_tokens": getattr(model, "last_cache_read_token_count", None),
+            "cache_write_tokens": getattr(model, "last_cache_write_token_count", None),
+        }
+
+    generate = model.generate
+
+    @wraps(generate)
+    def traced_generate(*args, **kwargs):
+        with span("model", provider, model_id=model_id) as active:
+            result = generate(*args, **kwargs)
+            active.setdefault(**token_attrs())
+            return result
+
+    model.generate = traced_generate
+
+    generate_stream = getattr(model, "generate_stream", None)
+    if callable(generate_stream):
+        @wraps(generate_stream)
+        def traced_generate_stream(*args, **kwargs):
+            active = open_span("model", provider, model_id=model_id, stream=True)
+            chunks = generate_stream(*args, **kwargs)
+            try:
+                while True:
+                    try:
+                        chunk = active.run(next, chunks)
+                    except StopIteration:
+                        break
+                    yield chunk
+                active.setdefault(**token_attrs())
+            except Exception as e:
+                active.set(error=f"{type(e).__name__}: {e}")
+                raise
+            finally:
+                active.end()
+
+        model.generate_stream = traced_generate_stream
+    return model
+
+
+def _span_files(path: str) -> List[Path]:
+    """The span file and its rotated backups that exist, oldest first (spans.jsonl.2, spans.jsonl.1, spans.jsonl)."""
+    path = Path(path)
+    backups = [
+        backup for backup in path.parent.glob(f"{path.name}.*")
+        if backup.name[len(path.name) + 1:].isdigit()
+    ]
+    backups.sort(key=lambda backup: int(backup.name[len(path.name) + 1:]), reverse=True)
+    return backups + ([path] if path.exists() else [])
+
+
+def read_spans(path: str, since: float = None) -> Iterator[dict]:
+    """Yield span records from a JSONL file and its rotated backups, oldest first.
+
+    Lines that are not valid JSON are skipped.
+    """
+    flush()
+    for part in _span_files(path):
+        with open(part, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if since is not None and record.get("ts", 0) < since:
+                    continue
+                yield record
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of `values`."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def aggregate(records) -> List[dict]:
+    """Summarize spans per (component, name): count, errors, p50/p95/p99 seconds and token totals (including prompt cache reads and writes)."""
+    groups = {}
+    for record in records:
+        key = (record.get("component"), record.get("name"))
+        group = groups.setdefault(key, {"seconds": [], "errors": 0, "cache_hits": 0, **{name: 0 for name in TOKEN_ATTRS}})
+        group["seconds"].append(record.get("seconds", 0.0))
+        attrs = record.get("attrs") or {}
+        group["errors"] += 1 if attrs.get("error") else 0
+        group["cache_hits"] += 1 if attrs.get("cache_hit") else 0
+        for name in TOKEN_ATTRS:
+            value = attrs.get(name)
+            group[name] += value if isinstance(value, int) else 0
+    rows = []
+    for (component, name), group in sorted(groups.items(), key=lambda item: (str(item[0][0]), str(item[0][1]))):
+        row = {"component": component, "name": name, "count": len(group["seconds"])}
+        for pct in PERCENTILES:
+            row[f"p{pct}"] = percentile(group["seconds"], pct)
+        row.update({key: value for key, value in group.items() if key != "seconds"})
+        rows.append(row)
+    return rows
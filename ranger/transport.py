@@ -0,0 +1,288 @@
+"""
+This module provides the shared, connection-pooled HTTP transport used by models and tools.
+"""
+
+import os
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from ranger.config import env_int, env_float, env_flag
+from ranger.ratelimit import limiter_for_url
+from ranger.tracing import annotate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 20
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 60.0
+
+
+def _should_retry(limiter, response, attempt: int) -> bool:
+    """Report a response to the provider's limiter and say whether a 429 should be retried."""
+    if limiter is None:
+        return False
+    limiter.record_response(response.status_code, response.headers.get("retry-after"), attempt)
+    if response.status_code != 429 or attempt >= limiter.max_retries:
+        return False
+    annotate(rate_limit_retries=attempt + 1)
+    return True
+
+
+class _CountingAdapter(HTTPAdapter):
+    """HTTPAdapter that counts every request it sends, including ones made by third-party clients.
+
+    Requests to a known provider are paced by its rate limiter, and 429
+    responses are retried once the limiter's back-off has passed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, *args, **kwargs):
+        limiter = limiter_for_url(request.url)
+        attempt = 0
+        while True:
+            if limiter is not None:
+                limiter.acquire()
+            with self._count_lock:
+                self.request_count += 1
+            response = super().send(request, *args, **kwargs)
+            if not _should_retry(limiter, response, attempt):
+                return response
+            response.close()
+            attempt += 1
+
+
+class Transport:
+    """A keep-alive HTTP transport with a bounded connection pool and default timeouts.
+
+    Settings come from the arguments or, when omitted, from the environment:
+    RANGER_HTTP_POOL_CONNECTIONS, RANGER_HTTP_POOL_MAXSIZE, RANGER_HTTP_CONNECT_TIMEOUT,
+    RANGER_HTTP_READ_TIMEOUT and RANGER_HTTP2.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = None,
+        pool_maxsize: int = None,
+        connect_timeout: float = None,
+        read_timeout: float = None,
+        http2: bool = None,
+    ):
+        self.pool_connections = pool_connections or env_int("RANGER_HTTP_POOL_CONNECTIONS", DEFAULT_POOL_CONNECTIONS)
+        self.pool_maxsize = pool_maxsize or env_int("RANGER_HTTP_POOL_MAXSIZE", DEFAULT_POOL_MAXSIZE)
+        self.connect_timeout = connect_timeout or env_float("RANGER_HTTP_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)
+        self.read_timeout = read_timeout or env_float("RANGER_HTTP_READ_TIMEOUT", DEFAULT_READ_TIMEOUT)
+        self.timeout = (self.connect_timeout, self.read_timeout)
+
+        self.session = requests.Session()
+        adapter = _CountingAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._adapter = adapter
+
+        self._lock = threading.Lock()
+        self._httpx_request_count = 0
+        self._http2_client = None
+        if http2 is None:
+            http2 = env_flag("RANGER_HTTP2")
+        if http2:
+            self._http2_client = self._build_http2_client()
+        logger.debug(
+            "Transport initialized: pool_connections=%s pool_maxsize=%s timeout=%s http2=%s",
+            self.pool_connections, self.pool_maxsize, self.timeout, self.http2,
+        )
+
+    @property
+    def http2(self) -> bool:
+        return self._http2_client is not None
+
+    def _build_http2_client(self):
+        """Build an HTTP/2 client when httpx (with h2) is installed, otherwise stay on HTTP/1.1."""
+        try:
+            import httpx
+            return httpx.Client(
+                http2=True,
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize),
+            )
+        except ImportError:
+            logger.warning("HTTP/2 requested but httpx[http2] is not installed; using HTTP/1.1")
+            return None
+
+    def _count_httpx(self):
+        with self._lock:
+            self._httpx_request_count += 1
+
+    def _send_httpx(self, method: str, url: str, kwargs: dict):
+        """Send through the HTTP/2 client, rate limited like the requests adapter."""
+        limiter = limiter_for_url(url)
+        attempt = 0
+        while True:
+            if limiter is not None:
+                limiter.acquire()
+            self._count_httpx()
+            response = self._http2_client.request(method, url, **self._httpx_kwargs(kwargs))
+            if not _should_retry(limiter, response, attempt):
+                return response
+            response.close()
+            attempt += 1
+
+    def get(self, url: str, **kwargs):
+        """Send a GET request through the shared pool."""
+        kwargs.setdefault("timeout", self.timeout)
+        if self._http2_client is not None:
+            return self._send_httpx("GET", url, kwargs)
+        return self.session.get(url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        """Send a POST request through the shared pool."""
+        kwargs.setdefault("timeout", self.timeout)
+        if self._http2_client is not None:
+            return self._send_httpx("POST", url, kwargs)
+        return self.session.post(url, **kwargs)
+
+    def stream_lines(self, method: str, url: str, **kwargs):
+        """Send a request and yield the decoded lines of the response body as they arrive.
+
+        Raises for non-2xx responses after logging the response body.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        if self._http2_client is not None:
+            limiter = limiter_for_url(url)
+            attempt = 0
+            while True:
+                if limiter is not None:
+                    limiter.acquire()
+                self._count_httpx()
+                with self._http2_client.stream(method, url, **self._httpx_kwargs(kwargs)) as response:
+                    if _should_retry(limiter, response, attempt):
+                        attempt += 1
+                        continue
+                    if response.status_code >= 400:
+                        response.read()
+                        logger.error("HTTP %s from %s: %s", response.status_code, url, response.text)
+                    response.raise_for_status()
+                    yield from response.iter_lines()
+                return
+        response = self.session.request(method, url, stream=True, **kwargs)
+        try:
+            if response.status_code >= 400:
+                logger.error("HTTP %s from %s: %s", response.status_code, url, response.text)
+            response.raise_for_status()
+            yield from response.iter_lines(decode_unicode=True)
+        finally:
+            response.close()
+
+    @staticmethod
+    def _httpx_kwargs(kwargs: dict) -> dict:
+        """Translate requests-style keyword arguments to their httpx equivalents."""
+        kwargs = dict(kwargs)
+        timeout = kwargs.pop("timeout", None)
+        if isinstance(timeout, tuple):
+            import httpx
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        return kwargs
+
+    def httpx_client(self):
+        """Build an httpx.Client for third-party SDKs (such as openai) that paces and reports
+        requests through the provider rate limiters, or return None if httpx is not installed.
+
+        429s are not retried here; the SDKs retry them themselves, and the limiter
+        holds those retries back until the server's retry-after has passed.
+        """
+        try:
+            import httpx
+        except ImportError:
+            return None
+
+        def before_request(request):
+            limiter = limiter_for_url(request.url)
+            if limiter is not None:
+                limiter.acquire()
+            self._count_httpx()
+
+        def after_response(response):
+            limiter = limiter_for_url(response.request.url)
+            if limiter is not None:
+                limiter.record_response(response.status_code, response.headers.get("retry-after"))
+
+        return httpx.Client(
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize),
+            event_hooks={"request": [before_request], "response": [after_response]},
+        )
+
+    def openai_client_kwargs(self) -> dict:
+        """`client_kwargs` for smolagents' OpenAIServerModel that route its calls through the rate limiters."""
+        client = self.httpx_client()
+        return {"http_client": client} if client is not None else {}
+
+    def stats(self) -> dict:
+        """Return request and connection counters for the pool.
+
+        `pool_hits` counts requests served on an already-open connection.
+        """
+        connections = 0
+        pooled_requests = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            connections += getattr(pool, "num_connections", 0)
+            pooled_requests += getattr(pool, "num_requests", 0)
+        with self._lock:
+            httpx_requests = self._httpx_request_count
+        return {
+            "requests": self._adapter.request_count + httpx_requests,
+            "connections": connections,
+            "pool_hits": max(pooled_requests - connections, 0),
+            "http2": self.http2,
+        }
+
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
+        if self._http2_client is not None:
+            self._http2_client.close()
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> Transport:
+    """Return the process-wide transport, creating it on first use."""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = Transport()
+    return _transport
+
+
+def reset_transport():
+    """Drop the process-wide transport so the next call builds a fresh one."""
+    global _transport
+    with _transport_lock:
+        if _transport is not None:
+            _transport.close()
+        _transport = None
+
+
+def _after_fork():
+    # Pooled sockets must not be shared with a forked child.
+    global _transport, _transport_lock
+    _transport = None
+    _transport_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -1,7 +1,13 @@
 import os
 import sys
+import tempfile
 from pathlib import Path
 
 # Add the project root directory to Python path
 project_root = Path(__file__).parent.parent
-sys.path.insert(0, str(project_root)) 
\ No newline at end of file
+sys.path.insert(0, str(project_root)) 
+
+# Keep places resolved and spans recorded during tests out of the files the CLI keeps in logs/
+_scratch = tempfile.mkdtemp(prefix="ranger-tests-")
+os.environ.setdefault("RANGER_PLACES_PATH", os.path.join(_scratch, "places.sqlite3"))
+os.environ.setdefault("RANGER_TRACE_PATH", os.path.join(_scratch, "spans.jsonl"))
@@ -0,0 +1,103 @@
+import json
+import threading
+import time
+
+import pytest
+
+from ranger import tracing
+from ranger.batch import read_queries, completed_ids, run_batch
+
+
+class FakeRouter:
+    instances = 0
+
+    def __init__(self, fail_on=None, delay=0.0):
+        FakeRouter.instances += 1
+        self.fail_on = fail_on
+        self.delay = delay
+        self.active = threading.Lock()
+        self.closed = False
+
+    def route(self, query):
+        # A router must never be used by two workers at once
+        assert self.active.acquire(blocking=False)
+        try:
+            with tracing.span("router", "route"):
+                with tracing.span("model", "fake"):
+                    time.sleep(self.delay)
+                if query == self.fail_on:
+                    raise RuntimeError("boom")
+            return f"answer to {query}", "Thought: ok", ["get_weather"]
+        finally:
+            self.active.release()
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def queries(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    path.write_text(
+        '{"id": "a", "query": "Weather in Paris?"}\n'
+        '"Weather in Rome?"\n'
+        '\n'
+        'not json\n'
+        '{"id": "c", "query": "Weather in Oslo?"}\n'
+    )
+    return path
+
+
+def read_results(path):
+    return {result["id"]: result for result in map(json.loads, path.read_text().splitlines())}
+
+
+def test_read_queries(queries):
+    assert list(read_queries(queries)) == [
+        ("a", "Weather in Paris?"),
+        ("2", "Weather in Rome?"),
+        ("c", "Weather in Oslo?"),
+    ]
+
+
+def test_run_batch_writes_results(queries, tmp_path):
+    out = tmp_path / "results.jsonl"
+    FakeRouter.instances = 0
+    routers = []
+    summary = run_batch(queries, out, router_factory=lambda: routers.append(FakeRouter(delay=0.05)) or routers[-1],
+                        workers=2)
+    assert summary["completed"] == 3
+    assert FakeRouter.instances == 2
+    assert all(router.closed for router in routers)
+    results = read_results(out)
+    assert results["a"]["response"] == "answer to Weather in Paris?"
+    assert results["2"]["tools_used"] == ["get_weather"]
+    assert results["c"]["seconds"] >= 0.05
+    # Per-stage timings: the wait for a router and each traced component
+    timings = results["c"]["timings"]
+    assert set(timings) == {"wait", "router", "model"}
+    assert timings["router"] >= timings["model"] >= 0.05
+
+
+def test_run_batch_closes_routers_when_it_fails(tmp_path):
+    routers = []
+    with pytest.raises(FileNotFoundError):
+        run_batch(tmp_path / "missing.jsonl", tmp_path / "results.jsonl",
+                  router_factory=lambda: routers.append(FakeRouter()) or routers[-1], workers=2)
+    assert len(routers) == 2 and all(router.closed for router in routers)
+
+
+def test_run_batch_resumes(queries, tmp_path):
+    """A second run skips finished queries and retries failed ones"""
+    out = tmp_path / "results.jsonl"
+    summary = run_batch(queries, out, router_factory=lambda: FakeRouter(fail_on="Weather in Oslo?"), workers=2)
+    assert summary["failed"] == 1
+    assert "error" in read_results(out)["c"]
+    # Simulate a run interrupted halfway through writing a line
+    with open(out, "a") as f:
+        f.write('{"id": "c", "quer')
+    assert completed_ids(out) == {"a", "2"}
+
+    summary = run_batch(queries, out, router_factory=FakeRouter, workers=2)
+    assert summary == {"completed": 1, "failed": 0, "skipped": 2, "seconds": summary["seconds"]}
+    assert completed_ids(out) == {"a", "2", "c"}
@@ -0,0 +1,85 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import requests
+
+from ranger.standins import maps_server, model_server, scripted_reply, WEATHER_REPLY
+
+
+def test_scripted_reply_follows_agent_steps():
+    task = {"role": "user", "content": [{"type": "text", "text": "New task: Weather in Bench City #42?"}]}
+    first = scripted_reply([{"role": "system", "content": "You are an agent"}, task])
+    second = scripted_reply([task, {"role": "assistant", "content": first}, {"role": "user", "content": "Observation"}])
+    assert 'get_weather("Bench City #42")' in first
+    assert "final_answer(" in second
+    assert scripted_reply([{"role": "user", "content": "Generate a realistic weather report for X"}]) == WEATHER_REPLY
+
+
+def test_model_server_speaks_both_apis():
+    with model_server() as server:
+        anthropic = requests.post(f"{server.url}/v1/messages", json={"messages": [{"role": "user", "content": "Hi #1"}]}).json()
+        openai = requests.post(f"{server.url}/v1/chat/completions", json={"messages": [{"role": "user", "content": "Hi #1"}]}).json()
+    assert anthropic["content"][0]["text"] == openai["choices"][0]["message"]["content"]
+    assert anthropic["usage"]["input_tokens"] == 2
+    assert server.requests == 2
+
+
+def test_maps_server_distance_matrix():
+    with maps_server() as server:
+        result = requests.get(f"{server.url}/maps/api/distancematrix/json",
+                              params={"origins": "A|B", "destinations": "C"}).json()
+    assert [len(row["elements"]) for row in result["rows"]] == [1, 1]
+
+
+# Other test modules replace smolagents and googlemaps in sys.modules, so run the real stack in a fresh process
+BENCH_SCRIPT = """
+import json, os, sqlite3, tempfile
+from ranger.bench import run_benchmarks
+from ranger.tools.maps import get_directions_cache, reset_directions_cache
+path = os.path.join(tempfile.mkdtemp(), "directions.sqlite3")
+os.environ["RANGER_MAPS_CACHE_PATH"] = path
+get_directions_cache().set("home|work|driving|0", {"duration_text": "20 mins"})
+before = dict(os.environ)
+run = run_benchmarks(concurrency=(1, 2), requests=4, latency=0, scenarios=("weather", "travel"))
+run["env_restored"] = dict(os.environ) == before
+reset_directions_cache()
+run["user_legs"] = [key for key, in sqlite3.connect(path).execute("SELECT key FROM entries")]
+print(json.dumps(run))
+"""
+
+
+def test_run_benchmarks_tools():
+    """Tool scenarios run against the stand-ins and leave the environment untouched"""
+    output = subprocess.run(
+        [sys.executable, "-c", BENCH_SCRIPT],
+        cwd=Path(__file__).parent.parent, capture_output=True, text=True, timeout=120, check=True,
+    ).stdout
+    run = json.loads(output.strip().splitlines()[-1])
+    assert run["env_restored"]
+    # The user's directions cache is neither cleared nor filled with stand-in legs
+    assert run["user_legs"] == ["home|work|driving|0"]
+    assert [(row["scenario"], row["concurrency"]) for row in run["results"]] == [
+        ("weather", 1), ("travel", 1), ("weather", 2), ("travel", 2)
+    ]
+    # Every input names new places, so each call also geocodes them once: weather needs one
+    # geocode plus the model call, travel two geocodes plus the directions call
+    calls_per_input = {"weather": 2, "travel": 3}
+    for row in run["results"]:
+        assert row["errors"] == 0
+        assert row["upstream_requests"] == 4 * calls_per_input[row["scenario"]]
+        assert row["p50"] <= row["p95"] <= row["p99"]
+    assert run["meta"]["requests"] == 4
+
+
+def test_model_server_imitates_prompt_caching():
+    body = {
+        "system": [{"type": "text", "text": "stable preamble", "cache_control": {"type": "ephemeral"}}],
+        "messages": [{"role": "user", "content": "Hi #1"}],
+    }
+    with model_server() as server:
+        first = requests.post(f"{server.url}/v1/messages", json=body).json()["usage"]
+        second = requests.post(f"{server.url}/v1/messages", json=body).json()["usage"]
+    assert (first["cache_creation_input_tokens"], first["cache_read_input_tokens"]) == (2, 0)
+    assert (second["cache_creation_input_tokens"], second["cache_read_input_tokens"]) == (0, 2)
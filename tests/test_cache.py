@@ -0,0 +1,61 @@
+import time
+
+from ranger.cache import TTLCache, SQLiteBackend
+
+
+def test_get_set_and_counters():
+    """Hits and misses are counted."""
+    cache = TTLCache(maxsize=10, ttl=60)
+    assert cache.get("a") is None
+    cache.set("a", {"duration_text": "1 hour"})
+    assert cache.get("a") == {"duration_text": "1 hour"}
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["size"] == 1
+
+
+def test_lru_eviction():
+    """The least recently used entry is evicted once the cache is full."""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+
+
+def test_ttl_expiry():
+    """Entries expire after their TTL."""
+    cache = TTLCache(maxsize=10, ttl=0.05)
+    cache.set("a", 1)
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    cache.set("b", 2, ttl=60)
+    assert cache.get("b") == 2
+
+
+def test_sqlite_backend_survives_restart(tmp_path):
+    """Entries written through to SQLite are visible to a new cache instance."""
+    path = tmp_path / "cache.sqlite"
+    cache = TTLCache(maxsize=10, ttl=60, backend=SQLiteBackend(path))
+    cache.set("a", {"duration_s": 5400})
+    cache.backend.close()
+
+    restarted = TTLCache(maxsize=10, ttl=60, backend=SQLiteBackend(path))
+    assert restarted.get("a") == {"duration_s": 5400}
+    assert restarted.stats()["hits"] == 1
+
+
+def test_sqlite_backend_prunes_least_recently_used(tmp_path):
+    """The on-disk store stays within its entry limit."""
+    backend = SQLiteBackend(tmp_path / "cache.sqlite", maxsize=2)
+    backend.set("a", 1, time.time() + 60)
+    time.sleep(0.01)
+    backend.set("b", 2, time.time() + 60)
+    time.sleep(0.01)
+    backend.set("c", 3, time.time() + 60)
+    assert backend.get("a") is None
+    assert backend.get("c") == (3, backend.get("c")[1])
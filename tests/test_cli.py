@@ -11,13 +11,24 @@ import os
 # Mock smolagents before importing CLI
 with patch('smolagents.CodeAgent'):
     with patch('smolagents.models.OpenAIServerModel'):
+        from ranger import logs
         from ranger.cli import CLI
+        from ranger.health import get_health_checker
         from rich.console import Console
 
+@pytest.fixture(autouse=True)
+def reset_health_cache():
+    """Provider statuses are cached per process; start each test with a clean cache."""
+    get_health_checker().reset()
+    yield
+    get_health_checker().reset()
+
 @pytest.fixture
-def cli():
-    """Create a CLI instance for testing."""
-    return CLI()
+def cli(tmp_path, monkeypatch):
+    """Create a CLI instance for testing, logging to a scratch directory rather than the repo's logs/."""
+    monkeypatch.setattr(CLI, "LOG_DIR", tmp_path / "logs")
+    yield CLI()
+    logs.shutdown()
 
 @pytest.fixture
 def mock_env_vars():
@@ -31,7 +42,7 @@ def mock_env_vars():
 
 def test_status_with_no_keys(cli):
     """Test status when no API keys are configured."""
-    with patch('requests.get') as mock_get, \
+    with patch('requests.Session.get') as mock_get, \
          patch.dict(os.environ, {"OPENAI_API_KEY": "", "ANTHROPIC_API_KEY": "", "GMAPS_API_KEY": ""}, clear=True):
         # Mock the console to capture output
         mock_console = MagicMock(spec=Console)
@@ -53,7 +64,7 @@ def test_status_with_no_keys(cli):
 
 def test_status_with_all_keys(cli, mock_env_vars):
     """Test status when all API keys are configured and working."""
-    with patch('requests.get') as mock_get, \
+    with patch('requests.Session.get') as mock_get, \
          patch('googlemaps.Client') as mock_gmaps:
         
         # Mock successful API responses
@@ -80,7 +91,7 @@ def test_status_with_all_keys(cli, mock_env_vars):
 
 def test_status_with_api_errors(cli, mock_env_vars):
     """Test status when API calls fail."""
-    with patch('requests.get') as mock_get, \
+    with patch('requests.Session.get') as mock_get, \
          patch('googlemaps.Client') as mock_gmaps:
         
         # Mock failed API responses
@@ -166,4 +177,72 @@ def test_run_command(cli):
         panel_call = mock_print.call_args[0][0]
         panel_text = str(panel_call.renderable)
         assert "response" in panel_text
-        assert "Tools used: get_weather" in panel_text 
\ No newline at end of file
+        assert "Tools used: get_weather" in panel_text 
+
+def test_repl_does_not_wait_for_slow_providers(cli):
+    """The REPL prompt appears before slow provider probes finish."""
+    import threading
+    import time
+    from ranger.health import HealthChecker, PENDING
+    release = threading.Event()
+    checker = HealthChecker(probes={
+        "OpenAI": ("OPENAI_API_KEY", lambda: release.wait(5) and "✅ Connected"),
+        "Claude": ("ANTHROPIC_API_KEY", lambda: "✅ Connected"),
+        "Google Maps": ("GMAPS_API_KEY", lambda: "✅ Connected"),
+    })
+    with patch('ranger.cli.get_health_checker', return_value=checker), \
+         patch.object(cli, 'input', side_effect=["exit"]), \
+         patch.object(cli.console, 'print') as mock_print:
+        started = time.monotonic()
+        cli.repl()
+        elapsed = time.monotonic() - started
+    release.set()
+    assert elapsed < 2
+    assert any(PENDING in str(call[0][0].renderable) for call in mock_print.call_args_list
+               if hasattr(call[0][0], 'renderable'))
+
+def test_run_command_streaming(cli):
+    """The run command renders streamed progress and then the response."""
+    events = [
+        ("thought", "Thought: Using tool: get_weather"),
+        ("step", "Step 1 (0.5s): get_weather"),
+        ("answer", "response"),
+        ("done", ("response", "Thought: Using tool: get_weather", ["get_weather"])),
+    ]
+    with patch.object(cli.console, 'print') as mock_print, \
+         patch.object(cli.router, 'route_stream', return_value=iter(events)), \
+         patch.object(cli.router, 'route') as mock_route:
+        cli.run("find the weather in ny", stream=True)
+        mock_route.assert_not_called()
+        panel_text = str(mock_print.call_args[0][0].renderable)
+        assert "response" in panel_text
+        assert "Tools used: get_weather" in panel_text
+
+
+def test_batch_command(cli, tmp_path):
+    """The batch command answers every query in the input file."""
+    input_path = tmp_path / "queries.jsonl"
+    input_path.write_text('{"id": "1", "query": "weather in ny"}\n{"id": "2", "query": "weather in la"}\n')
+    router = MagicMock()
+    router.route.return_value = ("response", "thoughts", ["get_weather"])
+    with patch('ranger.router.Router', return_value=router), \
+         patch.object(cli.console, 'print') as mock_print:
+        cli.batch(str(input_path), workers=2)
+    results = (tmp_path / "queries.results.jsonl").read_text().splitlines()
+    assert len(results) == 2
+    assert "2 completed" in str(mock_print.call_args[0][0].renderable)
+
+
+def test_stats_command(cli, tmp_path):
+    """The stats command summarizes recorded spans per component."""
+    import json
+    spans = tmp_path / "spans.jsonl"
+    spans.write_text("\n".join(json.dumps({
+        "ts": 0, "component": "tool", "name": "get_weather", "seconds": seconds, "attrs": {}
+    }) for seconds in (1.0, 2.0, 3.0)))
+    with patch.object(cli.console, 'print') as mock_print:
+        cli.stats(str(spans))
+    table = mock_print.call_args[0][0]
+    assert [column.header for column in table.columns][:6] == ["Component", "Name", "Count", "p50", "p95", "p99"]
+    assert list(table.columns[2].cells) == ["3"]
+    assert list(table.columns[3].cells) == ["2.00s"]
@@ -0,0 +1,73 @@
+import os
+import time
+import threading
+from unittest.mock import MagicMock, patch
+
+from ranger.health import HealthChecker, PENDING
+
+
+def slow_probe(status, delay=0.3):
+    def probe():
+        time.sleep(delay)
+        return status
+    return MagicMock(side_effect=probe)
+
+
+def test_probes_run_concurrently():
+    """Three slow probes finish in about the time of one."""
+    checker = HealthChecker(probes={
+        "A": ("A_KEY", slow_probe("✅ Connected")),
+        "B": ("B_KEY", slow_probe("✅ Connected")),
+        "C": ("C_KEY", slow_probe("✅ Connected")),
+    })
+    started = time.monotonic()
+    statuses = checker.check()
+    assert time.monotonic() - started < 0.8
+    assert statuses == {"A": "✅ Connected", "B": "✅ Connected", "C": "✅ Connected"}
+
+
+def test_results_cached_within_ttl():
+    """A second check within the TTL does not probe again."""
+    probe = MagicMock(return_value="✅ Connected")
+    checker = HealthChecker(probes={"A": ("A_KEY", probe)}, ttl=60)
+    checker.check()
+    checker.check()
+    assert probe.call_count == 1
+    checker.check(force=True)
+    assert probe.call_count == 2
+
+
+def test_results_expire_after_ttl():
+    """Stale results are probed again."""
+    probe = MagicMock(return_value="✅ Connected")
+    checker = HealthChecker(probes={"A": ("A_KEY", probe)}, ttl=0)
+    checker.check()
+    checker.check()
+    assert probe.call_count == 2
+
+
+def test_changed_key_invalidates_cache():
+    """Changing a provider's API key discards its cached status."""
+    probe = MagicMock(side_effect=["❌ Not configured", "✅ Connected"])
+    checker = HealthChecker(probes={"A": ("A_KEY", probe)}, ttl=60)
+    with patch.dict(os.environ, {"A_KEY": ""}):
+        assert checker.check()["A"] == "❌ Not configured"
+    with patch.dict(os.environ, {"A_KEY": "secret"}):
+        assert checker.check()["A"] == "✅ Connected"
+
+
+def test_probe_exception_reported():
+    """A probe that raises is reported as an error rather than propagating."""
+    checker = HealthChecker(probes={"A": ("A_KEY", MagicMock(side_effect=Exception("boom")))})
+    assert checker.check()["A"] == "❌ Error: boom"
+
+
+def test_snapshot_pending_until_done():
+    """Results fill in as probes complete, without blocking the caller."""
+    release = threading.Event()
+    checker = HealthChecker(probes={"A": ("A_KEY", lambda: release.wait() and "✅ Connected")})
+    assert checker.check(timeout=0)["A"] == PENDING
+    assert checker.pending()
+    release.set()
+    assert checker.check()["A"] == "✅ Connected"
+    assert not checker.pending()
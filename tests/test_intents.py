@@ -0,0 +1,62 @@
+import pytest
+
+from ranger.intents import FastPathStats, classify
+
+
+@pytest.mark.parametrize("query, tool, arguments", [
+    ("Weather in Northport, MI", "get_weather", {"location": "Northport, MI"}),
+    ("What's the weather like in Paris today?", "get_weather", {"location": "Paris"}),
+    ("Leland weather", "get_weather", {"location": "Leland"}),
+    ("Northport, MI weather right now", "get_weather", {"location": "Northport, MI"}),
+    ("How long to drive from Traverse City to Leland?", "get_travel_duration",
+     {"start_location": "Traverse City", "destination_location": "Leland", "transportation_mode": "driving"}),
+    ("how long is the walk from Leland to Fishtown", "get_travel_duration",
+     {"start_location": "Leland", "destination_location": "Fishtown", "transportation_mode": "walking"}),
+    ("Travel time from Sault Ste. Marie to Mackinaw City by bus", "get_travel_duration",
+     {"start_location": "Sault Ste. Marie", "destination_location": "Mackinaw City", "transportation_mode": "transit"}),
+])
+def test_clear_single_tool_queries(query, tool, arguments):
+    intent = classify(query)
+    assert (intent.tool, intent.arguments) == (tool, arguments)
+
+
+@pytest.mark.parametrize("query", [
+    "What's the weather?",
+    "Tell me the weather",
+    "Weather in Paris tomorrow",
+    "Weather in Leland and the drive from Omena?",
+    "What's the weather there?",
+    "How long from Leland to Omena to Suttons Bay?",
+    "How long to walk from Leland to Omena by car?",
+    "Plan a day trip to Leland, Omena and Suttons Bay",
+    "Weather in Leland on Saturday",
+    "Weather in Leland in 3 days",
+    "Weather in Leland at 5pm",
+    "What's the weather in Northport in July",
+    "Good hiking weather",
+    "Perfect beach weather",
+    "How long from Leland to Omena on Friday",
+    "How long from Leland to Omena at rush hour",
+])
+def test_ambiguous_or_multi_step_queries_go_to_the_agent(query):
+    assert classify(query) is None
+
+
+def test_answers_only_clean_tool_output():
+    travel = classify("How long to drive from Leland to Omena?")
+    assert travel.answer("25 mins") == "Travel time from Leland to Omena by driving: 25 mins"
+    assert travel.answer("Could not find a route") is None
+    assert classify("Weather in Leland").answer("Sunny, 72F") == "Weather in Leland:\nSunny, 72F"
+
+
+def test_stats_report_hit_rate_and_saving():
+    stats = FastPathStats()
+    assert stats.report()["saved_seconds"] is None
+    stats.hit(0.2)
+    stats.hit(0.4)
+    stats.miss()
+    stats.fallback()
+    stats.agent(3.0)
+    report = stats.report()
+    assert (report["queries"], report["hits"], report["hit_rate"]) == (4, 2, 0.5)
+    assert report["saved_seconds"] == pytest.approx(2 * (3.0 - 0.2))
@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from ranger import logs
+from ranger.tracing import span
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    root = logging.getLogger()
+    level = root.level
+    yield tmp_path / "ranger.log"
+    logs.shutdown()
+    root.setLevel(level)
+
+
+def read_lines(path):
+    logs.shutdown()
+    return path.read_text().splitlines()
+
+
+def test_single_sink_for_all_loggers(log_path):
+    logs.configure(str(log_path), "INFO")
+    logging.getLogger("ranger.test").info("from %s", "ranger")
+    logging.getLogger("smolagents").info("from smolagents")
+    logging.getLogger("httpcore").debug("below the level")
+    lines = read_lines(log_path)
+    assert len(lines) == 2
+    assert "from ranger" in lines[0] and "from smolagents" in lines[1]
+
+
+def test_json_output_carries_trace_id(log_path):
+    with patch.dict(os.environ, {"RANGER_LOG_FORMAT": "json"}):
+        logs.configure(str(log_path), "INFO")
+    with span("test", "query") as active:
+        logging.getLogger("ranger.test").warning("inside a span")
+    entry = json.loads(read_lines(log_path)[0])
+    assert entry["message"] == "inside a span"
+    assert entry["level"] == "WARNING"
+    assert entry["trace_id"] == active.trace_id
+
+
+def test_agent_traces_are_sampled_whole(log_path):
+    """With sampling off, trace lines are dropped; other loggers and warnings always pass"""
+    with patch.dict(os.environ, {"RANGER_LOG_SAMPLE": "0"}):
+        logs.configure(str(log_path), "INFO")
+    with span("test", "query"):
+        logging.getLogger("ranger.router.trace").info("Thought: dropped")
+        logging.getLogger("ranger.router.trace").warning("kept warning")
+        logging.getLogger("ranger.router").info("kept info")
+    assert logs.stats()["sampled_out"] == 1
+    lines = read_lines(log_path)
+    assert [line.split(" - ")[2] for line in lines] == ["kept warning", "kept info"]
+
+
+def test_size_rotation(log_path):
+    with patch.dict(os.environ, {"RANGER_LOG_MAX_BYTES": "200", "RANGER_LOG_BACKUPS": "2"}):
+        logs.configure(str(log_path), "INFO")
+    for i in range(20):
+        logging.getLogger("ranger.test").info("line %d", i)
+    logs.shutdown()
+    assert sorted(p.name for p in log_path.parent.iterdir()) == ["ranger.log", "ranger.log.1", "ranger.log.2"]
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = logs.DroppingQueueHandler(logs.queue.Queue(1))
+    record = logging.LogRecord("ranger.test", logging.INFO, __file__, 1, "message", None, None)
+    handler.handle(record)
+    handler.handle(record)
+    assert handler.dropped == 1
+
+
+def test_records_are_formatted_by_the_listener(log_path):
+    """The caller's thread leaves exceptions unformatted; the sink still writes the traceback"""
+    logs.configure(str(log_path), "INFO")
+    handler = logs._handler
+    try:
+        raise ValueError("quota")
+    except ValueError:
+        record = logging.getLogger("ranger.test").makeRecord(
+            "ranger.test", logging.ERROR, __file__, 1, "failed for %s", ("Leland",), sys.exc_info())
+    prepared = handler.prepare(record)
+    assert (prepared.msg, prepared.args, prepared.exc_text) == ("failed for Leland", None, None)
+    handler.handle(record)
+    text = "\n".join(read_lines(log_path))
+    assert "failed for Leland" in text and "ValueError: quota" in text
@@ -0,0 +1,57 @@
+from ranger.memory import ConversationMemory, Turn, estimate_tokens, summarize_turn
+
+
+def test_recent_turns_kept_verbatim():
+    memory = ConversationMemory(max_tokens=1000, recent_turns=2)
+    assert not memory
+    assert memory.render() == ""
+    memory.add("Weather in Paris?", "Sunny, 70F.", ["get_weather"])
+    memory.add("And in Rome?", "Cloudy, 65F.", ["get_weather"])
+    context = memory.render()
+    assert "User: Weather in Paris?\nRanger: Sunny, 70F." in context
+    assert "User: And in Rome?\nRanger: Cloudy, 65F." in context
+    assert memory.summaries == []
+
+
+def test_older_turns_are_summarized():
+    memory = ConversationMemory(max_tokens=1000, recent_turns=1)
+    memory.add("Weather in Paris?", "Sunny, 70F. Light wind from the west.\n- Humidity: 40%", ["get_weather"])
+    memory.add("And in Rome?", "Cloudy, 65F.")
+    assert [turn.query for turn in memory.turns] == ["And in Rome?"]
+    assert memory.summaries == ["- Asked: Weather in Paris? Answered: Sunny, 70F. (via get_weather)"]
+    assert "Humidity" not in memory.render()
+
+
+def test_summarize_turn_truncates_long_answers():
+    summary = summarize_turn(Turn("Route?", "x" * 500))
+    assert len(summary) < 200
+    assert summary.endswith("…")
+
+
+def test_context_stays_within_budget_over_a_long_session():
+    """Per-turn context stops growing once the budget is reached."""
+    memory = ConversationMemory(max_tokens=200, recent_turns=3)
+    sizes = []
+    for i in range(50):
+        memory.add(f"How long from town {i} to town {i + 1}?", f"About {i} minutes by car. " + "Details. " * 20)
+        sizes.append(memory.tokens())
+    assert max(sizes) <= 200
+    assert sizes[-1] == sizes[-10]
+    assert memory.omitted > 0
+    assert f"town {49}" in memory.render()
+
+
+def test_oversized_turn_is_truncated():
+    memory = ConversationMemory(max_tokens=50, recent_turns=3)
+    memory.add("Directions?", "step " * 500)
+    assert memory.tokens() <= 50
+    assert memory.turns[-1].query == "Directions?"
+
+
+def test_clear():
+    memory = ConversationMemory(max_tokens=100, recent_turns=1)
+    memory.add("a", "b")
+    memory.add("c", "d")
+    memory.clear()
+    assert not memory
+    assert estimate_tokens(memory.render()) == 0
@@ -0,0 +1,170 @@
+import os
+import json
+import pytest
+from unittest.mock import patch, MagicMock
+
+from ranger.models.claude import ClaudeServerModel
+
+
+@pytest.fixture
+def model():
+    with patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test_claude_key"}):
+        yield ClaudeServerModel()
+
+
+def sse(*events):
+    lines = []
+    for event in events:
+        lines += [f"event: {event['type']}", f"data: {json.dumps(event)}", ""]
+    return lines
+
+
+def test_generate(model):
+    """A completion returns the first text block"""
+    response = MagicMock(status_code=200)
+    response.json.return_value = {"content": [{"type": "text", "text": "Hello"}]}
+    with patch("ranger.models.claude.get_transport") as mock_transport:
+        mock_transport.return_value.post.return_value = response
+        assert model.generate("Hi") == "Hello"
+        payload = mock_transport.return_value.post.call_args.kwargs["json"]
+    assert payload["messages"] == [{"role": "user", "content": "Hi"}]
+
+
+def test_generate_rejects_empty_prompt(model):
+    with pytest.raises(ValueError):
+        model.generate("  ")
+
+
+def test_generate_stream(model):
+    """Text deltas from the SSE stream are yielded in order"""
+    lines = sse(
+        {"type": "message_start", "message": {}},
+        {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+        {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "Sunny "}},
+        {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "and 72F"}},
+        {"type": "content_block_stop", "index": 0},
+        {"type": "message_stop"},
+    )
+    with patch("ranger.models.claude.get_transport") as mock_transport:
+        mock_transport.return_value.stream_lines.return_value = iter(lines)
+        chunks = list(model.generate_stream("Weather?", stop_sequences=["Observation:"]))
+        method, url = mock_transport.return_value.stream_lines.call_args[0]
+        payload = mock_transport.return_value.stream_lines.call_args.kwargs["json"]
+    assert chunks == ["Sunny ", "and 72F"]
+    assert method == "POST"
+    assert payload["stream"] is True
+    assert payload["stop_sequences"] == ["Observation:"]
+
+
+def test_generate_stream_error_event(model):
+    """An error event in the stream raises"""
+    lines = sse({"type": "error", "error": {"type": "overloaded_error"}})
+    with patch("ranger.models.claude.get_transport") as mock_transport:
+        mock_transport.return_value.stream_lines.return_value = iter(lines)
+        with pytest.raises(RuntimeError):
+            list(model.generate_stream("Weather?"))
+
+
+def dropped(lines):
+    yield from lines
+    raise ConnectionError("connection reset")
+
+
+@pytest.mark.parametrize("failure", ["http_error", "error_event", "dropped", "abandoned"])
+def test_failed_stream_returns_its_token_reservation(model, failure):
+    """However a stream ends short of message_stop, the limiter is settled with zero tokens used"""
+    started = sse(
+        {"type": "message_start", "message": {"usage": {"input_tokens": 40, "output_tokens": 1}}},
+        {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "Sunny "}},
+    )
+    limiter = MagicMock()
+    with patch("ranger.models.claude.get_transport") as mock_transport, \
+         patch("ranger.models.claude.get_limiter", return_value=limiter):
+        stream_lines = mock_transport.return_value.stream_lines
+        if failure == "http_error":
+            stream_lines.side_effect = ConnectionError("503 Service Unavailable")
+        elif failure == "error_event":
+            stream_lines.return_value = iter(started + sse({"type": "error", "error": {"type": "overloaded_error"}}))
+        else:
+            stream_lines.return_value = dropped(started) if failure == "dropped" else iter(started)
+        chunks = model.generate_stream("Weather?")
+        if failure == "abandoned":
+            assert next(chunks) == "Sunny "
+            chunks.close()
+        else:
+            with pytest.raises(Exception):
+                list(chunks)
+    estimate = limiter.acquire.call_args.kwargs["tokens"]
+    limiter.record_tokens.assert_called_once_with(0, estimate)
+
+
+def test_messages_split_into_cached_system_blocks(model):
+    """System messages become system blocks; the preamble and conversation prefix are cache breakpoints"""
+    messages = [
+        {"role": "system", "content": [{"type": "text", "text": "You are an agent with tools."}]},
+        {"role": "user", "content": [{"type": "text", "text": "New task: weather in Paris"}]},
+        {"role": "tool-call", "content": [{"type": "text", "text": "get_weather('Paris')"}]},
+        {"role": "tool-response", "content": "Observation: sunny"},
+    ]
+    payload = model._build_payload(messages, system="Routing instructions")
+    assert [block["text"] for block in payload["system"]] == ["Routing instructions", "You are an agent with tools."]
+    assert payload["system"][-1]["cache_control"] == {"type": "ephemeral"}
+    assert "cache_control" not in payload["system"][0]
+    assert [m["role"] for m in payload["messages"]] == ["user", "assistant", "user"]
+    assert payload["messages"][-1]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+    assert "cache_control" not in payload["messages"][0]["content"][-1]
+
+
+def test_prompt_cache_can_be_disabled():
+    with patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test_claude_key", "RANGER_PROMPT_CACHE": "0"}):
+        payload = ClaudeServerModel()._build_payload("Hi", system="Be brief")
+    assert payload["system"] == [{"type": "text", "text": "Be brief"}]
+
+
+def test_generate_records_cache_usage(model):
+    response = MagicMock(status_code=200)
+    response.json.return_value = {
+        "content": [{"type": "text", "text": "Hello"}],
+        "usage": {"input_tokens": 12, "output_tokens": 3, "cache_read_input_tokens": 2048, "cache_creation_input_tokens": 0},
+    }
+    with patch("ranger.models.claude.get_transport") as mock_transport:
+        mock_transport.return_value.post.return_value = response
+        model.generate("Hi", system="Long stable preamble")
+    assert (model.last_input_token_count, model.last_output_token_count) == (12, 3)
+    assert (model.last_cache_read_token_count, model.last_cache_write_token_count) == (2048, 0)
+
+
+def test_concurrent_calls_report_their_own_usage(model, tmp_path, monkeypatch):
+    """Threads sharing one model get their own call's token counts on spans and in the limiter"""
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from ranger import tracing
+    monkeypatch.setenv("RANGER_TRACE_PATH", str(tmp_path / "spans.jsonl"))
+    in_flight = threading.Barrier(4)
+
+    def post(url, **kwargs):
+        # Every call is in flight before any returns, and they return in reverse order
+        n = int(kwargs["json"]["messages"][0]["content"].split("#")[1])
+        in_flight.wait()
+        threading.Event().wait(0.05 * (4 - n))
+        response = MagicMock(status_code=200)
+        response.json.return_value = {"content": [{"type": "text", "text": f"Sunny #{n}"}],
+                                      "usage": {"input_tokens": 100 * n, "output_tokens": n}}
+        return response
+
+    def call(n):
+        with tracing.span("model", "claude", n=n):
+            return model.generate(f"Weather #{n}")
+
+    limiter = MagicMock()
+    with patch("ranger.models.claude.get_transport") as mock_transport, \
+         patch("ranger.models.claude.get_limiter", return_value=limiter):
+        mock_transport.return_value.post.side_effect = post
+        with ThreadPoolExecutor(4) as pool:
+            assert list(pool.map(call, range(4))) == [f"Sunny #{n}" for n in range(4)]
+    tracing.flush()
+    spans = [json.loads(line)["attrs"] for line in (tmp_path / "spans.jsonl").read_text().splitlines()]
+    assert sorted((attrs["n"], attrs["input_tokens"], attrs["output_tokens"]) for attrs in spans) == [
+        (n, 100 * n, n) for n in range(4)
+    ]
+    assert sorted(record.args[0] for record in limiter.record_tokens.call_args_list) == [101 * n for n in range(4)]
@@ -0,0 +1,187 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+
+
+def run_script(script: str) -> dict:
+    """Other test modules replace smolagents in sys.modules, so the real stack runs in a fresh process"""
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=project_root, capture_output=True, text=True, timeout=120, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+MODEL_SCRIPT = """
+import json, os
+from unittest.mock import patch, MagicMock
+from smolagents import tool
+from smolagents.models import ChatMessage
+os.environ["ANTHROPIC_API_KEY"] = "test_claude_key"
+from ranger.models.claude_chat import ClaudeChatModel
+
+@tool
+def lookup(place: str, mode: str = None) -> str:
+    '''Looks a place up.
+
+    Args:
+        place: The place.
+        mode: How to get there.
+    '''
+    return place
+
+response = MagicMock(status_code=200)
+response.json.return_value = {"content": [
+    {"type": "text", "text": "Thought: both at once."},
+    {"type": "tool_use", "id": "toolu_1", "name": "lookup", "input": {"place": "Leland"}},
+    {"type": "tool_use", "id": "toolu_2", "name": "lookup", "input": {"place": "Omena", "mode": "bicycling"}},
+], "usage": {"input_tokens": 10, "output_tokens": 5}}
+model = ClaudeChatModel()
+with patch("ranger.models.claude.get_transport") as mock_transport:
+    mock_transport.return_value.post.return_value = response
+    message = model([ChatMessage(role="system", content="Be brief"), {"role": "user", "content": "Where?"}],
+                    stop_sequences=["Observation:"], tools_to_call_from=[lookup])
+    payload = mock_transport.return_value.post.call_args.kwargs["json"]
+parsed = model.parse_tool_calls(ChatMessage(role="assistant", content='{"name": "lookup", "arguments": {"place": "Suttons Bay"}}'))
+print(json.dumps({
+    "content": message.content,
+    "calls": [[call.id, call.function.name, call.function.arguments] for call in message.tool_calls],
+    "tools": payload["tools"],
+    "tool_choice": payload["tool_choice"],
+    "system": payload["system"][0]["text"],
+    "tokens": model.last_input_token_count,
+    "parsed": [parsed.tool_calls[0].function.name, parsed.tool_calls[0].function.arguments],
+}))
+"""
+
+
+def test_tool_use_blocks_become_tool_calls():
+    result = run_script(MODEL_SCRIPT)
+    assert result["content"] == "Thought: both at once."
+    assert result["calls"] == [
+        ["toolu_1", "lookup", {"place": "Leland"}],
+        ["toolu_2", "lookup", {"place": "Omena", "mode": "bicycling"}],
+    ]
+    assert result["tools"] == [{
+        "name": "lookup",
+        "description": "Looks a place up.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "place": {"type": "string", "description": "The place."},
+                "mode": {"type": "string", "description": "How to get there."},
+            },
+            "required": ["place"],
+        },
+    }]
+    assert result["tool_choice"] == {"type": "any"}
+    assert result["system"] == "Be brief"
+    assert result["tokens"] == 10
+    assert result["parsed"] == ["lookup", {"place": "Suttons Bay"}]
+
+
+ROUTE_SCRIPT = """
+import json, time
+from ranger.standins import model_server, maps_server
+from ranger.bench import _standin_env
+with model_server(latency=0.2) as models, maps_server(latency=0.2) as maps, _standin_env(models.url, maps.url):
+    from ranger.router import Router
+    from ranger.tools import weather
+    weather._models.clear()
+    router = Router(model_type="claude", agent_type="tool_calling")
+    agent = router.agent
+    start = time.perf_counter()
+    response, _, _ = router.route("Weather in Bench City #41 and the drive from Bench Town #41?")
+    elapsed = time.perf_counter() - start
+    steps = [step for step in agent.memory.steps if type(step).__name__ == "ActionStep"]
+    print(json.dumps({
+        "agent": type(agent).__name__,
+        "response": response,
+        "elapsed": elapsed,
+        "steps": [[call.name for call in step.tool_calls] for step in steps],
+        "observations": steps[0].observations,
+        "namespace": router.cache_namespace,
+    }))
+"""
+
+
+def test_tool_calling_router_runs_parallel_calls_in_one_step():
+    result = run_script(ROUTE_SCRIPT)
+    assert result["agent"] == "ParallelToolCallingAgent"
+    assert result["response"] == "Sunny and 72F in Bench City #41, 12 mins away by car."
+    assert result["steps"] == [["get_weather", "get_travel_duration"], ["final_answer"]]
+    assert "Call id: toolu_41_1 (get_weather)" in result["observations"]
+    assert "Call id: toolu_41_2 (get_travel_duration)" in result["observations"]
+    # Every upstream request takes 0.2s: two model turns, then the weather (geocode, model)
+    # and travel (geocodes, directions) calls at about 0.4s each; run one after the other
+    # they would take at least 1.2s in all
+    assert result["elapsed"] < 1.15
+    assert "|tool_calling|" in result["namespace"]
+
+
+CONVERT_SCRIPT = """
+import json, os
+os.environ["ANTHROPIC_API_KEY"] = "test_claude_key"
+from smolagents import ActionStep, TaskStep, ToolCall
+from ranger.models.claude_chat import ClaudeChatModel
+
+calls = [ToolCall(name="get_weather", arguments={"location": "Leland"}, id="toolu_1"),
+         ToolCall(name="get_travel_duration", arguments={"start_location": "Omena"}, id="toolu_2")]
+step = ActionStep(step_number=1, model_output="Thought: both at once.", tool_calls=calls,
+                  observations="Call id: toolu_1 (get_weather)\\nSunny\\n\\nCall id: toolu_2 (get_travel_duration)\\n12 mins")
+messages = TaskStep(task="Weather and drive?").to_messages() + step.to_messages()
+model = ClaudeChatModel()
+print(json.dumps({"tools": model._build_payload(messages, tool_blocks=True)["messages"],
+                  "text": model._build_payload(messages)["messages"]}))
+"""
+
+
+def test_earlier_tool_calls_go_back_as_tool_blocks():
+    result = run_script(CONVERT_SCRIPT)
+    turns = result["tools"]
+    assert [turn["role"] for turn in turns] == ["user", "assistant", "user"]
+    assert turns[1]["content"] == [
+        {"type": "text", "text": "Thought: both at once."},
+        {"type": "tool_use", "id": "toolu_1", "name": "get_weather", "input": {"location": "Leland"}},
+        {"type": "tool_use", "id": "toolu_2", "name": "get_travel_duration", "input": {"start_location": "Omena"}},
+    ]
+    results = [{key: block[key] for key in ("type", "tool_use_id", "content")} for block in turns[2]["content"]]
+    assert results == [
+        {"type": "tool_result", "tool_use_id": "toolu_1", "content": "Sunny"},
+        {"type": "tool_result", "tool_use_id": "toolu_2", "content": "12 mins"},
+    ]
+    # Without tools in the request (as for CodeAgent), the calls stay text
+    assert not any(block["type"] != "text" for turn in result["text"] for block in turn["content"])
+
+
+CODE_ROUTE_SCRIPT = """
+import json
+from ranger.standins import model_server, maps_server
+from ranger.bench import _standin_env
+with model_server() as models, maps_server() as maps, _standin_env(models.url, maps.url):
+    from ranger.router import Router
+    from ranger.tools import weather
+    weather._models.clear()
+    router = Router(model_type="claude", fast_path=False)
+    agent = router.agent
+    response, _, tools_used = router.route("Weather in Bench City #43 and the drive from Bench Town #43?")
+    steps = [step for step in agent.memory.steps if type(step).__name__ == "ActionStep"]
+    print(json.dumps({
+        "agent": type(agent).__name__,
+        "response": response,
+        "steps": len(steps),
+        "errors": [str(step.error) for step in steps if step.error is not None],
+    }))
+"""
+
+
+def test_code_agent_on_claude_runs_several_steps():
+    """CodeAgent records python_interpreter calls but sends no tools; they must go back as text"""
+    result = run_script(CODE_ROUTE_SCRIPT)
+    assert result["agent"] == "CodeAgent"
+    assert result["response"] == "Sunny and 72F in Bench City #43, 12 mins away by car."
+    assert result["steps"] == 2
+    assert result["errors"] == []
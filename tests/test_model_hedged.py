@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from ranger.models.hedged import HedgedModel, ProviderStats
+
+
+class Reply:
+    def __init__(self, content):
+        self.role = "assistant"
+        self.content = content
+
+
+class FakeModel:
+    def __init__(self, name, delay=0.0, fail=False):
+        self.model_id = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.last_input_token_count = 10
+        self.last_output_token_count = 5
+
+    def generate(self, messages, stop_sequences=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.model_id} is down")
+        return Reply(f"answer from {self.model_id}")
+
+
+def hedged(primary, secondary, **kwargs):
+    stats = {"a": ProviderStats(), "b": ProviderStats()}
+    kwargs.setdefault("min_delay", 0.05)
+    kwargs.setdefault("initial_delay", 0.1)
+    return HedgedModel({"a": primary, "b": secondary}, stats=stats, **kwargs)
+
+
+def test_fast_primary_is_not_hedged():
+    primary, secondary = FakeModel("a"), FakeModel("b")
+    model = hedged(primary, secondary)
+    message = model.generate([{"role": "user", "content": "hi"}])
+    assert message.content == "answer from a"
+    assert secondary.calls == 0
+    assert model.last_provider == "a"
+    assert model.last_input_token_count == 10
+
+
+def test_slow_primary_is_hedged():
+    """A primary slower than its hedge delay races the secondary, which wins."""
+    primary, secondary = FakeModel("a", delay=1.0), FakeModel("b")
+    model = hedged(primary, secondary)
+    start = time.perf_counter()
+    message = model.generate([])
+    assert time.perf_counter() - start < 0.5
+    assert message.content == "answer from b"
+    assert model.hedges == 1
+
+
+def test_failing_primary_fails_over():
+    primary, secondary = FakeModel("a", fail=True), FakeModel("b")
+    model = hedged(primary, secondary, initial_delay=10)
+    start = time.perf_counter()
+    assert model.generate([]).content == "answer from b"
+    assert time.perf_counter() - start < 1
+    assert model.failovers == 1
+
+
+def test_all_providers_failing_raises():
+    model = hedged(FakeModel("a", fail=True), FakeModel("b", fail=True))
+    with pytest.raises(RuntimeError, match="down"):
+        model.generate([])
+
+
+def test_primary_chosen_from_recent_latency_and_errors():
+    model = hedged(FakeModel("a"), FakeModel("b"))
+    assert model.ranked() == ["a", "b"]
+    for _ in range(5):
+        model.stats["a"].record(1.0, ok=True)
+        model.stats["b"].record(0.5, ok=True)
+    assert model.ranked() == ["b", "a"]
+    for _ in range(5):
+        model.stats["b"].record(0.5, ok=False)
+    assert model.ranked() == ["a", "b"]
+    assert model.report()["providers"]["b"]["error_rate"] == 0.5
+
+
+def test_hedge_delay_follows_latency_percentile():
+    model = hedged(FakeModel("a"), FakeModel("b"), hedge_percentile=95)
+    assert model.hedge_delay("a") == 0.1
+    for seconds in (0.2, 0.2, 0.2, 0.2, 0.8):
+        model.stats["a"].record(seconds, ok=True)
+    assert model.hedge_delay("a") == 0.8
@@ -0,0 +1,121 @@
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from ranger.places import (
+    PlaceIndex, canonical_place, get_place_index, maps_location, place_key, reset_place_index,
+)
+
+NORTHPORT = {"place_id": "ChIJnorthport", "address": "Northport, MI 49670, USA", "lat": 45.13, "lng": -85.62}
+
+
+class FakeGeocoder:
+    def __init__(self, places):
+        self.places = places
+        self.calls = []
+
+    def __call__(self, text):
+        self.calls.append(text)
+        return self.places.get(place_key(text))
+
+
+@pytest.fixture
+def geocoder():
+    return FakeGeocoder({"northport michigan": NORTHPORT})
+
+
+def test_place_key():
+    assert place_key("Northport, MI") == "northport michigan"
+    assert place_key("  northport   Michigan ") == "northport michigan"
+    assert place_key("Northport, MI 49670, USA") == "northport michigan"
+    assert place_key("Mount Washington") == "mount washington"
+    assert place_key("Paris, France") == "paris france"
+    # A trailing two-letter word is only a state after a comma
+    assert place_key("Port of LA") == "port of la"
+    assert place_key("Ann Arbor MI") == "ann arbor mi"
+
+
+def test_spellings_resolve_to_one_place_with_one_geocode(geocoder):
+    index = PlaceIndex(geocode=geocoder)
+    for spelling in ("Northport, MI", "northport michigan", "Nortport, MI"):
+        assert index.resolve(spelling)["place_id"] == "ChIJnorthport"
+    assert geocoder.calls == ["Northport, MI"]
+    assert index.stats()["hits"] == 2
+    # A typo is matched but not learned as an alias
+    assert index.stats()["aliases"] == 1
+
+
+@pytest.mark.parametrize("known, bare", [
+    ({"place_id": "ChIJparistx", "address": "Paris, TX, USA"}, "Paris"),
+    ({"place_id": "ChIJportlandor", "address": "Portland, OR, USA"}, "Portland"),
+    (NORTHPORT, "Northport"),
+])
+def test_bare_names_are_not_matched_to_the_one_known_place(tmp_path, known, bare):
+    path = str(tmp_path / "places.sqlite3")
+    geocoder = FakeGeocoder({})
+    index = PlaceIndex(path, geocode=geocoder)
+    index.add(known, aliases=[known["address"]])
+    assert index.lookup(bare) is None
+    assert index.resolve(bare) is None
+    assert geocoder.calls == [bare]
+    # Nothing wrong was remembered for later runs
+    assert PlaceIndex(path).lookup(bare) is None
+
+
+def test_ambiguous_or_numbered_names_are_not_fuzzy_matched():
+    index = PlaceIndex()
+    index.add({"place_id": "a", "address": "Springfield, IL"}, aliases=["Springfield, IL"])
+    index.add({"place_id": "b", "address": "Springfield, MO"}, aliases=["Springfield, MO"])
+    index.add({"place_id": "c", "address": "5th Avenue"}, aliases=["5th Avenue"])
+    assert index.lookup("Springfield") is None
+    assert index.lookup("6th Avenue") is None
+    assert index.lookup("York") is None
+
+
+def test_unresolvable_places_fall_back(geocoder):
+    index = PlaceIndex(geocode=geocoder)
+    assert index.resolve("Atlantis") is None
+    assert PlaceIndex(geocode=lambda text: 1 / 0).resolve("Atlantis") is None
+
+
+def test_failed_geocodes_are_remembered_briefly(geocoder):
+    index = PlaceIndex(geocode=geocoder, failure_ttl=60)
+    for spelling in ("Atlantis", "atlantis", "Atlantis, USA"):
+        assert index.resolve(spelling) is None
+    assert geocoder.calls == ["Atlantis"]
+    with patch("ranger.places.time.monotonic", return_value=time.monotonic() + 61):
+        assert index.resolve("Atlantis") is None
+    assert geocoder.calls == ["Atlantis", "Atlantis"]
+    # A geocoder error is remembered the same way
+    calls = []
+    index = PlaceIndex(geocode=lambda text: calls.append(text) or 1 / 0)
+    assert index.resolve("Atlantis") is None and index.resolve("Atlantis") is None
+    assert calls == ["Atlantis"]
+
+
+def test_index_persists(tmp_path, geocoder):
+    path = tmp_path / "places.sqlite3"
+    PlaceIndex(str(path), geocode=geocoder).resolve("Northport, MI")
+    reopened = PlaceIndex(str(path), geocode=geocoder)
+    assert reopened.resolve("northport michigan") == NORTHPORT
+    assert len(geocoder.calls) == 1
+
+
+def test_process_wide_index(tmp_path, geocoder):
+    with patch.dict(os.environ, {"RANGER_PLACES_PATH": str(tmp_path / "places.sqlite3"), "GMAPS_API_KEY": ""}):
+        reset_place_index()
+        try:
+            get_place_index().add(NORTHPORT, aliases=["Northport, MI"])
+            assert canonical_place("Northport, Michigan") == "ChIJnorthport"
+            assert canonical_place("Atlantis") == "atlantis"
+        finally:
+            reset_place_index()
+    with patch.dict(os.environ, {"RANGER_PLACES": "0"}):
+        assert get_place_index() is None
+
+
+def test_maps_location():
+    assert maps_location(NORTHPORT, "Northport") == "place_id:ChIJnorthport"
+    assert maps_location(None, "Northport") == "Northport"
@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+
+from ranger.ratelimit import (
+    RateLimiter, TokenBucket, get_limiter, limiter_for_url, parse_retry_after, reset_limiters,
+)
+from ranger.transport import Transport
+
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    """Answers 429 with retry-after 0 to the first `server.throttle` requests, then 200."""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.hits += 1
+        throttled = self.server.hits <= self.server.throttle
+        body = b"slow down" if throttled else b"ok"
+        self.send_response(429 if throttled else 200)
+        if throttled:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def throttling_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottlingHandler)
+    server.hits = 0
+    server.throttle = 2
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiters():
+    reset_limiters()
+    yield
+    reset_limiters()
+
+
+def test_token_bucket_waits_for_refill():
+    """Within capacity a reservation is free; beyond it the wait covers the deficit."""
+    bucket = TokenBucket(rate=10.0, capacity=2)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+
+
+def test_limiter_paces_requests():
+    """A 20 requests/second limiter spaces 5 requests beyond its burst about 50ms apart."""
+    limiter = RateLimiter("test", requests_per_second=20)
+    start = time.perf_counter()
+    for _ in range(25):
+        limiter.acquire()
+    assert time.perf_counter() - start >= 0.2
+
+
+def test_token_budget_and_reconciliation():
+    """Token reservations wait on the per-minute budget; unused estimates are returned."""
+    limiter = RateLimiter("test", requests_per_second=0, tokens_per_minute=600)
+    assert limiter.reserve(tokens=600, requests=0) == 0.0
+    assert limiter.reserve(tokens=10, requests=0) == pytest.approx(1.0, abs=0.05)
+    limiter.record_tokens(actual=100, estimated=600)
+    assert limiter.reserve(tokens=10, requests=0) == 0.0
+
+
+def test_429_honors_retry_after_and_adapts_rate():
+    """A 429 pauses every caller for retry-after and halves the rate; successes restore it."""
+    limiter = RateLimiter("test", requests_per_second=10)
+    assert limiter.record_response(429, "2") == 2.0
+    assert limiter.rate == 5.0
+    assert limiter.throttled == 1
+    assert limiter.reserve() == pytest.approx(2.0, abs=0.05)
+    for _ in range(20):
+        limiter.record_response(200)
+    assert limiter.rate == 10.0
+
+
+def test_429_without_retry_after_backs_off_exponentially():
+    limiter = RateLimiter("test", requests_per_second=10)
+    assert 0.5 <= limiter.record_response(429, None, attempt=0) <= 1.0
+    assert 2.0 <= limiter.record_response(429, None, attempt=2) <= 4.0
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    in_a_minute = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 60))
+    assert 55 <= parse_retry_after(in_a_minute) <= 60
+
+
+def test_limits_from_env():
+    with patch.dict(os.environ, {"RANGER_RATE_MAPS_RPS": "5", "RANGER_RATE_MAPS_TPM": "1000",
+                                 "RANGER_RATE_MAX_RETRIES": "1"}):
+        limiter = get_limiter("maps")
+    assert get_limiter("maps") is limiter
+    assert limiter.max_rate == 5.0
+    assert limiter.max_retries == 1
+    assert limiter._tokens is not None
+
+
+def test_limiter_for_url():
+    assert limiter_for_url("https://api.anthropic.com/v1/messages").name == "anthropic"
+    assert limiter_for_url("https://maps.googleapis.com/maps/api/directions/json").name == "maps"
+    assert limiter_for_url("https://example.com/") is None
+    with patch.dict(os.environ, {"OPENAI_BASE_URL": "http://127.0.0.1:9999/v1"}):
+        assert limiter_for_url("http://127.0.0.1:9999/v1/chat/completions").name == "openai"
+
+
+def test_transport_retries_429(throttling_server):
+    """The transport retries throttled requests to a provider and counts every attempt."""
+    url = f"http://127.0.0.1:{throttling_server.server_address[1]}"
+    with patch.dict(os.environ, {"GMAPS_BASE_URL": url}):
+        transport = Transport(http2=False)
+        response = transport.get(f"{url}/maps/api/directions/json")
+        transport.close()
+    assert response.status_code == 200
+    assert throttling_server.hits == 3
+    assert transport.stats()["requests"] == 3
+    assert get_limiter("maps").throttled == 2
+
+
+def test_transport_gives_up_after_max_retries(throttling_server):
+    throttling_server.throttle = 10
+    url = f"http://127.0.0.1:{throttling_server.server_address[1]}"
+    with patch.dict(os.environ, {"GMAPS_BASE_URL": url, "RANGER_RATE_MAX_RETRIES": "1"}):
+        transport = Transport(http2=False)
+        response = transport.get(f"{url}/maps/api/directions/json")
+        transport.close()
+    assert response.status_code == 429
+    assert throttling_server.hits == 2
@@ -0,0 +1,117 @@
+import os
+import json
+import time
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+from ranger import replay
+from ranger.replay import ReplayMiss, ReplayedError, recorded
+
+
+@pytest.fixture(autouse=True)
+def no_session():
+    # Replaying sets placeholder API keys
+    with patch.dict(os.environ):
+        yield
+        replay.configure()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "exchanges.jsonl")
+
+
+class Lookup:
+    """A tool stand-in that counts its calls and fails for unknown places"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, place: str, mode: str = "driving") -> str:
+        self.calls += 1
+        time.sleep(0.05)
+        if place == "Atlantis":
+            raise ValueError("unknown place")
+        return f"{place} by {mode}: 20 mins"
+
+
+def test_record_then_replay_without_calling(path):
+    lookup = Lookup()
+    tool = recorded("tool", "lookup")(lookup)
+    replay.configure(record=path)
+    assert tool("Leland") == "Leland by driving: 20 mins"
+    with pytest.raises(ValueError):
+        tool("Atlantis")
+    assert replay.stats()["recorded"] == 2
+
+    replay.configure(replay=path, speed="fast")
+    assert tool("Leland", mode="driving") == "Leland by driving: 20 mins"
+    with pytest.raises(ReplayedError, match="ValueError: unknown place"):
+        tool("Atlantis")
+    with pytest.raises(ReplayMiss):
+        tool("Omena")
+    assert lookup.calls == 2
+    assert replay.stats() == {"mode": "replay", "path": path, "speed": "fast", "served": 2, "missed": 1}
+
+
+def test_recording_is_compact_and_timed(path):
+    replay.configure(record=path)
+    recorded("tool", "lookup")(Lookup())("Leland")
+    replay.configure()
+    with open(path) as f:
+        line = f.readline()
+    entry = json.loads(line)
+    assert ", " not in line
+    assert entry["kind"] == "tool" and entry["name"] == "lookup"
+    assert entry["seconds"] >= 0.05
+    assert entry["result"] == "Leland by driving: 20 mins"
+
+
+def test_replay_at_original_speed(path):
+    tool = recorded("tool", "lookup")(Lookup())
+    replay.configure(record=path)
+    tool("Leland")
+    replay.configure(replay=path, speed="original")
+    start = time.perf_counter()
+    tool("Leland")
+    assert time.perf_counter() - start >= 0.05
+    replay.configure(replay=path, speed="fast")
+    start = time.perf_counter()
+    tool("Leland")
+    assert time.perf_counter() - start < 0.05
+
+
+def test_repeated_calls_replay_in_order(path):
+    replies = iter(["first", "second"])
+    tool = recorded("tool", "next")(lambda: next(replies))
+    replay.configure(record=path)
+    tool(), tool()
+    replay.configure(replay=path, speed="fast")
+    assert [tool(), tool(), tool()] == ["first", "second", "second"]
+
+
+def test_claude_exchanges_replay_offline(path):
+    from ranger.models.claude import ClaudeServerModel
+    response = MagicMock(status_code=200)
+    response.json.return_value = {"content": [{"type": "text", "text": "Sunny"}]}
+    with patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test_claude_key"}):
+        model = ClaudeServerModel()
+    replay.configure(record=path)
+    with patch("ranger.models.claude.get_transport") as mock_transport:
+        mock_transport.return_value.post.return_value = response
+        assert model.generate("Weather in Paris?") == "Sunny"
+
+    replay.configure(replay=path, speed="fast")
+    with patch("ranger.models.claude.get_transport") as mock_transport:
+        assert model.generate("Weather in Paris?") == "Sunny"
+        with pytest.raises(ReplayMiss):
+            model.generate("Weather in Rome?")
+    mock_transport.return_value.post.assert_not_called()
+
+
+def test_record_and_replay_are_exclusive(path):
+    with pytest.raises(ValueError):
+        replay.configure(record=path, replay=path)
+    with pytest.raises(ValueError):
+        replay.configure(replay=path, speed="slow-motion")
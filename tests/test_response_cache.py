@@ -0,0 +1,81 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+from ranger.cache import SQLiteBackend
+from ranger.response_cache import ResponseCache, normalize_query
+
+RESULT = ("Sunny, 72F", "Thought: Using tool: get_weather", ["get_weather"])
+
+
+def test_normalize_query():
+    assert normalize_query("  Weather in   Northport, MI? ") == "weather in northport, mi"
+
+
+def test_hit_after_set():
+    cache = ResponseCache()
+    assert cache.get("Weather in Paris?", "gpt-4") is None
+    cache.set("Weather in Paris?", "gpt-4", RESULT)
+    assert cache.get("weather in paris", "gpt-4") == RESULT
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_namespace_separates_entries():
+    """A different model or tool version does not reuse the response"""
+    cache = ResponseCache()
+    cache.set("Weather in Paris?", "gpt-4|prompt@1", RESULT)
+    assert cache.get("Weather in Paris?", "gpt-4|prompt@2") is None
+
+
+def test_ttl_follows_most_volatile_tool():
+    cache = ResponseCache(ttl=100, tool_ttls={"get_weather": 10, "get_travel_duration": 50})
+    assert cache.ttl_for(["get_travel_duration", "get_weather"]) == 10
+    # Tools unknown: as short-lived as the most volatile one
+    assert cache.ttl_for([]) == 10
+    assert ResponseCache(ttl=100, tool_ttls={}).ttl_for([]) == 100
+    cache.set("Weather in Paris?", "ns", RESULT)
+    with patch("time.time", return_value=time.time() + 11):
+        assert cache.get("Weather in Paris?", "ns") is None
+
+
+def test_empty_response_not_cached():
+    cache = ResponseCache()
+    cache.set("Weather?", "ns", ("", "", []))
+    assert cache.get("Weather?", "ns") is None
+
+
+def test_near_duplicate_matching():
+    cache = ResponseCache(similarity=0.8)
+    cache.set("what is the weather in northport mi today", "ns", RESULT)
+    assert cache.get("what is the weather in northport mi today please", "ns") == RESULT
+    assert cache.get("what is the weather in leland mi today", "ns") is None
+    assert cache.stats()["near_hits"] == 1
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("Weather in Northport, MI", "Weather in Leland, MI"),
+    ("How long from Northport, MI to Traverse City, MI by car", "How long from Northport, MI to Traverse City, MI by bike"),
+    ("Weather at 123 Main St, Springfield, IL", "Weather at 125 Main St, Springfield, IL"),
+    ("What's the weather in Northport today", "What's the weather in Northport tomorrow"),
+])
+def test_near_duplicates_must_ask_the_same_question(cached, asked):
+    """Same-template queries about different places, numbers or times are never matched, however similar"""
+    cache = ResponseCache(similarity=0.5)
+    cache.set(cached, "ns", RESULT)
+    assert cache.get(asked, "ns") is None
+    assert cache.get(f"Hey, {cached.lower()}, please?", "ns") == RESULT
+
+
+def test_sqlite_backend_persists_entries_and_counters(tmp_path):
+    path = tmp_path / "responses.db"
+    cache = ResponseCache(backend=SQLiteBackend(path))
+    cache.set("Weather in Paris?", "ns", RESULT)
+    cache.get("Weather in Paris?", "ns")
+    cache.backend.close()
+
+    reopened = ResponseCache(backend=SQLiteBackend(path))
+    assert reopened.get("Weather in Paris?", "ns") == RESULT
+    assert reopened.stats()["hits"] == 2
+    reopened.backend.close()
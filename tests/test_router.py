@@ -1,6 +1,15 @@
 import pytest
 from unittest.mock import MagicMock, patch
 import importlib
+import asyncio
+from ranger.response_cache import reset_response_cache
+
+@pytest.fixture(autouse=True)
+def fresh_response_cache():
+    """Responses are cached per process; start each test with an empty cache."""
+    reset_response_cache()
+    yield
+    reset_response_cache()
 
 class MockExecutionHistory:
     def __init__(self, tools_used):
@@ -21,7 +30,7 @@ def create_router(response, tools_used=None):
     with patch('smolagents.CodeAgent', return_value=MockAgent(response, tools_used)):
         import ranger.router
         importlib.reload(ranger.router)
-        return ranger.router.Router(debug=True)
+        return ranger.router.Router(debug=True, fast_path=False)
 
 def test_route_weather():
     mock_weather_tool = MagicMock()
@@ -65,4 +74,209 @@ def test_route_both_tools():
     assert "Travel time is Y" in response
     assert "get_weather" in tools_used
     assert "get_travel_duration" in tools_used
-    assert len(tools_used) == 2 
\ No newline at end of file
+    assert len(tools_used) == 2 
+
+class ChatMessageStreamDelta:
+    def __init__(self, content):
+        self.content = content
+
+class ToolCall:
+    def __init__(self, arguments, name="python_interpreter"):
+        self.name = name
+        self.arguments = arguments
+
+class ActionStep:
+    def __init__(self, step_number, model_output, code, error=None):
+        self.step_number = step_number
+        self.model_output = model_output
+        self.tool_calls = [ToolCall(code)]
+        self.duration = 0.5
+        self.error = error
+
+class FinalAnswerStep:
+    def __init__(self, final_answer):
+        self.final_answer = final_answer
+
+class MockStreamingAgent(MockAgent):
+    def __init__(self, events):
+        super().__init__("")
+        self.events = events
+        self.model = MagicMock()
+        self.tools = {"get_weather": None, "get_travel_duration": None, "final_answer": None}
+        self.logger = MagicMock()
+        self.stream_outputs = False
+
+    def run(self, prompt, stream=False):
+        assert stream
+        return iter(self.events)
+
+def test_route_stream_events():
+    agent = MockStreamingAgent([
+        ChatMessageStreamDelta("Thought: Using tool: "),
+        ChatMessageStreamDelta("get_weather"),
+        ActionStep(1, "Thought: Using tool: get_weather\nCode:", 'print(get_weather("Paris"))'),
+        None,
+        ActionStep(2, "Thought: Done", 'final_answer("Weather in Paris: 70F, sunny.")'),
+        FinalAnswerStep("Weather in Paris: 70F, sunny."),
+    ])
+    with patch('smolagents.CodeAgent', return_value=agent):
+        import ranger.router
+        importlib.reload(ranger.router)
+        router = ranger.router.Router(debug=True, fast_path=False)
+        events = list(router.route_stream("What's the weather in Paris?"))
+
+    kinds = [kind for kind, _ in events]
+    assert kinds == ["delta", "delta", "thought", "step", "thought", "step", "answer", "done"]
+    assert events[3] == ("step", "Step 1 (0.5s): get_weather")
+    assert events[6] == ("answer", "Weather in Paris: 70F, sunny.")
+    response, thoughts, tools_used = events[-1][1]
+    assert response == "Weather in Paris: 70F, sunny."
+    assert tools_used == ["get_weather"]
+    assert agent.stream_outputs is False
+
+def test_route_stream_matches_route():
+    """The final streamed result parses the answer the same way route does"""
+    answer = "Thought: Using tool: get_weather\nWeather in X."
+    with patch('smolagents.CodeAgent', return_value=MockStreamingAgent([FinalAnswerStep(answer)])):
+        import ranger.router
+        importlib.reload(ranger.router)
+        router = ranger.router.Router(debug=True, fast_path=False)
+        streamed = list(router.route_stream("Weather in X?"))[-1][1]
+    assert streamed == create_router(answer).route("Weather in X?")
+
+class SlowAgent(MockAgent):
+    def run(self, prompt):
+        import time
+        time.sleep(0.2)
+        print("agent output")
+        return self.response
+
+def test_aroute_runs_queries_concurrently():
+    """Awaiting several aroute calls together overlaps the agent runs"""
+    import sys
+    from ranger.bench import compare_route_throughput
+    with patch('smolagents.CodeAgent', side_effect=lambda **kwargs: SlowAgent("Thought: Using tool: get_weather\nSunny.")):
+        import ranger.router
+        importlib.reload(ranger.router)
+        router = ranger.router.Router(max_concurrency=4, fast_path=False)
+        stdout = sys.stdout
+        result = compare_route_throughput(router, ["Weather?"] * 4)
+        assert sys.stdout is stdout
+        response, thoughts, tools_used = asyncio.run(router.aroute("Weather?"))
+        router.close()
+    assert result["async_seconds"] < result["sync_seconds"] / 2
+    assert response == "Sunny."
+    assert tools_used == ["get_weather"]
+
+def test_route_uses_response_cache():
+    """A repeated query is answered from the cache without running the agent"""
+    agent = MockAgent("Thought: Using tool: get_weather\nSunny.")
+    agent.run = MagicMock(wraps=agent.run)
+    with patch('smolagents.CodeAgent', return_value=agent):
+        import ranger.router
+        importlib.reload(ranger.router)
+        router = ranger.router.Router(debug=True, fast_path=False)
+        first = router.route("Weather in Northport, MI?")
+        second = router.route("  weather in northport, mi ")
+        streamed = list(router.route_stream("Weather in Northport, MI"))[-1][1]
+    assert first == second == streamed
+    assert agent.run.call_count == 1
+    assert router.response_cache.stats()["hits"] == 2
+
+def test_route_with_memory_carries_context():
+    """With conversation memory, follow-ups see earlier turns and skip the response cache"""
+    from ranger.memory import ConversationMemory
+    agent = MockAgent("Thought: Using tool: get_weather\nSunny in Paris.")
+    agent.run = MagicMock(wraps=agent.run)
+    with patch('smolagents.CodeAgent', return_value=agent):
+        import ranger.router
+        importlib.reload(ranger.router)
+        router = ranger.router.Router(debug=True, fast_path=False, memory=ConversationMemory(max_tokens=500))
+        router.route("Weather in Paris?")
+        router.route("Weather in Paris?")
+    first_prompt, second_prompt = (call.args[0] for call in agent.run.call_args_list)
+    assert first_prompt == "Query: Weather in Paris?"
+    assert "User: Weather in Paris?\nRanger: Sunny in Paris." in second_prompt
+    assert second_prompt.endswith("Query: Weather in Paris?")
+    assert len(router.memory.turns) == 2
+
+def test_aroute_with_memory_carries_context():
+    """aroute reads and extends conversation memory like route"""
+    from ranger.memory import ConversationMemory
+    agent = MockAgent("Thought: Using tool: get_weather\nSunny in Omena.")
+    agent.run = MagicMock(wraps=agent.run)
+    with patch('smolagents.CodeAgent', return_value=agent):
+        import ranger.router
+        importlib.reload(ranger.router)
+        router = ranger.router.Router(debug=True, fast_path=False, memory=ConversationMemory(max_tokens=500))
+        asyncio.run(router.aroute("Weather in Omena?"))
+        asyncio.run(router.aroute("And tomorrow?"))
+        router.close()
+    second_prompt = agent.run.call_args_list[1].args[0]
+    assert "User: Weather in Omena?\nRanger: Sunny in Omena." in second_prompt
+    assert second_prompt.endswith("Query: And tomorrow?")
+    assert len(router.memory.turns) == 2
+
+def test_tool_calling_agent_type():
+    """agent_type="tool_calling" builds the parallel tool-calling agent and caches apart from the code agent"""
+    agent = MockAgent("Sunny.")
+    with patch('smolagents.CodeAgent', return_value=MockAgent("Sunny.")):
+        import ranger.router
+        importlib.reload(ranger.router)
+        with patch('ranger.router.ParallelToolCallingAgent', return_value=agent) as tool_calling_agent:
+            router = ranger.router.Router(debug=True, agent_type="tool_calling", fast_path=False)
+            assert router.route("Weather in Leland?")[0] == "Sunny."
+        tool_calling_agent.assert_called_once()
+        assert router.cache_namespace != ranger.router.Router(debug=True).cache_namespace
+        with pytest.raises(ValueError):
+            ranger.router.Router(agent_type="react")
+
+def test_fast_path_skips_the_agent_for_single_tool_queries():
+    """Clear weather and travel queries call their tool directly; everything else runs the agent"""
+    from ranger.intents import get_fast_path_stats, reset_fast_path_stats
+    reset_fast_path_stats()
+    agent = MockAgent("Thought: Using tool: get_weather\nSunny in Leland, 20 mins from Omena.")
+    agent.run = MagicMock(wraps=agent.run)
+    weather, travel = MagicMock(return_value="Sunny, 72F"), MagicMock(side_effect=["25 mins", "Invalid place"])
+    with patch('smolagents.CodeAgent', return_value=agent):
+        import ranger.router
+        importlib.reload(ranger.router)
+        with patch.dict(ranger.router.FAST_PATH_TOOLS, get_weather=weather, get_travel_duration=travel):
+            router = ranger.router.Router(debug=True, fast_path=True)
+            assert router.route("Weather in Northport, MI") == (
+                "Weather in Northport, MI:\nSunny, 72F", "Thought: Using tool: get_weather", ["get_weather"]
+            )
+            events = list(router.route_stream("How long to drive from Traverse City to Leland?"))
+            # An error from the tool falls back to the agent
+            router.route("How long to drive from Leland to Atlantis?")
+            router.route("Weather in Leland and the drive from Omena?")
+    weather.assert_called_once_with(location="Northport, MI")
+    travel.assert_any_call(start_location="Traverse City", destination_location="Leland", transportation_mode="driving")
+    assert events[0] == ("step", "Fast path: get_travel_duration")
+    assert events[-1][1][0] == "Travel time from Traverse City to Leland by driving: 25 mins"
+    assert agent.run.call_count == 2
+    report = get_fast_path_stats().report()
+    assert (report["hits"], report["fallbacks"], report["misses"]) == (2, 1, 1)
+    assert report["saved_seconds"] is not None
+    reset_fast_path_stats()
+
+def test_tools_used_come_from_agent_steps():
+    """Tools the agent called count even when its answer never says "Using tool:", and set the cache TTL"""
+    from types import SimpleNamespace
+    agent = MockAgent("Sunny and 72F in Northport.")
+    agent.tools = {"get_weather": None, "get_travel_duration": None, "final_answer": None}
+    agent.memory = SimpleNamespace(steps=[
+        ActionStep(1, "Thought: checking", 'report = get_weather("Northport, MI")\nprint(report)'),
+        ActionStep(2, "Thought: done", 'final_answer("Sunny and 72F in Northport.")'),
+    ])
+    with patch('smolagents.CodeAgent', return_value=agent):
+        import ranger.router
+        importlib.reload(ranger.router)
+        router = ranger.router.Router(debug=True, fast_path=False)
+        with patch.object(router.response_cache._cache, "set", wraps=router.response_cache._cache.set) as cache_set:
+            response, _, tools_used = router.route("Weather in Northport, MI")
+            assert asyncio.run(router.aroute("Is it sunny in Northport?"))[2] == ["get_weather"]
+        router.close()
+    assert response == "Sunny and 72F in Northport."
+    assert tools_used == ["get_weather"]
+    assert cache_set.call_args.kwargs["ttl"] == 60 * 60
@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+from ranger.server import RangerServer
+
+
+class FakeRouter:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.agent_built = False
+        self.closed = False
+
+    @property
+    def agent(self):
+        self.agent_built = True
+        return object()
+
+    def route(self, query):
+        time.sleep(self.delay)
+        if query == "fail":
+            raise RuntimeError("boom")
+        return f"answer to {query}", "Thought: ok", ["get_weather"]
+
+    def route_stream(self, query):
+        yield "step", "Step 1: get_weather"
+        yield "answer", f"answer to {query}"
+        yield "done", (f"answer to {query}", "Thought: ok", ["get_weather"])
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def routers():
+    return []
+
+
+@pytest.fixture
+def server(routers):
+    def factory():
+        routers.append(FakeRouter())
+        return routers[-1]
+
+    with RangerServer(factory, port=0, workers=2, queue_size=1, queue_timeout=5) as running:
+        yield running
+
+
+def test_routers_are_built_warm(server, routers):
+    assert len(routers) == 2
+    assert all(router.agent_built for router in routers)
+
+
+def test_route(server):
+    response = requests.post(f"{server.url}/route", json={"query": "Weather in Paris?"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["response"] == "answer to Weather in Paris?"
+    assert body["tools_used"] == ["get_weather"]
+
+
+def test_route_errors(server):
+    assert requests.post(f"{server.url}/route", json={}).status_code == 400
+    assert requests.post(f"{server.url}/route", data="not json").status_code == 400
+    failed = requests.post(f"{server.url}/route", json={"query": "fail"})
+    assert failed.status_code == 500
+    assert "boom" in failed.json()["error"]
+    assert requests.get(f"{server.url}/nowhere").status_code == 404
+
+
+def test_unread_or_invalid_bodies_close_the_connection(server):
+    import http.client
+    from urllib.parse import urlparse
+    address = urlparse(server.url)
+    for body, length in ((b'{"query": "', 10 ** 6), (b"not json", 8)):
+        connection = http.client.HTTPConnection(address.hostname, address.port, timeout=5)
+        connection.request("POST", "/route", body=body, headers={"Content-Length": str(length)})
+        response = connection.getresponse()
+        assert response.status == 400
+        assert response.getheader("Connection") == "close"
+        response.read()
+        connection.close()
+    # A chunked body has no Content-Length to read it by
+    connection = http.client.HTTPConnection(address.hostname, address.port, timeout=5)
+    connection.putrequest("POST", "/route")
+    connection.putheader("Transfer-Encoding", "chunked")
+    connection.endheaders(b'1e\r\n{"query": "Weather in Paris?"}\r\n0\r\n\r\n')
+    response = connection.getresponse()
+    assert response.status == 411
+    assert response.getheader("Connection") == "close"
+    response.read()
+    connection.close()
+    # A query that is merely missing keeps the connection open
+    with requests.Session() as session:
+        response = session.post(f"{server.url}/route", json={})
+        assert response.status_code == 400 and "Connection" not in response.headers
+
+
+def test_route_stream(server):
+    with requests.post(f"{server.url}/route/stream", json={"query": "Weather in Rome?"}, stream=True) as response:
+        events = [json.loads(line) for line in response.iter_lines() if line]
+    assert [event["event"] for event in events] == ["step", "answer", "done"]
+    assert events[-1]["data"]["response"] == "answer to Weather in Rome?"
+
+
+def test_health_and_metrics(server):
+    requests.post(f"{server.url}/route", json={"query": "Weather in Oslo?"})
+    health = requests.get(f"{server.url}/healthz").json()
+    assert health["status"] == "ok"
+    assert health["workers"] == 2
+    assert health["max_in_flight"] == 3
+    metrics = requests.get(f"{server.url}/metrics").json()
+    assert metrics["requests"] == 1
+    assert "rate_limits" in metrics and "transport" in metrics
+    assert "hit_rate" in metrics["fast_path"]
+
+
+def test_rejects_beyond_limits():
+    """Queries beyond workers + queue get 503 instead of piling up."""
+    server = RangerServer(lambda: FakeRouter(delay=0.5), port=0, workers=1, queue_size=0).start()
+    try:
+        results = []
+
+        def post():
+            results.append(requests.post(f"{server.url}/route", json={"query": "q"}).status_code)
+
+        threads = [threading.Thread(target=post) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(results) == [200, 503, 503]
+        assert server.stats.rejected == 2
+    finally:
+        server.shutdown(grace=0)
+
+
+def test_graceful_shutdown_waits_for_running_queries():
+    server = RangerServer(lambda: FakeRouter(delay=0.3), port=0, workers=1, queue_size=0).start()
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(
+        response=requests.post(f"{server.url}/route", json={"query": "slow"})))
+    thread.start()
+    time.sleep(0.1)
+    assert server.shutdown(grace=5) is True
+    thread.join()
+    assert result["response"].status_code == 200
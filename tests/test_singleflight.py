@@ -0,0 +1,113 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+from ranger.singleflight import SingleFlight, flight_report, get_flight, reset_flights
+
+
+@pytest.fixture(autouse=True)
+def fresh_flights():
+    reset_flights()
+    yield
+    reset_flights()
+
+
+class SlowCall:
+    """Counts calls and holds each one until released"""
+
+    def __init__(self, result="sunny"):
+        self.result = result
+        self.calls = 0
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.release.wait(5)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def run_together(flight, key, call, callers=4):
+    """Start `callers` threads on the same key, release the call once all have joined"""
+    with ThreadPoolExecutor(callers) as pool:
+        futures = [pool.submit(flight.do, key, call) for _ in range(callers)]
+        deadline = time.monotonic() + 5
+        while flight.stats()["calls"] < callers and time.monotonic() < deadline:
+            time.sleep(0.01)
+        call.release.set()
+        return [future.exception() or future.result() for future in futures]
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight("test")
+    call = SlowCall()
+    assert run_together(flight, "key", call) == ["sunny"] * 4
+    assert call.calls == 1
+    assert flight.stats() == {"calls": 4, "upstream": 1, "coalesced": 3, "in_flight": 0}
+
+
+def test_errors_are_shared_and_not_kept():
+    flight = SingleFlight("test")
+    call = SlowCall(RuntimeError("upstream down"))
+    results = run_together(flight, "key", call)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert call.calls == 1
+    call.result = "sunny"
+    assert flight.do("key", call) == "sunny"
+    assert call.calls == 2
+
+
+def test_different_keys_are_not_coalesced():
+    flight = SingleFlight("test")
+    assert [flight.do(key, lambda key=key: key) for key in ("a", "b")] == ["a", "b"]
+    assert flight.stats()["coalesced"] == 0
+
+
+def test_can_be_turned_off():
+    flight = SingleFlight("test")
+    call = SlowCall()
+    call.release.set()
+    with patch.dict(os.environ, {"RANGER_SINGLE_FLIGHT": "0"}):
+        flight.do("key", call)
+    assert flight.stats()["calls"] == 0
+
+
+def claude_calls(temperature):
+    """Three identical Claude prompts and one other, all in flight at once"""
+    from ranger.models.claude import ClaudeServerModel
+    with patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test_claude_key"}):
+        models = [ClaudeServerModel(temperature=temperature) for _ in range(4)]
+    response = MagicMock(status_code=200)
+    response.json.return_value = {"content": [{"type": "text", "text": "Sunny"}],
+                                  "usage": {"input_tokens": 12, "output_tokens": 3}}
+    call = SlowCall(response)
+    with patch("ranger.models.claude.get_transport") as mock_transport:
+        mock_transport.return_value.post.side_effect = lambda *args, **kwargs: call()
+        with ThreadPoolExecutor(4) as pool:
+            futures = [pool.submit(model.generate, "Weather in Paris?") for model in models[:3]]
+            other = pool.submit(models[3].generate, "Weather in Rome?")
+            while mock_transport.return_value.post.call_count + get_flight("anthropic").stats()["coalesced"] < 4:
+                time.sleep(0.01)
+            call.release.set()
+            results = [future.result() for future in futures] + [other.result()]
+    assert results == ["Sunny"] * 4
+    return call, models
+
+
+def test_identical_deterministic_claude_prompts_share_one_request():
+    call, models = claude_calls(temperature=0)
+    assert call.calls == 2
+    assert flight_report()["anthropic"]["coalesced"] == 2
+    # Followers report the shared call's usage as their own
+    assert [(model.last_input_token_count, model.last_output_token_count) for model in models] == [(12, 3)] * 4
+
+
+def test_sampled_claude_prompts_are_not_coalesced():
+    call, _ = claude_calls(temperature=None)
+    assert call.calls == 4
+    assert get_flight("anthropic").stats()["calls"] == 0
@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+
+# Cold-start budget in seconds for importing ranger and building the CLI
+STARTUP_BUDGET = float(os.getenv("RANGER_STARTUP_BUDGET", "1.5"))
+
+HEAVY_MODULES = ["smolagents", "googlemaps", "rich.live", "openai"]
+
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import ranger
+imported = time.perf_counter() - started
+from ranger.cli import CLI
+CLI.LOG_DIR = %r
+cli = CLI()
+cli._get_system_status()
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    "import": imported,
+    "startup": elapsed,
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+"""
+
+
+@pytest.fixture
+def startup_result(tmp_path):
+    """Import ranger and render `ranger status` in a fresh interpreter without API keys."""
+    env = {k: v for k, v in os.environ.items()
+           if k not in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GMAPS_API_KEY")}
+    env["PYTHONPATH"] = str(project_root)
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT % (str(tmp_path / "logs"), HEAVY_MODULES)],
+        cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_startup_skips_heavy_imports(startup_result):
+    """Importing ranger and showing status does not load the agent stack."""
+    assert startup_result["loaded"] == []
+
+
+def test_startup_within_budget(startup_result):
+    """Cold start stays within the budget (override with RANGER_STARTUP_BUDGET)."""
+    assert startup_result["startup"] < STARTUP_BUDGET, startup_result
@@ -0,0 +1,122 @@
+import pytest
+from unittest.mock import patch, MagicMock
+import importlib
+import itertools
+import sys
+
+# Mock smolagents before importing the itinerary tool
+smolagents_mock = MagicMock()
+smolagents_mock.tool = lambda f: f
+sys.modules['smolagents'] = smolagents_mock
+
+# Five places on a line, 10 minutes apart; index 0 is the start
+LINE = ["Home", "A", "B", "C", "D"]
+
+
+def line_legs(places):
+    return {
+        (origin, destination): {"duration_s": 600 * abs(LINE.index(origin) - LINE.index(destination)), "distance_m": 0}
+        for origin in places for destination in places
+    }
+
+
+def line_durations(order, return_to_start=True):
+    """Duration matrix for `order` (start first) with the end-of-day row and column the solver expects"""
+    size = len(order)
+    durations = [[0.0] * (size + 1) for _ in range(size + 1)]
+    for a, b in itertools.product(range(size), repeat=2):
+        durations[a][b] = 600.0 * abs(LINE.index(order[a]) - LINE.index(order[b]))
+    for a in range(size):
+        durations[a][size] = durations[a][0] if return_to_start else 0.0
+    return durations
+
+
+@pytest.fixture(params=["numpy", "python"])
+def itinerary(request, monkeypatch):
+    """The itinerary module, once with NumPy (the `fast` extra) and once with the plain Python fallback"""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    import ranger.tools.itinerary
+    module = importlib.reload(ranger.tools.itinerary)
+    if request.param == "python":
+        monkeypatch.setattr(module, "np", None)
+    return module
+
+
+def test_parse_clock_and_window(itinerary):
+    assert itinerary.parse_clock("9:30") == 9 * 3600 + 30 * 60
+    assert itinerary.parse_clock("1:30 pm") == 13 * 3600 + 30 * 60
+    assert itinerary.parse_clock("12am") == 0
+    assert itinerary.parse_window("11:30-13:30") == (41400, 48600)
+    assert itinerary.parse_window(["11:30", "13:30"]) == (41400, 48600)
+    with pytest.raises(ValueError):
+        itinerary.parse_clock("noonish")
+    with pytest.raises(ValueError):
+        itinerary.parse_window("14:00-13:00")
+
+
+def test_solve_finds_shortest_tour(itinerary):
+    """Stops given out of order are visited along the line and back"""
+    durations = line_durations(["Home", "C", "A", "D", "B"])
+    plan = itinerary.solve(durations, start_s=9 * 3600, stay_s=0)
+    assert plan["travel"] == 8 * 600
+    one_way = itinerary.solve(line_durations(["Home", "C", "A", "D", "B"], return_to_start=False), 9 * 3600, 0)
+    assert [visit["stop"] for visit in one_way["visits"]] == [2, 4, 1, 3]
+
+
+def test_solve_respects_time_windows(itinerary):
+    """A stop that closes early is visited first even though it is furthest away"""
+    durations = line_durations(["Home", "A", "B", "C", "D"])
+    windows = {4: (9 * 3600, 9 * 3600 + 45 * 60)}
+    plan = itinerary.solve(durations, start_s=9 * 3600, stay_s=30 * 60, windows=windows)
+    assert plan["visits"][0]["stop"] == 4
+    assert plan["late"] == 0
+
+
+def test_two_opt_gains_match_tour_lengths(itinerary):
+    """Each gain is exactly the travel saved by that reversal, also for asymmetric matrices"""
+    durations = [[0, 5, 9, 4, 0], [7, 0, 3, 8, 0], [2, 6, 0, 5, 0], [9, 1, 4, 0, 0], [0, 0, 0, 0, 0]]
+    tour = [0, 1, 2, 3, 4]
+
+    def length(t):
+        return sum(durations[a][b] for a, b in zip(t, t[1:]))
+
+    gains = itinerary.two_opt_gains(durations, tour)
+    for i, j in itertools.combinations(range(1, 4), 2):
+        reversed_tour = tour[:i] + tour[i:j + 1][::-1] + tour[j + 1:]
+        assert gains[i - 1][j - 1] == pytest.approx(length(tour) - length(reversed_tour))
+
+
+def test_optimize_itinerary_uses_one_matrix_lookup(itinerary):
+    with patch.object(itinerary, "fetch_travel_matrix", side_effect=lambda o, d, mode: line_legs(o)) as fetch:
+        result = itinerary.optimize_itinerary(["C", "A", "B"], "Home", start_time="9:00", stay_minutes=30,
+                                              time_windows={"B": "9:00-9:30", "Atlantis": "10:00-11:00"})
+
+    fetch.assert_called_once_with(["Home", "C", "A", "B"], ["Home", "C", "A", "B"], "driving")
+    lines = result.split("\n")
+    assert lines[0] == "Itinerary from Home by driving: 3 stops, 1 h 0 min of travel, back by 11:30."
+    assert lines[1] == "09:00 leave Home"
+    assert lines[2] == "09:20 arrive B (20 min from Home), stay 30 min until 09:50"
+    assert lines[-2] == "11:30 back at Home (10 min from A)"
+    assert lines[-1] == "Ignored time windows for places that are not stops: Atlantis"
+
+
+def test_optimize_itinerary_routes_around_missing_legs(itinerary):
+    """A stop with no direct route from the start is reached through another stop"""
+    def legs(origins, destinations, mode):
+        result = {(o, d): {"duration_s": 600, "distance_m": 0} for o in origins for d in destinations}
+        result[("Home", "Island")] = result[("Island", "Home")] = None
+        return result
+
+    with patch.object(itinerary, "fetch_travel_matrix", side_effect=legs):
+        result = itinerary.optimize_itinerary(["Island", "A"], "Home", return_to_start=False)
+        stranded = itinerary.optimize_itinerary(["Island"], "Home", return_to_start=False)
+
+    assert "arrive A (10 min from Home)" in result
+    assert "arrive Island (10 min from A)" in result
+    assert "arrive Island (no route found from Home)" in stranded
+
+
+def test_optimize_itinerary_rejects_bad_input(itinerary):
+    assert itinerary.optimize_itinerary(["Home"], "Home") == "No stops to visit besides the start."
+    assert itinerary.optimize_itinerary(["A"], "Home", start_time="later") == "Not a clock time: 'later'"
@@ -94,4 +94,183 @@ def test_travel_duration_default_mode():
         "Boston, MA",
         mode="driving",
         departure_time=datetime(2025, 6, 6, 11, 0)
-    ) 
\ No newline at end of file
+    ) 
+
+def test_travel_duration_cached():
+    """Repeated legs are served from the directions cache, whatever their spelling"""
+    mock_gmaps = MagicMock()
+    mock_gmaps.directions.return_value = [{
+        "legs": [{
+            "duration": {"text": "1 hour 30 mins", "value": 5400},
+            "distance": {"value": 346000}
+        }]
+    }]
+
+    with patch('googlemaps.Client', return_value=mock_gmaps) as mock_client_class, \
+         patch('os.getenv', return_value="fake_api_key"):
+        import ranger.tools.maps
+        importlib.reload(ranger.tools.maps)
+        first = ranger.tools.maps.get_travel_duration("New York, NY", "Boston, MA", "driving")
+        second = ranger.tools.maps.get_travel_duration("  new york, ny", "BOSTON, MA.", "driving")
+        stats = ranger.tools.maps.get_directions_cache().stats()
+
+    assert first == second == "1 hour 30 mins"
+    mock_gmaps.directions.assert_called_once()
+    mock_client_class.assert_called_once()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+def test_travel_duration_errors_not_cached():
+    """Failed lookups are retried on the next call"""
+    mock_gmaps = MagicMock()
+    mock_gmaps.directions.side_effect = Exception("API Error")
+
+    with patch('googlemaps.Client', return_value=mock_gmaps), \
+         patch('os.getenv', return_value="fake_api_key"):
+        import ranger.tools.maps
+        importlib.reload(ranger.tools.maps)
+        ranger.tools.maps.get_travel_duration("New York, NY", "Boston, MA")
+        ranger.tools.maps.get_travel_duration("New York, NY", "Boston, MA")
+
+    assert mock_gmaps.directions.call_count == 2
+
+def matrix_response(origins, destinations):
+    """Build a Distance Matrix response with made-up numbers for each pair"""
+    return {
+        "rows": [{
+            "elements": [{
+                "status": "OK",
+                "duration": {"text": f"{i + j + 1} mins", "value": (i + j + 1) * 60},
+                "distance": {"value": (i + j + 1) * 1000}
+            } for j, _ in enumerate(destinations)]
+        } for i, _ in enumerate(origins)]
+    }
+
+def test_travel_matrix_success():
+    """All pairs come back in one compact table"""
+    mock_gmaps = MagicMock()
+    mock_gmaps.distance_matrix.side_effect = lambda o, d, **kwargs: matrix_response(o, d)
+
+    with patch('googlemaps.Client', return_value=mock_gmaps), \
+         patch('os.getenv', return_value="fake_api_key"):
+        import ranger.tools.maps
+        importlib.reload(ranger.tools.maps)
+        result = ranger.tools.maps.get_travel_matrix(["A", "B"], ["C", "D"])
+
+    lines = result.split("\n")
+    assert lines[0] == "origin | destination | duration_s | distance_m"
+    assert "A | C | 60 | 1000" in lines
+    assert "B | D | 180 | 3000" in lines
+    mock_gmaps.distance_matrix.assert_called_once_with(
+        ["A", "B"],
+        ["C", "D"],
+        mode="driving",
+        departure_time=datetime(2025, 6, 6, 11, 0)
+    )
+
+def test_travel_matrix_chunks_large_requests():
+    """Requests are split to respect the 25x25 and 100-element limits"""
+    mock_gmaps = MagicMock()
+    mock_gmaps.distance_matrix.side_effect = lambda o, d, **kwargs: matrix_response(o, d)
+    places = [f"Stop {i}" for i in range(30)]
+
+    with patch('googlemaps.Client', return_value=mock_gmaps), \
+         patch('os.getenv', return_value="fake_api_key"):
+        import ranger.tools.maps
+        importlib.reload(ranger.tools.maps)
+        legs = ranger.tools.maps.fetch_travel_matrix(places, places)
+
+    assert len(legs) == 900
+    assert all(leg is not None for leg in legs.values())
+    for call in mock_gmaps.distance_matrix.call_args_list:
+        origins, destinations = call[0]
+        assert len(origins) <= 25 and len(destinations) <= 25
+        assert len(origins) * len(destinations) <= 100
+
+def test_travel_matrix_fills_leg_cache():
+    """Single-leg lookups after a matrix call need no API request"""
+    mock_gmaps = MagicMock()
+    mock_gmaps.distance_matrix.side_effect = lambda o, d, **kwargs: matrix_response(o, d)
+
+    with patch('googlemaps.Client', return_value=mock_gmaps), \
+         patch('os.getenv', return_value="fake_api_key"):
+        import ranger.tools.maps
+        importlib.reload(ranger.tools.maps)
+        ranger.tools.maps.get_travel_matrix(["A", "B"], ["C", "D"])
+        result = ranger.tools.maps.get_travel_duration("B", "C")
+        ranger.tools.maps.get_travel_matrix(["A"], ["D"])
+
+    assert result == "2 mins"
+    mock_gmaps.directions.assert_not_called()
+    mock_gmaps.distance_matrix.assert_called_once()
+
+def test_travel_matrix_no_route():
+    """Pairs without a route are reported and not cached"""
+    mock_gmaps = MagicMock()
+    mock_gmaps.distance_matrix.return_value = {"rows": [{"elements": [{"status": "ZERO_RESULTS"}]}]}
+
+    with patch('googlemaps.Client', return_value=mock_gmaps), \
+         patch('os.getenv', return_value="fake_api_key"):
+        import ranger.tools.maps
+        importlib.reload(ranger.tools.maps)
+        result = ranger.tools.maps.get_travel_matrix(["Island"], ["Mainland"])
+
+    assert "Island | Mainland | no route | no route" in result
+    assert len(ranger.tools.maps.get_directions_cache()) == 0
+
+def test_travel_duration_uses_resolved_places():
+    """Known places are sent to Maps as place IDs and share cache entries across spellings"""
+    from ranger.places import get_place_index, reset_place_index
+    mock_gmaps = MagicMock()
+    mock_gmaps.directions.return_value = [{"legs": [{"duration": {"text": "20 mins", "value": 1200}}]}]
+    reset_place_index()
+    try:
+        index = get_place_index()
+        index.add({"place_id": "north", "address": "Northport, MI 49670, USA"}, aliases=["Northport, MI"])
+        index.add({"place_id": "leland", "address": "Leland, MI 49654, USA"}, aliases=["Leland, MI"])
+        with patch('googlemaps.Client', return_value=mock_gmaps), \
+             patch('os.getenv', return_value="fake_api_key"):
+            import ranger.tools.maps
+            importlib.reload(ranger.tools.maps)
+            first = ranger.tools.maps.get_travel_duration("Northport, MI", "Leland, MI", "driving")
+            second = ranger.tools.maps.get_travel_duration("northport michigan", "leland michigan", "driving")
+    finally:
+        reset_place_index()
+    assert first == second == "20 mins"
+    mock_gmaps.directions.assert_called_once_with(
+        "place_id:north",
+        "place_id:leland",
+        mode="driving",
+        departure_time=datetime(2025, 6, 6, 11, 0)
+    )
+    mock_gmaps.geocode.assert_not_called()
+
+def test_travel_durations_runs_legs_concurrently():
+    """Legs come back in input order with failures reported per leg"""
+    import os
+    import time
+
+    def directions(origin, destination, **kwargs):
+        time.sleep(0.2)
+        if destination == "Atlantis":
+            raise Exception("NOT_FOUND")
+        return [{"legs": [{"duration": {"text": f"{origin} to {destination}", "value": 60}}]}]
+
+    mock_gmaps = MagicMock()
+    mock_gmaps.directions.side_effect = directions
+    with patch('googlemaps.Client', return_value=mock_gmaps), \
+         patch('os.getenv', return_value="fake_api_key"), \
+         patch.dict(os.environ, {"RANGER_PLACES": "0"}):
+        import ranger.tools.maps
+        importlib.reload(ranger.tools.maps)
+        start = time.perf_counter()
+        result = ranger.tools.maps.get_travel_durations([["Omena", "Leland"], ["Leland", "Atlantis"], ["Leland"], ["Leland", "Omena"]])
+        elapsed = time.perf_counter() - start
+
+    assert result.split("\n") == [
+        "Omena -> Leland: Omena to Leland",
+        "Leland -> Atlantis: error: NOT_FOUND",
+        "Leland: error: expected a [start_location, destination_location] pair",
+        "Leland -> Omena: Leland to Omena",
+    ]
+    assert elapsed < 0.5
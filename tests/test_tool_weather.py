@@ -2,8 +2,16 @@ import pytest
 from unittest.mock import patch, MagicMock
 import importlib
 import sys
+import os
+import time
 
-def test_get_weather_success():
+@pytest.fixture
+def agent_mode():
+    """Use the nested CodeAgent weather path."""
+    with patch.dict(os.environ, {"RANGER_WEATHER_MODE": "agent"}):
+        yield
+
+def test_get_weather_success(agent_mode):
     """Test successful weather retrieval"""
     mock_code_agent = MagicMock()
     mock_code_agent.run.return_value = """
@@ -26,7 +34,7 @@ def test_get_weather_success():
     call_args = mock_code_agent.run.call_args[0][0]
     assert "Test City" in call_args
 
-def test_get_weather_agent_initialization():
+def test_get_weather_agent_initialization(agent_mode):
     """Test that the CodeAgent is initialized with correct parameters"""
     mock_code_agent = MagicMock()
     with patch('smolagents.tool', side_effect=lambda f: f), \
@@ -45,7 +53,7 @@ def test_get_weather_agent_initialization():
             additional_authorized_imports=["datetime"]
         )
 
-def test_get_weather_error_handling():
+def test_get_weather_error_handling(agent_mode):
     """Test error handling in weather retrieval"""
     mock_code_agent = MagicMock()
     mock_code_agent.run.side_effect = Exception("API Error")
@@ -86,4 +94,78 @@ def test_get_weather_docstring():
             if 'location:' in line.lower():
                 location_doc = True
                 break
-        assert location_doc, "location parameter should be documented" 
\ No newline at end of file
+        assert location_doc, "location parameter should be documented" 
+
+def test_get_weather_direct_mode():
+    """The default mode makes one completion on a reused model and no nested agent"""
+    with patch('smolagents.tool', side_effect=lambda f: f), \
+         patch('smolagents.CodeAgent') as mock_code_agent_class, \
+         patch('ranger.models.claude.ClaudeServerModel') as mock_claude_model_class, \
+         patch.dict(os.environ, {"RANGER_WEATHER_MODE": ""}):
+        mock_claude_model_class.return_value.generate.return_value = "- Temperature: 72°F"
+        import ranger.tools.weather
+        importlib.reload(ranger.tools.weather)
+        result = ranger.tools.weather.get_weather("Test City")
+        ranger.tools.weather.get_weather("Other City")
+    assert result == "- Temperature: 72°F"
+    mock_code_agent_class.assert_not_called()
+    mock_claude_model_class.assert_called_once()
+    generate = mock_claude_model_class.return_value.generate
+    assert generate.call_count == 2
+    assert "Test City" in generate.call_args_list[0][0][0]
+
+def test_get_weather_cached_per_location():
+    """Repeat lookups for the same place within the hour reuse the report"""
+    with patch('smolagents.tool', side_effect=lambda f: f), \
+         patch('ranger.models.claude.ClaudeServerModel') as mock_claude_model_class, \
+         patch.dict(os.environ, {"RANGER_WEATHER_MODE": "direct"}):
+        mock_claude_model_class.return_value.generate.return_value = "- Temperature: 72°F"
+        import ranger.tools.weather
+        importlib.reload(ranger.tools.weather)
+        ranger.tools.weather.get_weather("Northport, MI")
+        ranger.tools.weather.get_weather("northport, mi")
+        with patch('time.time', return_value=time.time() + 3600):
+            ranger.tools.weather.get_weather("Northport, MI")
+    assert mock_claude_model_class.return_value.generate.call_count == 2
+
+def test_get_weather_registered_provider():
+    """A registered provider can be selected through RANGER_WEATHER_MODE"""
+    with patch('smolagents.tool', side_effect=lambda f: f), \
+         patch.dict(os.environ, {"RANGER_WEATHER_MODE": "fake"}):
+        import ranger.tools.weather
+        importlib.reload(ranger.tools.weather)
+        ranger.tools.weather.register_weather_provider("fake", lambda location: f"Sunny in {location}")
+        assert ranger.tools.weather.get_weather("Test City") == "Sunny in Test City"
+
+def test_get_weather_unknown_mode():
+    """An unknown weather mode is rejected"""
+    with patch('smolagents.tool', side_effect=lambda f: f), \
+         patch.dict(os.environ, {"RANGER_WEATHER_MODE": "carrier-pigeon"}):
+        import ranger.tools.weather
+        importlib.reload(ranger.tools.weather)
+        with pytest.raises(ValueError):
+            ranger.tools.weather.get_weather("Test City")
+
+def test_get_weather_many_runs_concurrently():
+    """Reports come back in input order, failures per location, in about the time of one lookup"""
+    def slow_provider(location):
+        time.sleep(0.2)
+        if location == "Atlantis":
+            raise RuntimeError("no such place")
+        return f"Sunny in {location}"
+
+    with patch('smolagents.tool', side_effect=lambda f: f), \
+         patch.dict(os.environ, {"RANGER_WEATHER_MODE": "slow", "RANGER_PLACES": "0"}):
+        import ranger.tools.weather
+        importlib.reload(ranger.tools.weather)
+        ranger.tools.weather.register_weather_provider("slow", slow_provider)
+        start = time.perf_counter()
+        result = ranger.tools.weather.get_weather_many(["Leland", "Atlantis", "Glen Arbor", "Omena"])
+        elapsed = time.perf_counter() - start
+    assert result.split("\n\n") == [
+        "Weather in Leland:\nSunny in Leland",
+        "Weather in Atlantis: error: no such place",
+        "Weather in Glen Arbor:\nSunny in Glen Arbor",
+        "Weather in Omena:\nSunny in Omena",
+    ]
+    assert elapsed < 0.6
@@ -0,0 +1,122 @@
+import json
+
+import pytest
+
+from ranger import tracing
+
+
+@pytest.fixture
+def spans_file(tmp_path, monkeypatch):
+    path = tmp_path / "spans.jsonl"
+    monkeypatch.setenv("RANGER_TRACE_PATH", str(path))
+    return path
+
+
+def read(path):
+    tracing.flush()
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_nested_spans_share_a_trace(spans_file):
+    with tracing.span("router", "route") as outer:
+        with tracing.span("tool", "get_weather"):
+            tracing.annotate(cache_hit=True)
+        outer.set(input_tokens=10)
+    inner, outer = read(spans_file)
+    assert inner["parent_id"] == outer["span_id"]
+    assert inner["trace_id"] == outer["trace_id"]
+    assert inner["attrs"] == {"cache_hit": True}
+    assert outer["attrs"] == {"input_tokens": 10}
+    assert outer["parent_id"] is None
+
+
+def test_span_records_errors(spans_file):
+    with pytest.raises(ValueError):
+        with tracing.span("maps", "directions"):
+            raise ValueError("quota")
+    assert read(spans_file)[0]["attrs"]["error"] == "ValueError: quota"
+
+
+def test_tracing_disabled(spans_file, monkeypatch):
+    monkeypatch.setenv("RANGER_TRACE", "0")
+    with tracing.span("router", "route"):
+        pass
+    assert not spans_file.exists()
+
+
+def test_span_file_rotates(spans_file, monkeypatch):
+    monkeypatch.setenv("RANGER_TRACE_MAX_BYTES", "2000")
+    monkeypatch.setenv("RANGER_TRACE_BACKUPS", "2")
+    tracing.shutdown()
+    for n in range(50):
+        tracing.record("tool", f"call-{n}", 0.1)
+    records = read(spans_file)
+    assert 0 < len(records) < 50
+    assert records[-1]["name"] == "call-49"
+    assert spans_file.with_name("spans.jsonl.2").exists()
+    # The backups are read too, oldest first, so recent history is complete and in order
+    names = [record["name"] for record in tracing.read_spans(spans_file)]
+    assert len(records) < len(names) < 50
+    assert names == [f"call-{n}" for n in range(50 - len(names), 50)]
+    tracing.shutdown()
+
+
+def test_open_span_runs_generator_steps_inside_it(spans_file):
+    """Work done through Span.run is parented to the span even across yields"""
+    def steps():
+        for i in range(2):
+            with tracing.span("agent", "step"):
+                pass
+            yield i
+
+    route = tracing.open_span("router", "route_stream")
+    events = steps()
+    assert route.run(next, events) == 0
+    assert tracing.current_span() is None
+    assert route.run(next, events) == 1
+    route.end()
+    records = read(spans_file)
+    assert [r["name"] for r in records] == ["step", "step", "route_stream"]
+    assert all(r["parent_id"] == records[-1]["span_id"] for r in records[:2])
+
+
+def test_instrument_model_records_tokens(spans_file):
+    class Model:
+        model_id = "test-model"
+        last_input_token_count = None
+        last_output_token_count = None
+
+        def generate(self, messages):
+            self.last_input_token_count, self.last_output_token_count = 12, 3
+            return "ok"
+
+    model = tracing.instrument_model(Model(), "claude")
+    assert model.generate([]) == "ok"
+    record = read(spans_file)[0]
+    assert (record["component"], record["name"]) == ("model", "claude")
+    assert record["attrs"] == {"model_id": "test-model", "input_tokens": 12, "output_tokens": 3}
+
+
+def test_aggregate_percentiles():
+    records = [{"component": "tool", "name": "get_weather", "seconds": s, "attrs": {}} for s in range(1, 101)]
+    records.append({"component": "model", "name": "claude", "seconds": 2.0, "attrs": {"error": "boom", "input_tokens": 5}})
+    model, tool = tracing.aggregate(records)
+    assert (tool["count"], tool["p50"], tool["p95"], tool["p99"]) == (100, 50, 95, 99)
+    assert (model["errors"], model["input_tokens"]) == (1, 5)
+
+
+def test_stage_times_total_each_component(spans_file, monkeypatch):
+    monkeypatch.setenv("RANGER_TRACE", "0")
+    with tracing.stage_times() as stages:
+        with tracing.span("router", "route"):
+            with tracing.span("tool", "get_weather_many"):
+                with tracing.span("tool", "get_weather"):
+                    pass
+            tracing.record("model", "claude", 0.5)
+            tracing.record("model", "claude", 0.25)
+    assert set(stages) == {"router", "tool", "model"}
+    assert stages["model"] == 0.75
+    assert stages["router"] >= stages["tool"]
+    with tracing.span("model", "claude"):
+        pass
+    assert stages["model"] == 0.75
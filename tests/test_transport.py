@@ -0,0 +1,83 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+
+from ranger.transport import Transport, get_transport, reset_transport
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OkHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_transport_is_shared():
+    """The process-wide transport is built once and reused."""
+    reset_transport()
+    assert get_transport() is get_transport()
+    reset_transport()
+
+
+def test_settings_from_env():
+    """Pool size and timeouts are read from the environment."""
+    with patch.dict(os.environ, {
+        "RANGER_HTTP_POOL_MAXSIZE": "7",
+        "RANGER_HTTP_CONNECT_TIMEOUT": "1.5",
+        "RANGER_HTTP_READ_TIMEOUT": "9",
+    }):
+        transport = Transport()
+    assert transport.pool_maxsize == 7
+    assert transport.timeout == (1.5, 9.0)
+
+
+def test_invalid_env_falls_back_to_defaults():
+    """Garbage settings do not break the transport."""
+    with patch.dict(os.environ, {"RANGER_HTTP_POOL_MAXSIZE": "lots", "RANGER_HTTP2": "nope"}):
+        transport = Transport()
+    assert transport.pool_maxsize == 20
+    assert not transport.http2
+
+
+def test_default_timeout_applied():
+    """Requests get the transport timeout unless one is passed explicitly."""
+    transport = Transport(connect_timeout=2, read_timeout=3)
+    with patch.object(transport.session, "post") as mock_post:
+        transport.post("https://example.com", json={})
+        assert mock_post.call_args.kwargs["timeout"] == (2, 3)
+    with patch.object(transport.session, "get") as mock_get:
+        transport.get("https://example.com", timeout=5)
+        assert mock_get.call_args.kwargs["timeout"] == 5
+
+
+def test_keep_alive_pool_hits(local_server):
+    """Repeated requests to one host reuse a pooled connection."""
+    transport = Transport()
+    for _ in range(3):
+        assert transport.get(local_server).text == "ok"
+    stats = transport.stats()
+    assert stats["requests"] == 3
+    assert stats["connections"] == 1
+    assert stats["pool_hits"] == 2
+    transport.close()
+